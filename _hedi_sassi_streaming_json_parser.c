@@ -0,0 +1,1084 @@
+/*
+ * Optional accelerator of hedi_sassi_streaming_json_parser.py
+ *
+ * It provides the ParsingContext of the parser as a C struct and the loop of StreamingJsonParser.consume() for a
+ * parser without select, schema, stats, lazy values, patches or documents. The loop reads and writes the same contexts
+ * as the Python loop, so get(), snapshot(), checkpoint() and every option keep using the Python code and both loops
+ * can run on the same parser one after the other. Keys are interned through the KeyCache of the parser and the loop
+ * stops before the token which could exceed one of its ParserLimits, the Python loop then consumes the rest of the
+ * buffer and raises, truncates or skips like without the accelerator.
+ * The Python module is used as is when this module is not built, see README.md.
+ */
+
+#define PY_SSIZE_T_CLEAN
+#include <Python.h>
+#include <structmember.h>
+
+/* shared constants, created when the module is initialized */
+static PyObject *empty_tuple;
+static PyObject *empty_string;
+static PyObject *string_delimiter;
+static PyObject *null_literal;
+static PyObject *true_literal;
+static PyObject *false_literal;
+static PyObject *intern_name;
+/* the names of the ParserLimits checked by the loop */
+static PyObject *max_depth_name;
+static PyObject *max_key_length_name;
+static PyObject *max_string_length_name;
+static PyObject *max_keys_per_object_name;
+/* json.decoder.scanstring, the C accelerated JSON string scanner which decodes the escapes */
+static PyObject *scanstring;
+
+/* ParsingContext */
+
+typedef struct {
+    PyObject_HEAD
+    PyObject *current_key;
+    /* a list of slices or the empty tuple */
+    PyObject *current_key_buffer;
+    /* exactly one of the object or array buffers is set depending on the type of the context */
+    PyObject *current_object_value_buffer;
+    PyObject *current_array_value_buffer;
+    /* also holds the token of a number, true, false or null */
+    PyObject *current_string_value_buffer;
+    PyObject *selection;
+    char is_parsing_key;
+    char is_parsing_value;
+    char is_parsing_scalar;
+    char is_visible;
+} ParsingContext;
+
+static PyTypeObject ParsingContextType;
+
+static int
+ParsingContext_set_buffers(ParsingContext *self, PyObject *selection, int is_array, int is_visible)
+{
+    PyObject *object_value_buffer = is_array ? Py_NewRef(Py_None) : PyDict_New();
+    PyObject *array_value_buffer = is_array ? PyList_New(0) : Py_NewRef(Py_None);
+    if (object_value_buffer == NULL || array_value_buffer == NULL) {
+        Py_XDECREF(object_value_buffer);
+        Py_XDECREF(array_value_buffer);
+        return -1;
+    }
+
+    Py_XSETREF(self->current_key, Py_NewRef(Py_None));
+    Py_XSETREF(self->current_key_buffer, Py_NewRef(empty_tuple));
+    Py_XSETREF(self->current_object_value_buffer, object_value_buffer);
+    Py_XSETREF(self->current_array_value_buffer, array_value_buffer);
+    Py_XSETREF(self->current_string_value_buffer, Py_NewRef(empty_tuple));
+    Py_XSETREF(self->selection, Py_NewRef(selection));
+    self->is_parsing_key = 0;
+    self->is_parsing_value = 0;
+    self->is_parsing_scalar = 0;
+    self->is_visible = (char)is_visible;
+    return 0;
+}
+
+static ParsingContext *
+ParsingContext_create(PyObject *selection, int is_array, int is_visible)
+{
+    ParsingContext *self = PyObject_GC_New(ParsingContext, &ParsingContextType);
+    if (self == NULL) {
+        return NULL;
+    }
+    self->current_key = NULL;
+    self->current_key_buffer = NULL;
+    self->current_object_value_buffer = NULL;
+    self->current_array_value_buffer = NULL;
+    self->current_string_value_buffer = NULL;
+    self->selection = NULL;
+    PyObject_GC_Track(self);
+    if (ParsingContext_set_buffers(self, selection, is_array, is_visible) < 0) {
+        Py_DECREF(self);
+        return NULL;
+    }
+    return self;
+}
+
+static PyObject *
+ParsingContext_new(PyTypeObject *type, PyObject *args, PyObject *kwargs)
+{
+    ParsingContext *self = (ParsingContext *)type->tp_alloc(type, 0);
+    if (self == NULL) {
+        return NULL;
+    }
+    if (ParsingContext_set_buffers(self, Py_None, 0, 1) < 0) {
+        Py_DECREF(self);
+        return NULL;
+    }
+    return (PyObject *)self;
+}
+
+static int
+ParsingContext_init(ParsingContext *self, PyObject *args, PyObject *kwargs)
+{
+    static char *keywords[] = {"selection", "is_array", "is_visible", NULL};
+    PyObject *selection = Py_None;
+    int is_array = 0;
+    int is_visible = 1;
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "|Opp", keywords, &selection, &is_array, &is_visible)) {
+        return -1;
+    }
+    return ParsingContext_set_buffers(self, selection, is_array, is_visible);
+}
+
+static int
+ParsingContext_traverse(ParsingContext *self, visitproc visit, void *arg)
+{
+    Py_VISIT(self->current_key);
+    Py_VISIT(self->current_key_buffer);
+    Py_VISIT(self->current_object_value_buffer);
+    Py_VISIT(self->current_array_value_buffer);
+    Py_VISIT(self->current_string_value_buffer);
+    Py_VISIT(self->selection);
+    return 0;
+}
+
+static int
+ParsingContext_clear(ParsingContext *self)
+{
+    Py_CLEAR(self->current_key);
+    Py_CLEAR(self->current_key_buffer);
+    Py_CLEAR(self->current_object_value_buffer);
+    Py_CLEAR(self->current_array_value_buffer);
+    Py_CLEAR(self->current_string_value_buffer);
+    Py_CLEAR(self->selection);
+    return 0;
+}
+
+static void
+ParsingContext_dealloc(ParsingContext *self)
+{
+    PyObject_GC_UnTrack(self);
+    ParsingContext_clear(self);
+    Py_TYPE(self)->tp_free((PyObject *)self);
+}
+
+/* the flags accept any object like the attributes of the Python context */
+#define FLAG_GETSET(name)                                                      \
+    static PyObject *ParsingContext_get_##name(ParsingContext *self, void *c)  \
+    {                                                                          \
+        return PyBool_FromLong(self->name);                                    \
+    }                                                                          \
+    static int ParsingContext_set_##name(ParsingContext *self, PyObject *value, void *c) \
+    {                                                                          \
+        int is_true;                                                           \
+        if (value == NULL) {                                                   \
+            PyErr_SetString(PyExc_AttributeError, "can not delete " #name);    \
+            return -1;                                                         \
+        }                                                                      \
+        is_true = PyObject_IsTrue(value);                                      \
+        if (is_true < 0) {                                                     \
+            return -1;                                                         \
+        }                                                                      \
+        self->name = (char)is_true;                                            \
+        return 0;                                                              \
+    }
+
+FLAG_GETSET(is_parsing_key)
+FLAG_GETSET(is_parsing_value)
+FLAG_GETSET(is_parsing_scalar)
+FLAG_GETSET(is_visible)
+
+static PyGetSetDef ParsingContext_getset[] = {
+    {"is_parsing_key", (getter)ParsingContext_get_is_parsing_key, (setter)ParsingContext_set_is_parsing_key},
+    {"is_parsing_value", (getter)ParsingContext_get_is_parsing_value, (setter)ParsingContext_set_is_parsing_value},
+    {"is_parsing_scalar", (getter)ParsingContext_get_is_parsing_scalar, (setter)ParsingContext_set_is_parsing_scalar},
+    {"is_visible", (getter)ParsingContext_get_is_visible, (setter)ParsingContext_set_is_visible},
+    {NULL},
+};
+
+static PyMemberDef ParsingContext_members[] = {
+    {"current_key", T_OBJECT, offsetof(ParsingContext, current_key), 0},
+    {"current_key_buffer", T_OBJECT, offsetof(ParsingContext, current_key_buffer), 0},
+    {"current_object_value_buffer", T_OBJECT, offsetof(ParsingContext, current_object_value_buffer), 0},
+    {"current_array_value_buffer", T_OBJECT, offsetof(ParsingContext, current_array_value_buffer), 0},
+    {"current_string_value_buffer", T_OBJECT, offsetof(ParsingContext, current_string_value_buffer), 0},
+    {"selection", T_OBJECT, offsetof(ParsingContext, selection), 0},
+    {NULL},
+};
+
+static PyTypeObject ParsingContextType = {
+    PyVarObject_HEAD_INIT(NULL, 0)
+    .tp_name = "_hedi_sassi_streaming_json_parser.ParsingContext",
+    .tp_doc = PyDoc_STR("The parsing context of an open object or array"),
+    .tp_basicsize = sizeof(ParsingContext),
+    .tp_flags = Py_TPFLAGS_DEFAULT | Py_TPFLAGS_HAVE_GC,
+    .tp_new = ParsingContext_new,
+    .tp_init = (initproc)ParsingContext_init,
+    .tp_dealloc = (destructor)ParsingContext_dealloc,
+    .tp_traverse = (traverseproc)ParsingContext_traverse,
+    .tp_clear = (inquiry)ParsingContext_clear,
+    .tp_members = ParsingContext_members,
+    .tp_getset = ParsingContext_getset,
+};
+
+/* consume() */
+
+typedef struct {
+    PyObject *buffer;
+    int kind;
+    const void *data;
+    Py_ssize_t length;
+    /* a list of the parent contexts or the empty tuple */
+    PyObject *context_stack;
+    ParsingContext *context;
+    PyObject *pending_escape;
+    int is_escaping;
+    int may_be_escaped;
+    int has_escapes;
+    int is_visible_changed;
+    /* a KeyCache or None */
+    PyObject *key_cache;
+    /* the ParserLimits checked by the loop, -1 when a limit is disabled */
+    Py_ssize_t max_depth;
+    Py_ssize_t max_key_length;
+    Py_ssize_t max_string_length;
+    Py_ssize_t max_keys_per_object;
+    /* the length of the key, string value or token being built, only tracked when it is limited */
+    Py_ssize_t string_length;
+    int is_limit_reached;
+} ConsumeState;
+
+/* the offsets returned by the steps are never negative */
+#define STEP_ERROR (-1)
+
+#define CHARACTER(state, index) PyUnicode_READ((state)->kind, (state)->data, (index))
+
+static Py_ssize_t
+find_char(ConsumeState *state, Py_UCS4 target, Py_ssize_t start, Py_ssize_t end)
+{
+    if (start >= end) {
+        return -1;
+    }
+    return PyUnicode_FindChar(state->buffer, target, start, end, 1);
+}
+
+static int
+is_truthy_list(PyObject *buffer)
+{
+    /* the buffers are either a list of slices or the empty tuple */
+    return PyList_CheckExact(buffer) && PyList_GET_SIZE(buffer) > 0;
+}
+
+/* stops the loop at this offset, the Python loop consumes the rest of the buffer */
+static Py_ssize_t
+reach_limit(ConsumeState *state, Py_ssize_t offset)
+{
+    state->is_limit_reached = 1;
+    return offset;
+}
+
+/* whether the next slice of the string in a buffer of slices could exceed its maximum length, the slice is at most
+   this long once the pending escape is prepended and the escapes are decoded */
+static int
+may_be_too_long(ConsumeState *state, PyObject *buffer, Py_ssize_t max_length, Py_ssize_t slice_length)
+{
+    Py_ssize_t previous_length = is_truthy_list(buffer) ? state->string_length : 0;
+    return max_length >= 0 &&
+           previous_length + PyUnicode_GET_LENGTH(state->pending_escape) + slice_length > max_length;
+}
+
+/* counts a (decoded) slice about to be appended to a buffer of slices */
+static void
+count_slice(ConsumeState *state, PyObject *buffer, Py_ssize_t max_length, PyObject *slice)
+{
+    if (max_length >= 0) {
+        state->string_length =
+            (is_truthy_list(buffer) ? state->string_length : 0) + PyUnicode_GET_LENGTH(slice);
+    }
+}
+
+static Py_ssize_t
+find_index_for_string_end(ConsumeState *state, Py_ssize_t offset)
+{
+    if (state->is_escaping) {
+        /* the previous buffer ended with a backslash, the first character is escaped */
+        state->is_escaping = 0;
+        offset += 1;
+    }
+
+    while (1) {
+        Py_ssize_t string_end_index = find_char(state, '"', offset, state->length);
+        Py_ssize_t escape_index = find_char(
+            state, '\\', offset, string_end_index == -1 ? state->length : string_end_index);
+        if (escape_index == -1) {
+            return string_end_index;
+        }
+
+        /* the character after the backslash can not end the string */
+        state->has_escapes = 1;
+        offset = escape_index + 2;
+        if (offset > state->length) {
+            state->is_escaping = 1;
+            return -1;
+        }
+    }
+}
+
+static int
+is_hex_digit(Py_UCS4 character)
+{
+    return (character >= '0' && character <= '9') || (character >= 'a' && character <= 'f') ||
+           (character >= 'A' && character <= 'F');
+}
+
+/* "\", "\u" and up to 3 hex digits */
+static int
+is_incomplete_escape(int kind, const void *data, Py_ssize_t start, Py_ssize_t length)
+{
+    Py_ssize_t index;
+    if (start == length) {
+        return 1;
+    }
+    if (PyUnicode_READ(kind, data, start) != '\\') {
+        return 0;
+    }
+    if (length - start == 1) {
+        return 1;
+    }
+    if (PyUnicode_READ(kind, data, start + 1) != 'u' || length - start > 5) {
+        return 0;
+    }
+    for (index = start + 2; index < length; index++) {
+        if (!is_hex_digit(PyUnicode_READ(kind, data, index))) {
+            return 0;
+        }
+    }
+    return 1;
+}
+
+/* a high surrogate waiting for its pair */
+static int
+is_high_surrogate_escape(int kind, const void *data, Py_ssize_t start, Py_ssize_t length)
+{
+    Py_UCS4 character;
+    if (length - start < 6 || PyUnicode_READ(kind, data, start) != '\\' ||
+        PyUnicode_READ(kind, data, start + 1) != 'u') {
+        return 0;
+    }
+    character = PyUnicode_READ(kind, data, start + 2);
+    if (character != 'd' && character != 'D') {
+        return 0;
+    }
+    character = PyUnicode_READ(kind, data, start + 3);
+    return (character == '8' || character == '9' || character == 'a' || character == 'b' || character == 'A' ||
+            character == 'B') &&
+           is_hex_digit(PyUnicode_READ(kind, data, start + 4)) &&
+           is_hex_digit(PyUnicode_READ(kind, data, start + 5));
+}
+
+static Py_ssize_t
+find_index_for_incomplete_escape(PyObject *string_slice)
+{
+    int kind = PyUnicode_KIND(string_slice);
+    const void *data = PyUnicode_DATA(string_slice);
+    Py_ssize_t length = PyUnicode_GET_LENGTH(string_slice);
+    /* an incomplete escape is at most 11 characters long ("\ud83d\ude0") */
+    Py_ssize_t search_start = length > 11 ? length - 11 : 0;
+
+    while (1) {
+        Py_ssize_t escape_index = search_start;
+        Py_ssize_t backslash_count = 0;
+        while (escape_index < length &&
+               !(is_high_surrogate_escape(kind, data, escape_index, length) &&
+                 is_incomplete_escape(kind, data, escape_index + 6, length)) &&
+               !is_incomplete_escape(kind, data, escape_index, length)) {
+            escape_index++;
+        }
+        if (escape_index == length) {
+            return escape_index;
+        }
+
+        /* the backslash only starts an escape if it is not escaped itself */
+        while (escape_index - backslash_count > 0 &&
+               PyUnicode_READ(kind, data, escape_index - backslash_count - 1) == '\\') {
+            backslash_count++;
+        }
+        if (backslash_count % 2 == 0) {
+            return escape_index;
+        }
+
+        search_start = escape_index + 1;
+    }
+}
+
+/* returns a new reference to the decoded slice, the slice reference is stolen */
+static PyObject *
+unescape(ConsumeState *state, PyObject *string_slice, int is_last_slice)
+{
+    PyObject *delimited_slice;
+    PyObject *result;
+    PyObject *decoded_slice;
+
+    if (PyUnicode_GET_LENGTH(state->pending_escape) > 0) {
+        PyObject *joined_slice = PyUnicode_Concat(state->pending_escape, string_slice);
+        Py_DECREF(string_slice);
+        if (joined_slice == NULL) {
+            return NULL;
+        }
+        string_slice = joined_slice;
+        Py_SETREF(state->pending_escape, Py_NewRef(empty_string));
+    }
+
+    if (PyUnicode_FindChar(string_slice, '\\', 0, PyUnicode_GET_LENGTH(string_slice), 1) == -1) {
+        return string_slice;
+    }
+
+    if (!is_last_slice) {
+        /* keep an escape split between two buffers for the next slice */
+        Py_ssize_t incomplete_escape_index = find_index_for_incomplete_escape(string_slice);
+        PyObject *pending_escape =
+            PyUnicode_Substring(string_slice, incomplete_escape_index, PyUnicode_GET_LENGTH(string_slice));
+        PyObject *complete_slice = PyUnicode_Substring(string_slice, 0, incomplete_escape_index);
+        Py_DECREF(string_slice);
+        if (pending_escape == NULL || complete_slice == NULL) {
+            Py_XDECREF(pending_escape);
+            Py_XDECREF(complete_slice);
+            return NULL;
+        }
+        Py_SETREF(state->pending_escape, pending_escape);
+        string_slice = complete_slice;
+    }
+
+    delimited_slice = PyUnicode_Concat(string_slice, string_delimiter);
+    Py_DECREF(string_slice);
+    if (delimited_slice == NULL) {
+        return NULL;
+    }
+    result = PyObject_CallFunction(scanstring, "OiO", delimited_slice, 0, Py_False);
+    Py_DECREF(delimited_slice);
+    if (result == NULL) {
+        return NULL;
+    }
+    decoded_slice = Py_NewRef(PyTuple_GET_ITEM(result, 0));
+    Py_DECREF(result);
+    return decoded_slice;
+}
+
+/* appends the slice (stolen) to a buffer of slices which is replaced by a new list when it is empty */
+static int
+append_slice(PyObject **buffer, PyObject *slice)
+{
+    int result;
+    if (is_truthy_list(*buffer)) {
+        result = PyList_Append(*buffer, slice);
+        Py_DECREF(slice);
+        return result;
+    }
+
+    PyObject *new_buffer = PyList_New(1);
+    if (new_buffer == NULL) {
+        Py_DECREF(slice);
+        return -1;
+    }
+    PyList_SET_ITEM(new_buffer, 0, slice);
+    Py_SETREF(*buffer, new_buffer);
+    return 0;
+}
+
+/* stores the value (stolen) in the current context */
+static int
+store_value_and_reset_context(ConsumeState *state, PyObject *value)
+{
+    ParsingContext *context = state->context;
+    int result;
+    if (context->is_visible) {
+        state->is_visible_changed = 1;
+    }
+
+    if (context->current_array_value_buffer != Py_None) {
+        result = PyList_Append(context->current_array_value_buffer, value);
+    }
+    else {
+        result = PyObject_SetItem(context->current_object_value_buffer, context->current_key, value);
+        Py_SETREF(context->current_key, Py_NewRef(Py_None));
+    }
+    Py_DECREF(value);
+    Py_SETREF(context->current_string_value_buffer, Py_NewRef(empty_tuple));
+    return result;
+}
+
+static int
+push_context(ConsumeState *state, int is_array)
+{
+    ParsingContext *parent_context = state->context;
+    ParsingContext *context;
+    /* the elements of an array share the selection of the array */
+    PyObject *selection = Py_NewRef(parent_context->selection);
+    if (selection != Py_None && parent_context->current_array_value_buffer == Py_None) {
+        Py_SETREF(selection, PyObject_GetItem(selection, parent_context->current_key));
+        if (selection == NULL) {
+            return -1;
+        }
+    }
+
+    /* an open array is exposed like a partial string but an open object is not */
+    int is_visible = parent_context->is_visible && is_array;
+    if (is_visible) {
+        state->is_visible_changed = 1;
+    }
+
+    context = ParsingContext_create(selection, is_array, is_visible);
+    Py_DECREF(selection);
+    if (context == NULL) {
+        return -1;
+    }
+
+    if (is_truthy_list(state->context_stack)) {
+        if (PyList_Append(state->context_stack, (PyObject *)parent_context) < 0) {
+            Py_DECREF(context);
+            return -1;
+        }
+        Py_DECREF(parent_context);
+    }
+    else {
+        PyObject *context_stack = PyList_New(1);
+        if (context_stack == NULL) {
+            Py_DECREF(context);
+            return -1;
+        }
+        /* the reference to the parent moves to the stack */
+        PyList_SET_ITEM(context_stack, 0, (PyObject *)parent_context);
+        Py_SETREF(state->context_stack, context_stack);
+    }
+    state->context = context;
+    return 0;
+}
+
+static int
+pop_context(ConsumeState *state)
+{
+    /* the value is complete and will not change anymore, freeze it so it can be shared by snapshots */
+    ParsingContext *complete_context = state->context;
+    Py_ssize_t stack_size = PyList_GET_SIZE(state->context_stack);
+    PyObject *complete_value;
+    if (complete_context->current_array_value_buffer != Py_None) {
+        complete_value = PyList_AsTuple(complete_context->current_array_value_buffer);
+    }
+    else {
+        complete_value = PyDictProxy_New(complete_context->current_object_value_buffer);
+    }
+    if (complete_value == NULL) {
+        return -1;
+    }
+
+    state->context = (ParsingContext *)Py_NewRef(PyList_GET_ITEM(state->context_stack, stack_size - 1));
+    Py_DECREF(complete_context);
+    if (stack_size == 1) {
+        Py_SETREF(state->context_stack, Py_NewRef(empty_tuple));
+    }
+    else if (PyList_SetSlice(state->context_stack, stack_size - 1, stack_size, NULL) < 0) {
+        Py_DECREF(complete_value);
+        return -1;
+    }
+
+    return store_value_and_reset_context(state, complete_value);
+}
+
+static Py_ssize_t
+build_current_key(ConsumeState *state, Py_ssize_t offset)
+{
+    ParsingContext *context = state->context;
+    Py_ssize_t key_end_index;
+    PyObject *key_slice;
+    int was_escaping;
+    int had_escapes;
+
+    if (!context->is_parsing_key) {
+        /* ignore characters before the key starts */
+        Py_ssize_t key_start_index = find_char(state, '"', offset, state->length);
+        if (key_start_index == -1) {
+            return state->length;
+        }
+        context->is_parsing_key = 1;
+        offset = key_start_index + 1;
+    }
+
+    /* the Python loop scans the slice again if it is too long */
+    was_escaping = state->is_escaping;
+    had_escapes = state->has_escapes;
+    if (state->may_be_escaped) {
+        key_end_index = find_index_for_string_end(state, offset);
+    }
+    else {
+        key_end_index = find_char(state, '"', offset, state->length);
+    }
+    /* the Python loop also skips the keys after the maximum number of keys of the object (unless they are
+       duplicates), they are left to it before they end */
+    if (may_be_too_long(state, context->current_key_buffer, state->max_key_length,
+                        (key_end_index == -1 ? state->length : key_end_index) - offset) ||
+        (key_end_index != -1 && state->max_keys_per_object >= 0 &&
+         PyDict_Size(context->current_object_value_buffer) >= state->max_keys_per_object)) {
+        state->is_escaping = was_escaping;
+        state->has_escapes = had_escapes;
+        return reach_limit(state, offset);
+    }
+
+    if (key_end_index == -1) {
+        /* the key continues in the next buffer, keep the whole slice */
+        key_slice = PyUnicode_Substring(state->buffer, offset < state->length ? offset : state->length, state->length);
+        if (key_slice == NULL) {
+            return STEP_ERROR;
+        }
+        if (state->has_escapes && (key_slice = unescape(state, key_slice, 0)) == NULL) {
+            return STEP_ERROR;
+        }
+        count_slice(state, context->current_key_buffer, state->max_key_length, key_slice);
+        if (append_slice(&context->current_key_buffer, key_slice) < 0) {
+            return STEP_ERROR;
+        }
+        return state->length;
+    }
+
+    key_slice = PyUnicode_Substring(state->buffer, offset, key_end_index);
+    if (key_slice == NULL) {
+        return STEP_ERROR;
+    }
+    if (state->has_escapes) {
+        if ((key_slice = unescape(state, key_slice, 1)) == NULL) {
+            return STEP_ERROR;
+        }
+        state->has_escapes = 0;
+    }
+    count_slice(state, context->current_key_buffer, state->max_key_length, key_slice);
+    if (is_truthy_list(context->current_key_buffer)) {
+        int result = PyList_Append(context->current_key_buffer, key_slice);
+        Py_DECREF(key_slice);
+        if (result < 0) {
+            return STEP_ERROR;
+        }
+        key_slice = PyUnicode_Join(empty_string, context->current_key_buffer);
+        if (key_slice == NULL) {
+            return STEP_ERROR;
+        }
+        Py_SETREF(context->current_key_buffer, Py_NewRef(empty_tuple));
+    }
+    if (state->key_cache != Py_None) {
+        /* looked up once per key, the parsed objects share the key strings held by the cache */
+        Py_SETREF(key_slice, PyObject_CallMethodOneArg(state->key_cache, intern_name, key_slice));
+        if (key_slice == NULL) {
+            return STEP_ERROR;
+        }
+    }
+    Py_SETREF(context->current_key, key_slice);
+    context->is_parsing_key = 0;
+    return key_end_index + 1;
+}
+
+static PyObject *
+parse_scalar(PyObject *token)
+{
+    PyObject *value;
+    if (PyUnicode_Compare(token, null_literal) == 0) {
+        Py_RETURN_NONE;
+    }
+    if (PyUnicode_Compare(token, true_literal) == 0) {
+        Py_RETURN_TRUE;
+    }
+    if (PyUnicode_Compare(token, false_literal) == 0) {
+        Py_RETURN_FALSE;
+    }
+
+    value = PyLong_FromUnicodeObject(token, 10);
+    if (value == NULL && PyErr_ExceptionMatches(PyExc_ValueError)) {
+        PyErr_Clear();
+        value = PyFloat_FromString(token);
+    }
+    return value;
+}
+
+static Py_ssize_t
+build_current_scalar_value(ConsumeState *state, Py_ssize_t offset)
+{
+    ParsingContext *context = state->context;
+    Py_ssize_t token_end_index = offset;
+    PyObject *token;
+    PyObject *value;
+
+    while (token_end_index < state->length) {
+        Py_UCS4 character = CHARACTER(state, token_end_index);
+        if (character == ',' || character == '}' || character == ']' || Py_UNICODE_ISSPACE(character)) {
+            break;
+        }
+        token_end_index++;
+    }
+
+    if (may_be_too_long(state, context->current_string_value_buffer, state->max_string_length,
+                        token_end_index - offset)) {
+        return reach_limit(state, offset);
+    }
+
+    token = PyUnicode_Substring(state->buffer, offset, token_end_index);
+    if (token == NULL) {
+        return STEP_ERROR;
+    }
+    count_slice(state, context->current_string_value_buffer, state->max_string_length, token);
+    if (token_end_index == state->length) {
+        /* the token continues in the next buffer */
+        if (append_slice(&context->current_string_value_buffer, token) < 0) {
+            return STEP_ERROR;
+        }
+        return state->length;
+    }
+
+    if (is_truthy_list(context->current_string_value_buffer)) {
+        int result = PyList_Append(context->current_string_value_buffer, token);
+        Py_DECREF(token);
+        if (result < 0) {
+            return STEP_ERROR;
+        }
+        token = PyUnicode_Join(empty_string, context->current_string_value_buffer);
+        if (token == NULL) {
+            return STEP_ERROR;
+        }
+    }
+
+    context->is_parsing_scalar = 0;
+    value = parse_scalar(token);
+    Py_DECREF(token);
+    if (value == NULL || store_value_and_reset_context(state, value) < 0) {
+        return STEP_ERROR;
+    }
+
+    /* do not skip parsing the potential '}' or ']' */
+    return token_end_index;
+}
+
+static Py_ssize_t
+build_current_non_string_value(ConsumeState *state, Py_ssize_t value_start_index)
+{
+    Py_UCS4 value_start = CHARACTER(state, value_start_index);
+    if (value_start == '{' || value_start == '[') {
+        Py_ssize_t depth = is_truthy_list(state->context_stack) ? PyList_GET_SIZE(state->context_stack) : 0;
+        if (state->max_depth >= 0 && depth >= state->max_depth) {
+            return reach_limit(state, value_start_index);
+        }
+        if (push_context(state, value_start == '[') < 0) {
+            return STEP_ERROR;
+        }
+        return value_start_index + 1;
+    }
+
+    if (state->context->current_array_value_buffer != Py_None) {
+        if (value_start == ']') {
+            if (pop_context(state) < 0) {
+                return STEP_ERROR;
+            }
+            return value_start_index + 1;
+        }
+
+        if (value_start == '}') {
+            /* invalid in an array, ignore it */
+            return value_start_index + 1;
+        }
+    }
+    else if (value_start == '}' || value_start == ']' || value_start == ',') {
+        /* there was no value, set value to None in dict and proceed */
+        if (store_value_and_reset_context(state, Py_NewRef(Py_None)) < 0) {
+            return STEP_ERROR;
+        }
+        /* do not skip parsing the potential '}' */
+        return value_start_index;
+    }
+
+    /* a number, true, false or null */
+    state->context->is_parsing_scalar = 1;
+    return build_current_scalar_value(state, value_start_index);
+}
+
+static Py_ssize_t
+build_current_value(ConsumeState *state, Py_ssize_t offset)
+{
+    ParsingContext *context = state->context;
+    Py_ssize_t value_end_index;
+    PyObject *value_slice;
+    int was_escaping;
+    int had_escapes;
+
+    if (!context->is_parsing_value) {
+        Py_UCS4 separator;
+        if (context->is_parsing_scalar) {
+            return build_current_scalar_value(state, offset);
+        }
+
+        /* ignore ':' (or ',' in arrays) and whitespace until the type of the value is known */
+        separator = context->current_array_value_buffer == Py_None ? ':' : ',';
+        while (offset < state->length) {
+            Py_UCS4 character = CHARACTER(state, offset);
+            if (character != separator && !Py_UNICODE_ISSPACE(character)) {
+                break;
+            }
+            offset++;
+        }
+        if (offset == state->length) {
+            return state->length;
+        }
+
+        if (CHARACTER(state, offset) != '"') {
+            return build_current_non_string_value(state, offset);
+        }
+
+        /* we are building a new string value, skip the delimiter */
+        context->is_parsing_value = 1;
+        offset += 1;
+    }
+
+    /* the Python loop scans the slice again if it is too long */
+    was_escaping = state->is_escaping;
+    had_escapes = state->has_escapes;
+    if (state->may_be_escaped) {
+        value_end_index = find_index_for_string_end(state, offset);
+    }
+    else {
+        value_end_index = find_char(state, '"', offset, state->length);
+    }
+    if (may_be_too_long(state, context->current_string_value_buffer, state->max_string_length,
+                        (value_end_index == -1 ? state->length : value_end_index) - offset)) {
+        state->is_escaping = was_escaping;
+        state->has_escapes = had_escapes;
+        return reach_limit(state, offset);
+    }
+
+    if (value_end_index == -1) {
+        /* only keep the new slice, the partial string value is joined lazily when it is exposed by get() */
+        value_slice = PyUnicode_Substring(state->buffer, offset < state->length ? offset : state->length, state->length);
+        if (value_slice == NULL) {
+            return STEP_ERROR;
+        }
+        if (state->has_escapes && (value_slice = unescape(state, value_slice, 0)) == NULL) {
+            return STEP_ERROR;
+        }
+        count_slice(state, context->current_string_value_buffer, state->max_string_length, value_slice);
+        if (append_slice(&context->current_string_value_buffer, value_slice) < 0) {
+            return STEP_ERROR;
+        }
+        if (context->is_visible) {
+            state->is_visible_changed = 1;
+        }
+        return state->length;
+    }
+
+    value_slice = PyUnicode_Substring(state->buffer, offset, value_end_index);
+    if (value_slice == NULL) {
+        return STEP_ERROR;
+    }
+    if (state->has_escapes) {
+        if ((value_slice = unescape(state, value_slice, 1)) == NULL) {
+            return STEP_ERROR;
+        }
+        state->has_escapes = 0;
+    }
+    count_slice(state, context->current_string_value_buffer, state->max_string_length, value_slice);
+    if (is_truthy_list(context->current_string_value_buffer)) {
+        int result = PyList_Append(context->current_string_value_buffer, value_slice);
+        Py_DECREF(value_slice);
+        if (result < 0) {
+            return STEP_ERROR;
+        }
+        value_slice = PyUnicode_Join(empty_string, context->current_string_value_buffer);
+        if (value_slice == NULL) {
+            return STEP_ERROR;
+        }
+    }
+
+    /* flush key value pair in the dict and reset */
+    context->is_parsing_value = 0;
+    if (store_value_and_reset_context(state, value_slice) < 0) {
+        return STEP_ERROR;
+    }
+    return value_end_index + 1;
+}
+
+static Py_ssize_t
+find_index_for_next_object_end(ConsumeState *state, Py_ssize_t offset)
+{
+    /* the first '}' unless a string starts before it */
+    for (; offset < state->length; offset++) {
+        Py_UCS4 character = CHARACTER(state, offset);
+        if (character == '}') {
+            return offset;
+        }
+        if (character == '"') {
+            return -1;
+        }
+    }
+    return -1;
+}
+
+/* reads a limit of the ParserLimits (or None), -1 when it is disabled */
+static int
+read_limit(PyObject *limits, PyObject *name, Py_ssize_t *max_value)
+{
+    PyObject *value;
+    *max_value = -1;
+    if (limits == Py_None) {
+        return 0;
+    }
+
+    value = PyObject_GetAttr(limits, name);
+    if (value == NULL) {
+        return -1;
+    }
+    if (value != Py_None) {
+        *max_value = PyLong_AsSsize_t(value);
+    }
+    Py_DECREF(value);
+    return *max_value == -1 && PyErr_Occurred() ? -1 : 0;
+}
+
+static PyObject *
+consume(PyObject *module, PyObject *const *args, Py_ssize_t nargs)
+{
+    ConsumeState state;
+    Py_ssize_t offset = 0;
+    PyObject *result;
+
+    if (nargs != 9) {
+        PyErr_SetString(PyExc_TypeError, "consume(context_stack, context, buffer, is_escaping, has_escapes, "
+                                          "pending_escape, key_cache, limits, string_length)");
+        return NULL;
+    }
+    if (!PyObject_TypeCheck(args[1], &ParsingContextType) || !PyUnicode_Check(args[2]) ||
+        !PyUnicode_Check(args[5])) {
+        PyErr_SetString(PyExc_TypeError, "consume() expects a ParsingContext and str buffers");
+        return NULL;
+    }
+    if (read_limit(args[7], max_depth_name, &state.max_depth) < 0 ||
+        read_limit(args[7], max_key_length_name, &state.max_key_length) < 0 ||
+        read_limit(args[7], max_string_length_name, &state.max_string_length) < 0 ||
+        read_limit(args[7], max_keys_per_object_name, &state.max_keys_per_object) < 0) {
+        return NULL;
+    }
+    state.string_length = PyLong_AsSsize_t(args[8]);
+    if (state.string_length == -1 && PyErr_Occurred()) {
+        return NULL;
+    }
+
+    state.buffer = args[2];
+    state.kind = PyUnicode_KIND(state.buffer);
+    state.data = PyUnicode_DATA(state.buffer);
+    state.length = PyUnicode_GET_LENGTH(state.buffer);
+    state.context_stack = Py_NewRef(args[0]);
+    state.context = (ParsingContext *)Py_NewRef(args[1]);
+    state.pending_escape = Py_NewRef(args[5]);
+    state.key_cache = args[6];
+    state.is_escaping = PyObject_IsTrue(args[3]);
+    state.has_escapes = PyObject_IsTrue(args[4]);
+    state.is_visible_changed = 0;
+    state.is_limit_reached = 0;
+    if (state.is_escaping < 0 || state.has_escapes < 0) {
+        goto error;
+    }
+    state.may_be_escaped = state.is_escaping || find_char(&state, '\\', 0, state.length) != -1;
+
+    while (offset < state.length) {
+        ParsingContext *context = state.context;
+
+        if (context->current_key != Py_None || context->current_array_value_buffer != Py_None) {
+            /* build the value, arrays have no keys, only values */
+            offset = build_current_value(&state, offset);
+        }
+        else {
+            /* the key is null at the start or just after building a new value */
+            /* in the latter case we check if we reached the end of a nested object */
+            if (!context->is_parsing_key && is_truthy_list(state.context_stack)) {
+                Py_ssize_t object_end_index = find_index_for_next_object_end(&state, offset);
+                if (object_end_index != -1) {
+                    if (pop_context(&state) < 0) {
+                        goto error;
+                    }
+                    offset = object_end_index + 1;
+                    continue;
+                }
+            }
+
+            offset = build_current_key(&state, offset);
+        }
+
+        if (offset == STEP_ERROR) {
+            goto error;
+        }
+        if (state.is_limit_reached) {
+            break;
+        }
+    }
+
+    result = Py_BuildValue("(NNNNNNnn)", state.context_stack, (PyObject *)state.context,
+                           PyBool_FromLong(state.is_escaping), PyBool_FromLong(state.has_escapes),
+                           state.pending_escape, PyBool_FromLong(state.is_visible_changed), offset,
+                           state.string_length);
+    return result;
+
+error:
+    Py_DECREF(state.context_stack);
+    Py_DECREF(state.context);
+    Py_DECREF(state.pending_escape);
+    return NULL;
+}
+
+static PyMethodDef module_methods[] = {
+    {"consume", (PyCFunction)(void (*)(void))consume, METH_FASTCALL,
+     PyDoc_STR("consume(context_stack, context, buffer, is_escaping, has_escapes, pending_escape, key_cache, "
+               "limits, string_length)\n"
+               "Consume the buffer like StreamingJsonParser.consume() with the KeyCache and the ParserLimits (or None) "
+               "of the parser and the length of the key or value being built.\n"
+               "Returns the new (context_stack, context, is_escaping, has_escapes, pending_escape), whether a "
+               "visible value changed and the offset and string length where the loop stopped, the offset is the "
+               "length of the buffer unless a limit could be exceeded.")},
+    {NULL},
+};
+
+static struct PyModuleDef module_definition = {
+    PyModuleDef_HEAD_INIT,
+    .m_name = "_hedi_sassi_streaming_json_parser",
+    .m_doc = PyDoc_STR("Optional accelerator of hedi_sassi_streaming_json_parser"),
+    .m_size = -1,
+    .m_methods = module_methods,
+};
+
+PyMODINIT_FUNC
+PyInit__hedi_sassi_streaming_json_parser(void)
+{
+    PyObject *module;
+    PyObject *json_decoder;
+
+    if (PyType_Ready(&ParsingContextType) < 0) {
+        return NULL;
+    }
+
+    json_decoder = PyImport_ImportModule("json.decoder");
+    if (json_decoder == NULL) {
+        return NULL;
+    }
+    scanstring = PyObject_GetAttrString(json_decoder, "scanstring");
+    Py_DECREF(json_decoder);
+    empty_tuple = PyTuple_New(0);
+    empty_string = PyUnicode_FromString("");
+    string_delimiter = PyUnicode_FromString("\"");
+    null_literal = PyUnicode_FromString("null");
+    true_literal = PyUnicode_FromString("true");
+    false_literal = PyUnicode_FromString("false");
+    intern_name = PyUnicode_InternFromString("intern");
+    max_depth_name = PyUnicode_InternFromString("max_depth");
+    max_key_length_name = PyUnicode_InternFromString("max_key_length");
+    max_string_length_name = PyUnicode_InternFromString("max_string_length");
+    max_keys_per_object_name = PyUnicode_InternFromString("max_keys_per_object");
+    if (scanstring == NULL || empty_tuple == NULL || empty_string == NULL || string_delimiter == NULL ||
+        null_literal == NULL || true_literal == NULL || false_literal == NULL || intern_name == NULL ||
+        max_depth_name == NULL || max_key_length_name == NULL || max_string_length_name == NULL ||
+        max_keys_per_object_name == NULL) {
+        return NULL;
+    }
+
+    module = PyModule_Create(&module_definition);
+    if (module == NULL) {
+        return NULL;
+    }
+    if (PyModule_AddObjectRef(module, "ParsingContext", (PyObject *)&ParsingContextType) < 0) {
+        Py_DECREF(module);
+        return NULL;
+    }
+    return module;
+}
@@ -0,0 +1,1039 @@
+import argparse
+import copy
+import dataclasses
+import gc
+import importlib.util
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from collections.abc import Callable, Mapping, Sequence
+from unittest import mock
+
+import hedi_sassi_streaming_json_parser
+from hedi_sassi_streaming_json_parser import (
+    KeyCache,
+    ParserLimits,
+    ParserStats,
+    StreamingJsonParser,
+    StreamingJsonParserPool,
+    parse_documents_in_parallel,
+)
+
+# Benchmarks
+# Run with `python3 benchmark_streaming_json_parser.py`
+# Every benchmark is run offline on synthetic documents generated from a fixed seed so that results can be compared
+# between runs. Each case streams a document in chunks of a fixed size and reports:
+#   - the throughput (MB/s of input, best of --repeat runs)
+#   - the latency percentiles of a single consume() (or consume() + get() when polling) call
+#   - the peak memory traced while parsing, the chunks themselves excluded
+#
+# Regressions
+# `--save-baseline baseline.json` records the results and `--baseline baseline.json` compares a run against them,
+# exiting with status 1 when the throughput drops or the peak memory grows by more than --threshold.
+# Only compare baselines recorded on the same machine and Python version.
+#
+# Scaling
+# Every document is also parsed at 4 times its size: the parsing time of a linear parser grows 4 times while an
+# accidental O(n²) step makes it grow 16 times. The run fails when the time per chunk grows more than MAX_SCALING
+# times, this check does not need a baseline. Polling snapshot() and the get() of a lazy parser after every chunk is
+# checked too, polling get() is not: it returns a new copy of the whole object every time. When the accelerator is
+# built the check is run with both the compiled and the Python loop.
+
+
+CHUNK_SIZES = (1, 16, 256, 4096, 65536)
+# get() returns a new object every call, polling after every character only measures copies
+POLLING_CHUNK_SIZES = (16, 256, 4096)
+SCALING_CHUNK_SIZE = 64
+SCALING_FACTOR = 4
+MAX_SCALING = 2.0
+# peak memory differences below this are allocator noise
+MEMORY_NOISE_FLOOR = 16 * 1024
+
+WORDS = (
+    "the model streams its answer token by token so the parser only ever sees a prefix of the final document "
+    "while the user interface renders every partial value as soon as it arrives"
+).split()
+
+
+def generate_text(generator: random.Random, length: int) -> str:
+    words: list[str] = []
+    text_length: int = 0
+    while text_length < length:
+        words.append(generator.choice(WORDS))
+        text_length += len(words[-1]) + 1
+
+    return " ".join(words)
+
+
+def generate_document(text: str, key_count: int, seed: int = 0) -> dict:
+    generator: random.Random = random.Random(seed)
+    return {f"key{i}": text * generator.randint(1, 20) for i in range(key_count)}
+
+
+def generate_mixed_document(key_count: int, seed: int = 0) -> dict:
+    generator: random.Random = random.Random(seed)
+    return {
+        f"key{i}": [
+            generator.randint(-(10**6), 10**6),
+            generator.random(),
+            generator.choice((True, False, None)),
+            'lorem "ipsum"\\dolor\n' * generator.randint(1, 5),
+        ]
+        for i in range(key_count)
+    }
+
+
+def generate_llm_answer(size: int, seed: int = 0) -> str:
+    # messages shaped like the structured output of a model: free text, a tool call and a few scalars
+    generator: random.Random = random.Random(seed)
+    document: dict = {}
+    document_length: int = 0
+    while document_length < size:
+        message: dict = {
+            "reasoning": generate_text(generator, generator.randint(200, 1500)),
+            "tool_call": {
+                "name": generator.choice(("search", "calculator", "browser")),
+                "arguments": {"query": generate_text(generator, 60), "top_k": 5},
+            },
+            "answer": generate_text(generator, generator.randint(50, 500)),
+            "confidence": round(generator.random(), 3),
+            "citations": [generator.randint(1, 100) for _ in range(3)],
+            "final": False,
+        }
+        document[f"message{len(document)}"] = message
+        document_length += len(json.dumps(message)) + 16
+
+    return json.dumps(document)
+
+
+def generate_long_string(size: int, seed: int = 0) -> str:
+    return json.dumps({"answer": generate_text(random.Random(seed), size)})
+
+
+def generate_wide_object(size: int, seed: int = 0) -> str:
+    generator: random.Random = random.Random(seed)
+    return json.dumps({f"key{i}": generator.choice(WORDS) for i in range(size // 16)})
+
+
+def generate_deep_nesting(size: int, seed: int = 0) -> str:
+    # built by hand, json.dumps would hit the recursion limit
+    depth: int = size // 7
+    return '{"a": ' * depth + '"leaf"' + "}" * depth
+
+
+def generate_mixed(size: int, seed: int = 0) -> str:
+    return json.dumps(generate_mixed_document(size // 80, seed))
+
+
+def generate_ndjson(size: int, seed: int = 0) -> str:
+    # one LLM-like answer per line
+    generator: random.Random = random.Random(seed)
+    lines: list[str] = []
+    ndjson_length: int = 0
+    while ndjson_length < size:
+        lines.append(
+            json.dumps(
+                {
+                    "id": len(lines),
+                    "answer": generate_text(generator, generator.randint(50, 500)),
+                    "usage": {"tokens": generator.randint(10, 1000)},
+                }
+            )
+        )
+        ndjson_length += len(lines[-1]) + 1
+
+    return "\n".join(lines) + "\n"
+
+
+@dataclasses.dataclass(slots=True)
+class Usage:
+    tokens: int
+
+
+# the typed record of a line of generate_ndjson()
+@dataclasses.dataclass(slots=True)
+class Answer:
+    id: int
+    answer: str
+    usage: Usage
+
+
+# name -> generator of a JSON document of about the given number of characters
+SCENARIOS: dict[str, Callable[[int], str]] = {
+    "llm_answer": generate_llm_answer,
+    "long_string": generate_long_string,
+    "wide_object": generate_wide_object,
+    "deep_nesting": generate_deep_nesting,
+    "mixed": generate_mixed,
+    "ndjson": generate_ndjson,
+}
+
+# (scenario, mode, chunk sizes)
+CASES: tuple = (
+    ("llm_answer", "consume", CHUNK_SIZES),
+    ("llm_answer", "consume_bytes", CHUNK_SIZES),
+    ("llm_answer", "instrumented", CHUNK_SIZES),
+    ("llm_answer", "limited", CHUNK_SIZES),
+    ("llm_answer", "poll", POLLING_CHUNK_SIZES),
+    ("llm_answer", "lazy_poll", POLLING_CHUNK_SIZES),
+    ("long_string", "consume", CHUNK_SIZES),
+    ("long_string", "poll", POLLING_CHUNK_SIZES),
+    ("wide_object", "consume", CHUNK_SIZES),
+    # key-dense documents go through the fast paths, with limits too
+    ("wide_object", "limited", CHUNK_SIZES),
+    ("wide_object", "snapshot_poll", POLLING_CHUNK_SIZES),
+    ("deep_nesting", "consume", CHUNK_SIZES),
+    ("deep_nesting", "poll", POLLING_CHUNK_SIZES),
+    ("deep_nesting", "lazy_poll", POLLING_CHUNK_SIZES),
+    ("mixed", "consume", CHUNK_SIZES),
+    ("mixed", "limited", CHUNK_SIZES),
+    ("ndjson", "consume_documents", CHUNK_SIZES),
+    # building the records in the parser against validating the documents afterwards
+    ("ndjson", "schema_documents", CHUNK_SIZES),
+    ("ndjson", "validated_documents", CHUNK_SIZES),
+)
+# (scenario, mode) checked by check_scaling() besides consuming every scenario
+POLLING_SCALING_CASES: tuple = (
+    ("wide_object", "snapshot_poll"),
+    ("mixed", "snapshot_poll"),
+    ("deep_nesting", "snapshot_poll"),
+    ("wide_object", "lazy_poll"),
+    ("mixed", "lazy_poll"),
+    ("deep_nesting", "lazy_poll"),
+)
+
+
+def split_in_chunks(data: Sequence, chunk_size: int) -> list:
+    return [data[i : i + chunk_size] for i in range(0, len(data), chunk_size)]
+
+
+def time_best_of(function: Callable[[], None], repeat: int = 3) -> float:
+    best_time: float = float("inf")
+    for _ in range(repeat):
+        gc.collect()
+        start_time: float = time.perf_counter()
+        function()
+        best_time = min(best_time, time.perf_counter() - start_time)
+
+    return best_time
+
+
+def percentile(sorted_values: Sequence[float], fraction: float) -> float:
+    # nearest rank
+    return sorted_values[
+        min(len(sorted_values) - 1, int(fraction * len(sorted_values)))
+    ]
+
+
+def load_pure_python_module():
+    # a second copy of the module imported while the accelerator is hidden, it always uses the Python loop
+    spec = importlib.util.find_spec("hedi_sassi_streaming_json_parser")
+    pure_module = importlib.util.module_from_spec(spec)
+    with mock.patch.dict(sys.modules, {"_hedi_sassi_streaming_json_parser": None}):
+        spec.loader.exec_module(pure_module)
+    return pure_module
+
+
+def build_parser(
+    mode: str, parser_type: type[StreamingJsonParser] = StreamingJsonParser
+) -> StreamingJsonParser:
+    return parser_type(
+        lazy=mode == "lazy_poll",
+        stats=ParserStats() if mode == "instrumented" else None,
+        # every limit is checked but none is reached
+        limits=(
+            ParserLimits(
+                max_depth=1000,
+                max_key_length=1 << 20,
+                max_string_length=1 << 20,
+                max_total_characters=1 << 40,
+                max_keys_per_object=1 << 20,
+            )
+            if mode == "limited"
+            else None
+        ),
+        schema=Answer if mode == "schema_documents" else None,
+    )
+
+
+def build_step(
+    mode: str, parser_type: type[StreamingJsonParser] = StreamingJsonParser
+) -> Callable[[StreamingJsonParser, str | bytes], None]:
+    if mode in ("consume", "instrumented", "limited"):
+        return parser_type.consume
+    if mode == "consume_bytes":
+        return parser_type.consume_bytes
+    if mode in ("consume_documents", "schema_documents"):
+        return parser_type.consume_documents
+
+    def consume_and_validate_documents(parser: StreamingJsonParser, chunk: str) -> None:
+        for document in parser.consume_documents(chunk):
+            Answer(document["id"], document["answer"], Usage(**document["usage"]))
+
+    if mode == "validated_documents":
+        return consume_and_validate_documents
+
+    def consume_and_get(parser: StreamingJsonParser, chunk: str) -> None:
+        parser.consume(chunk)
+        parser.get()
+
+    def consume_and_snapshot(parser: StreamingJsonParser, chunk: str) -> None:
+        parser.consume(chunk)
+        parser.snapshot()
+
+    if mode == "snapshot_poll":
+        return consume_and_snapshot
+
+    def consume_and_read_first_value(parser: StreamingJsonParser, chunk: str) -> None:
+        # a consumer of a lazy object only pays for the values it reads
+        parser.consume(chunk)
+        for _ in parser.get().values():
+            break
+
+    return consume_and_get if mode == "poll" else consume_and_read_first_value
+
+
+def run_case(json_string: str, mode: str, chunk_size: int, repeat: int) -> dict:
+    """
+    Measure the throughput, the latency percentiles and the peak memory of streaming a document
+
+    Args:
+        json_string (str): The document
+        mode (str): "consume", "consume_bytes", "consume_documents", "instrumented" (consume() with stats), "limited"
+            (consume() with limits), "poll" (get() after every chunk), "snapshot_poll" (snapshot() after every chunk)
+            or "lazy_poll" (get() on a lazy parser after every chunk, reading only its first value)
+        chunk_size (int): The size of the chunks in characters (bytes for consume_bytes)
+        repeat (int): The number of runs the throughput is the best of
+
+    Returns:
+        dict: The metrics of the case
+    """
+
+    data: str | bytes = json_string.encode() if mode == "consume_bytes" else json_string
+    chunks: list = split_in_chunks(data, chunk_size)
+    step: Callable[[StreamingJsonParser, str | bytes], None] = build_step(mode)
+
+    def parse() -> None:
+        parser = build_parser(mode)
+        for chunk in chunks:
+            step(parser, chunk)
+
+    elapsed_time: float = time_best_of(parse, repeat)
+
+    latencies: list[int] = []
+    parser: StreamingJsonParser = build_parser(mode)
+    for chunk in chunks:
+        start_time: int = time.perf_counter_ns()
+        step(parser, chunk)
+        latencies.append(time.perf_counter_ns() - start_time)
+    latencies.sort()
+
+    gc.collect()
+    tracemalloc.start()
+    parse()
+    peak_memory: int = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return {
+        "throughput_mb_s": len(data) / elapsed_time / 1e6,
+        "latency_p50_us": percentile(latencies, 0.50) / 1e3,
+        "latency_p90_us": percentile(latencies, 0.90) / 1e3,
+        "latency_p99_us": percentile(latencies, 0.99) / 1e3,
+        "latency_max_us": latencies[-1] / 1e3,
+        "peak_memory_kib": peak_memory / 1024,
+    }
+
+
+def run_suite(
+    size: int, repeat: int, case_filter: str, failures: list[str]
+) -> dict[str, dict]:
+    """
+    Run the cases and print their metrics
+
+    Args:
+        size (int): The approximate size of the documents in characters
+        repeat (int): The number of runs the throughput is the best of
+        case_filter (str): Only run the cases whose name contains this string
+        failures (list[str]): The cases raising an error are added to this list
+
+    Returns:
+        dict[str, dict]: The metrics of every case by name
+    """
+
+    results: dict[str, dict] = {}
+    print(
+        f"{'case':<40} {'MB/s':>8} {'p50 us':>9} {'p90 us':>9}"
+        f" {'p99 us':>9} {'max us':>10} {'peak KiB':>10}"
+    )
+    for scenario, mode, chunk_sizes in CASES:
+        json_string: str = SCENARIOS[scenario](size)
+        for chunk_size in chunk_sizes:
+            name: str = f"{scenario}/{mode}/chunk={chunk_size}"
+            if case_filter not in name:
+                continue
+
+            try:
+                metrics: dict = run_case(json_string, mode, chunk_size, repeat)
+            except Exception as error:
+                # keep measuring the other cases, the error fails the run
+                failures.append(f"{name}: {type(error).__name__}")
+                print(f"{name:<40} {type(error).__name__}")
+                continue
+
+            results[name] = metrics
+            print(
+                f"{name:<40} {metrics['throughput_mb_s']:8.2f}"
+                f" {metrics['latency_p50_us']:9.2f} {metrics['latency_p90_us']:9.2f}"
+                f" {metrics['latency_p99_us']:9.2f} {metrics['latency_max_us']:10.1f}"
+                f" {metrics['peak_memory_kib']:10.1f}"
+            )
+
+    return results
+
+
+def check_scaling(size: int, repeat: int, case_filter: str) -> list[str]:
+    """
+    Parse every scenario (and poll the ones of POLLING_SCALING_CASES) at two sizes and report the ones whose parsing
+    time grows faster than linearly, with the compiled accelerator and the Python loop when it is built
+
+    Returns:
+        list[str]: The scenarios failing the check, with their mode and backend
+    """
+
+    backends: dict[str, type[StreamingJsonParser]] = {"python": StreamingJsonParser}
+    if hedi_sassi_streaming_json_parser._accelerator is not None:
+        backends = {
+            "accelerated": StreamingJsonParser,
+            "python": load_pure_python_module().StreamingJsonParser,
+        }
+
+    failures: list[str] = []
+    print(
+        f"\nscaling from {size} to {size * SCALING_FACTOR} characters (1.0 is linear)"
+    )
+    for backend, parser_type in backends.items():
+        for scenario, mode in (
+            *((scenario, "consume") for scenario in SCENARIOS),
+            *POLLING_SCALING_CASES,
+        ):
+            if case_filter not in scenario:
+                continue
+
+            step: Callable[[StreamingJsonParser, str], None] = build_step(
+                mode, parser_type
+            )
+            chunk_times: list[float] = []
+            for scaled_size in (size, size * SCALING_FACTOR):
+                chunks: list[str] = split_in_chunks(
+                    SCENARIOS[scenario](scaled_size), SCALING_CHUNK_SIZE
+                )
+
+                def parse() -> None:
+                    parser = build_parser(mode, parser_type)
+                    for chunk in chunks:
+                        step(parser, chunk)
+
+                # normalize by the number of chunks, the generators only approximate the size
+                chunk_times.append(time_best_of(parse, repeat) / len(chunks))
+
+            scaling: float = chunk_times[1] / chunk_times[0]
+            print(
+                f"  {backend:<12} {scenario:<14} {mode:<14} {scaling:5.2f}"
+                f" {'ok' if scaling <= MAX_SCALING else 'FAIL'}"
+            )
+            if scaling > MAX_SCALING:
+                failures.append(f"{scenario} ({mode}, {backend})")
+
+    return failures
+
+
+def benchmark_parallel(size: int, repeat: int) -> None:
+    """
+    Parse an NDJSON file with parse_documents_in_parallel() on an increasing number of processes
+    """
+
+    cpu_count: int = os.cpu_count() or 1
+    file_descriptor, path = tempfile.mkstemp(suffix=".ndjson")
+    try:
+        with os.fdopen(file_descriptor, "w") as file:
+            file.write(generate_ndjson(size))
+        file_size: int = os.path.getsize(path)
+
+        def parse_serially() -> None:
+            with open(path) as file:
+                StreamingJsonParser().consume_documents(file.read())
+
+        serial_time: float = time_best_of(parse_serially, repeat)
+        print(f"\nparallel NDJSON parsing of {file_size} bytes ({cpu_count} CPUs)")
+        print(f"  serial         {file_size / serial_time / 1e6:7.2f} MB/s")
+
+        process_counts: list[int] = sorted(
+            {
+                1,
+                *(2**i for i in range(cpu_count.bit_length()) if 2**i <= cpu_count),
+                cpu_count,
+            }
+        )
+        for processes in process_counts:
+
+            def parse_in_parallel() -> None:
+                for _ in parse_documents_in_parallel(
+                    path,
+                    processes=processes,
+                    batch_size=file_size // (4 * processes) + 1,
+                ):
+                    pass
+
+            parallel_time: float = time_best_of(parse_in_parallel, repeat)
+            print(
+                f"  processes={processes:<4} {file_size / parallel_time / 1e6:7.2f} MB/s"
+                f" speedup={serial_time / parallel_time:5.2f}"
+            )
+    finally:
+        os.remove(path)
+
+
+def benchmark_checkpoint(size: int, repeat: int) -> None:
+    """
+    Compare checkpoint() and restore() with replaying the stream from its start, in the middle of every scenario
+    """
+
+    print("\ncheckpoint in the middle of the document")
+    for scenario, generate in SCENARIOS.items():
+        json_string: str = generate(size)
+        consumed: str = json_string[: len(json_string) // 2]
+        parser: StreamingJsonParser = StreamingJsonParser()
+        parser.consume(consumed)
+        checkpoint: bytes = parser.checkpoint()
+
+        checkpoint_time: float = time_best_of(parser.checkpoint, repeat)
+        restore_time: float = time_best_of(
+            lambda: StreamingJsonParser.restore(checkpoint), repeat
+        )
+        replay_time: float = time_best_of(
+            lambda: StreamingJsonParser().consume(consumed), repeat
+        )
+        print(
+            f"  {scenario:<14} consumed={len(consumed):>9} size={len(checkpoint):>9}"
+            f" checkpoint={checkpoint_time * 1e3:8.3f}ms"
+            f" restore={restore_time * 1e3:8.3f}ms"
+            f" replay={replay_time * 1e3:8.3f}ms"
+        )
+
+
+def benchmark_key_cache(size: int, repeat: int) -> None:
+    """
+    Compare parsing documents with and without a KeyCache: throughput and memory of the documents kept, with the
+    compiled accelerator and the Python loop when it is built
+    """
+
+    backends: dict[str, type[StreamingJsonParser]] = {"python": StreamingJsonParser}
+    if hedi_sassi_streaming_json_parser._accelerator is not None:
+        backends = {
+            "accelerated": StreamingJsonParser,
+            "python": load_pure_python_module().StreamingJsonParser,
+        }
+
+    # the lines of the NDJSON stream as the elements of an array, so the compiled loop can consume them
+    ndjson: str = generate_ndjson(size)
+    json_string: str = '{"documents": [' + ", ".join(ndjson.splitlines()) + "]}"
+    chunks: list[str] = split_in_chunks(json_string, 256)
+    print(f"\nkey cache on {len(json_string)} characters of documents")
+    for backend, parser_type in backends.items():
+        for key_cache in (None, KeyCache()):
+
+            def parse() -> StreamingJsonParser:
+                parser: StreamingJsonParser = parser_type(key_cache=key_cache)
+                for chunk in chunks:
+                    parser.consume(chunk)
+                return parser
+
+            elapsed: float = time_best_of(parse, repeat)
+            gc.collect()
+            tracemalloc.start()
+            parser: StreamingJsonParser = parse()
+            kept_memory: int = tracemalloc.get_traced_memory()[0]
+            tracemalloc.stop()
+            del parser
+            print(
+                f"  {backend:<12} key_cache={'on ' if key_cache else 'off'}"
+                f" {len(json_string) / elapsed / 1e6:7.2f} MB/s"
+                f" documents kept={kept_memory / 1024:9.1f} KiB"
+            )
+
+
+# the state of a stream between two chunks -> the chunks consumed so far
+STREAM_STATES: dict[str, str] = {
+    "idle": "",
+    "open_string": '{"answer": "The',
+    "open_nested": '{"tool_call": {"name": "search", "arguments": {"query": ',
+}
+
+
+def benchmark_memory_per_stream(stream_count: int) -> None:
+    """
+    Measure the memory of every stream of a StreamingJsonParserPool in a few states, with the compiled accelerator
+    and the Python loop when it is built
+    """
+
+    backends: dict[str, object] = {"python": hedi_sassi_streaming_json_parser}
+    if hedi_sassi_streaming_json_parser._accelerator is not None:
+        backends = {
+            "accelerated": hedi_sassi_streaming_json_parser,
+            "python": load_pure_python_module(),
+        }
+
+    print(f"\nmemory per stream of {stream_count} streams (bytes)")
+    for backend, module in backends.items():
+        for state, chunk in STREAM_STATES.items():
+            # the pool creates the parsers of its own module
+            pool: StreamingJsonParserPool = module.StreamingJsonParserPool()
+            gc.collect()
+            tracemalloc.start()
+            for stream_id in range(stream_count):
+                pool.consume(stream_id, chunk)
+            stream_memory: int = tracemalloc.get_traced_memory()[0]
+            tracemalloc.stop()
+            print(f"  {backend:<12} {state:<12} {stream_memory / stream_count:7.1f}")
+
+
+def benchmark_accelerator(size: int, repeat: int) -> None:
+    """
+    Compare the throughput of consume() with the compiled accelerator and with the Python loop on every scenario
+    """
+
+    if hedi_sassi_streaming_json_parser._accelerator is None:
+        print("\nthe accelerator is not built, see README.md")
+        return
+
+    pure_module = load_pure_python_module()
+    print("\naccelerator against the Python loop (MB/s of consume())")
+    for scenario, generate in SCENARIOS.items():
+        json_string: str = generate(size)
+        for chunk_size in (1, 256, 65536):
+            chunks: list[str] = split_in_chunks(json_string, chunk_size)
+            throughputs: list[float] = []
+            for parser_type in (StreamingJsonParser, pure_module.StreamingJsonParser):
+
+                def parse() -> None:
+                    parser: StreamingJsonParser = parser_type()
+                    for chunk in chunks:
+                        parser.consume(chunk)
+
+                throughputs.append(len(json_string) / time_best_of(parse, repeat) / 1e6)
+            print(
+                f"  {scenario:<14} chunk={chunk_size:<6}"
+                f" accelerated={throughputs[0]:8.2f} python={throughputs[1]:8.2f}"
+                f" speedup={throughputs[0] / throughputs[1]:6.2f}x"
+            )
+
+
+def benchmark_concurrent_readers(size: int, repeat: int) -> None:
+    """
+    Measure the throughput of a writer consuming while reader threads poll get() every millisecond, with and without
+    concurrent=True. The readers of a parser without concurrent=True can raise an error (or lose a slice) when the
+    writer changes the object they are copying, they are counted as errors.
+    """
+
+    json_string: str = generate_llm_answer(size)
+    chunks: list[str] = split_in_chunks(json_string, 16)
+    print(
+        f"\nwriter consuming {len(json_string)} characters in chunks of 16 while readers poll get() every millisecond"
+    )
+    for is_concurrent in (False, True):
+        for reader_count in (0, 1, 4):
+            elapsed_times: list[float] = []
+            read_count: int = 0
+            error_count: int = 0
+            for _ in range(repeat):
+                parser: StreamingJsonParser = StreamingJsonParser(
+                    concurrent=is_concurrent
+                )
+                is_started: threading.Event = threading.Event()
+                is_consumed: threading.Event = threading.Event()
+                # reads and errors of every reader
+                counts: list[list[int]] = [[0, 0] for _ in range(reader_count)]
+
+                def read(count: list[int]) -> None:
+                    is_started.wait()
+                    while not is_consumed.is_set():
+                        try:
+                            parser.get()
+                            count[0] += 1
+                        except RuntimeError:
+                            count[1] += 1
+                        time.sleep(0.001)
+
+                readers: list[threading.Thread] = [
+                    threading.Thread(target=read, args=(count,)) for count in counts
+                ]
+                for reader in readers:
+                    reader.start()
+                is_started.set()
+                start_time: float = time.perf_counter()
+                for chunk in chunks:
+                    parser.consume(chunk)
+                elapsed_times.append(time.perf_counter() - start_time)
+                is_consumed.set()
+                for reader in readers:
+                    reader.join()
+                read_count += sum(count[0] for count in counts)
+                error_count += sum(count[1] for count in counts)
+
+            print(
+                f"  concurrent={'on ' if is_concurrent else 'off'} readers={reader_count}"
+                f" writer={len(json_string) / min(elapsed_times) / 1e6:7.2f} MB/s"
+                f" reads={read_count / sum(elapsed_times):9.0f}/s"
+                f" errors={error_count}"
+            )
+
+
+def benchmark_sinks(size: int, repeat: int) -> None:
+    """
+    Compare streaming a long string value with get() after every chunk and with a sink: the throughput, the peak memory
+    and the delay between the start of the stream and the first character of the value reaching the consumer
+    """
+
+    value: str = generate_llm_answer(size)
+    json_string: str = json.dumps({"path": "answer.json", "content": value})
+    chunks: list[str] = split_in_chunks(json_string, 64)
+    print(f"\nstreaming a value of {len(value)} characters in chunks of 64")
+    for is_sink in (False, True):
+        # the delay until the first character of the value is received
+        first_slice_times: list[float] = []
+
+        def parse() -> None:
+            start_time: float = time.perf_counter()
+            received: list[int] = [0]
+
+            def receive(string_slice: str, is_last_slice: bool) -> None:
+                if not received[0] and string_slice:
+                    first_slice_times.append(time.perf_counter() - start_time)
+                received[0] += len(string_slice)
+
+            if is_sink:
+                parser = StreamingJsonParser(sinks={"content": receive})
+                for chunk in chunks:
+                    parser.consume(chunk)
+                return
+
+            parser = StreamingJsonParser()
+            for chunk in chunks:
+                parser.consume(chunk)
+                # a consumer of get() only receives the new suffix of the value
+                content: str = parser.get().get("content", "")
+                receive(content[received[0] :], False)
+
+        elapsed_time: float = time_best_of(parse, repeat)
+        gc.collect()
+        tracemalloc.start()
+        parse()
+        peak_memory: int = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print(
+            f"  {'sink' if is_sink else 'get()':<5}"
+            f" {len(json_string) / elapsed_time / 1e6:8.2f} MB/s"
+            f" peak memory={peak_memory / 1024:9.1f} KiB"
+            f" first slice={min(first_slice_times) * 1e6:7.1f} us"
+        )
+
+
+def copy_recursively(value: object) -> object:
+    # the copier of get() before it used a stack, kept as a reference
+    if isinstance(value, Mapping):
+        return {key: copy_recursively(nested) for key, nested in value.items()}
+
+    if type(value) is list or type(value) is tuple:
+        return [copy_recursively(nested) for nested in value]
+
+    return value
+
+
+def benchmark_copy(size: int, repeat: int) -> None:
+    """
+    Compare the copy made by get() with the previous recursive copier and copy.deepcopy() on wide and deep documents,
+    then the throughput of polling get() after every chunk with and without max_staleness
+    """
+
+    print("\ncopying the parsed object (ms per copy)")
+    for scenario in ("wide_object", "mixed", "deep_nesting"):
+        parser: StreamingJsonParser = StreamingJsonParser()
+        parser.consume(SCENARIOS[scenario](size))
+        snapshot: Mapping = parser.snapshot()
+        value: dict = parser.get()
+        timings: list[str] = []
+        for name, copy_value in (
+            ("get()", parser.get),
+            ("recursive", lambda: copy_recursively(snapshot)),
+            ("deepcopy", lambda: copy.deepcopy(value)),
+        ):
+            try:
+                timings.append(f"{name}={time_best_of(copy_value, repeat) * 1e3:9.3f}")
+            except RecursionError:
+                timings.append(f"{name}=RecursionError")
+        print(f"  {scenario:<14} {' '.join(timings)}")
+
+    print("\npolling get() after every chunk of 16 characters (MB/s)")
+    for scenario in ("llm_answer", "wide_object", "deep_nesting"):
+        json_string: str = SCENARIOS[scenario](size)
+        chunks: list[str] = split_in_chunks(json_string, 16)
+        throughputs: list[str] = []
+        for max_staleness in (None, 0.0, 0.001):
+
+            def poll() -> None:
+                parser: StreamingJsonParser = StreamingJsonParser()
+                for chunk in chunks:
+                    parser.consume(chunk)
+                    parser.get(max_staleness=max_staleness)
+
+            throughputs.append(
+                f"max_staleness={max_staleness}:"
+                f" {len(json_string) / time_best_of(poll, repeat) / 1e6:7.2f}"
+            )
+        print(f"  {scenario:<14} {' '.join(throughputs)}")
+
+
+# run in a new interpreter so the peak resident memory only belongs to one way of reading the file
+FILE_READING_SCRIPT = """
+import resource, sys, time
+from hedi_sassi_streaming_json_parser import StreamingJsonParser, parse_file
+mode, path = sys.argv[1:]
+start_time = time.perf_counter()
+if mode == "parse_file":
+    parse_file(path, select=["answer"])
+elif mode == "read":
+    with open(path, encoding="utf-8") as file:
+        StreamingJsonParser(select=["answer"]).consume(file.read())
+print(time.perf_counter() - start_time, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+"""
+
+
+def benchmark_parse_file(file_size_mb: int) -> None:
+    """
+    Compare the peak resident memory of parse_file() with reading the file into a str before consume().
+    Pass a size larger than the available memory to check that parse_file() stays bounded, reading then fails.
+    """
+
+    file_descriptor, path = tempfile.mkstemp(suffix=".json")
+    try:
+        # a short selected answer followed by a huge log which is skipped
+        text: str = generate_text(random.Random(0), 1 << 20)
+        with os.fdopen(file_descriptor, "w") as file:
+            file.write('{"answer": "42", "log": "')
+            for _ in range(file_size_mb):
+                file.write(text)
+            file.write('"}')
+        file_size: int = os.path.getsize(path)
+
+        print(
+            f"\nreading a {file_size / 2**20:.0f} MiB file (peak RSS of a new interpreter)"
+        )
+        for mode in ("import only", "parse_file", "read"):
+            completed_process = subprocess.run(
+                [sys.executable, "-c", FILE_READING_SCRIPT, mode, path],
+                capture_output=True,
+                text=True,
+                cwd=os.path.dirname(os.path.abspath(__file__)),
+            )
+            if completed_process.returncode != 0:
+                print(
+                    f"  {mode:<12} failed: {completed_process.stderr.strip().splitlines()[-1]}"
+                )
+                continue
+
+            elapsed_time, peak_rss_kib = completed_process.stdout.split()
+            throughput: str = (
+                f"{file_size / float(elapsed_time) / 1e6:9.2f} MB/s"
+                if mode != "import only"
+                else " " * 14
+            )
+            print(
+                f"  {mode:<12} {throughput} peak RSS={int(peak_rss_kib) / 1024:9.1f} MiB"
+            )
+    finally:
+        os.remove(path)
+
+
+def compare_with_baseline(
+    results: dict[str, dict], baseline: dict[str, dict], threshold: float
+) -> list[str]:
+    """
+    Compare the results with a baseline, the cases missing from either side are ignored
+
+    Returns:
+        list[str]: A description of every regression above the threshold
+    """
+
+    regressions: list[str] = []
+    for name, metrics in results.items():
+        baseline_metrics: dict | None = baseline.get(name)
+        if baseline_metrics is None:
+            continue
+
+        throughput: float = metrics["throughput_mb_s"]
+        baseline_throughput: float = baseline_metrics["throughput_mb_s"]
+        if throughput < baseline_throughput * (1 - threshold):
+            regressions.append(
+                f"{name}: throughput {throughput:.2f} MB/s < {baseline_throughput:.2f} MB/s"
+            )
+
+        peak_memory: float = metrics["peak_memory_kib"]
+        baseline_peak_memory: float = baseline_metrics["peak_memory_kib"]
+        if (
+            peak_memory > baseline_peak_memory * (1 + threshold)
+            and (peak_memory - baseline_peak_memory) * 1024 > MEMORY_NOISE_FLOOR
+        ):
+            regressions.append(
+                f"{name}: peak memory {peak_memory:.1f} KiB > {baseline_peak_memory:.1f} KiB"
+            )
+
+    return regressions
+
+
+def main(argv: Sequence[str] | None = None) -> int:
+    argument_parser = argparse.ArgumentParser(
+        description="Benchmarks of StreamingJsonParser"
+    )
+    argument_parser.add_argument(
+        "--size",
+        type=int,
+        default=100_000,
+        help="approximate size of the documents in characters",
+    )
+    argument_parser.add_argument("--repeat", type=int, default=3)
+    argument_parser.add_argument(
+        "--filter", default="", help="only run the cases containing this string"
+    )
+    argument_parser.add_argument("--baseline", help="compare with this baseline file")
+    argument_parser.add_argument(
+        "--save-baseline", help="save the results to this baseline file"
+    )
+    argument_parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.2,
+        help="relative change above which a difference is a regression",
+    )
+    argument_parser.add_argument(
+        "--skip-scaling", action="store_true", help="do not run the scaling check"
+    )
+    argument_parser.add_argument(
+        "--parallel",
+        action="store_true",
+        help="also measure parse_documents_in_parallel() on every CPU count",
+    )
+    argument_parser.add_argument(
+        "--file-size",
+        type=int,
+        default=0,
+        help="also compare parse_file() with reading a file of this many MiB",
+    )
+    argument_parser.add_argument(
+        "--checkpoint",
+        action="store_true",
+        help="also compare checkpoint() and restore() with replaying the stream",
+    )
+    argument_parser.add_argument(
+        "--key-cache",
+        action="store_true",
+        help="also compare parsing documents with and without a KeyCache",
+    )
+    argument_parser.add_argument(
+        "--accelerator",
+        action="store_true",
+        help="also compare consume() with the compiled accelerator and the Python loop",
+    )
+    argument_parser.add_argument(
+        "--concurrency",
+        action="store_true",
+        help="also measure the writer throughput while reader threads poll get()",
+    )
+    argument_parser.add_argument(
+        "--copy",
+        action="store_true",
+        help="also compare the copy made by get() with deepcopy and get(max_staleness=...)",
+    )
+    argument_parser.add_argument(
+        "--sinks",
+        action="store_true",
+        help="also compare streaming a long value with get() and with a sink",
+    )
+    argument_parser.add_argument(
+        "--memory",
+        action="store_true",
+        help="also measure the memory of every stream of a StreamingJsonParserPool",
+    )
+    arguments = argument_parser.parse_args(argv)
+
+    failures: list[str] = []
+    results: dict[str, dict] = run_suite(
+        arguments.size, arguments.repeat, arguments.filter, failures
+    )
+    if not arguments.skip_scaling:
+        failures.extend(
+            f"{scenario}: parsing time grows faster than the input"
+            for scenario in check_scaling(
+                arguments.size, arguments.repeat, arguments.filter
+            )
+        )
+
+    if arguments.parallel:
+        benchmark_parallel(arguments.size * 100, arguments.repeat)
+
+    if arguments.key_cache:
+        benchmark_key_cache(arguments.size * 10, arguments.repeat)
+
+    if arguments.accelerator:
+        benchmark_accelerator(arguments.size, arguments.repeat)
+
+    if arguments.concurrency:
+        benchmark_concurrent_readers(arguments.size, arguments.repeat)
+
+    if arguments.copy:
+        benchmark_copy(arguments.size, arguments.repeat)
+
+    if arguments.sinks:
+        benchmark_sinks(arguments.size * 10, arguments.repeat)
+
+    if arguments.checkpoint:
+        benchmark_checkpoint(arguments.size, arguments.repeat)
+
+    if arguments.memory:
+        benchmark_memory_per_stream(10_000)
+
+    if arguments.file_size:
+        benchmark_parse_file(arguments.file_size)
+
+    if arguments.save_baseline:
+        with open(arguments.save_baseline, "w") as baseline_file:
+            json.dump(
+                {"python": sys.version, "size": arguments.size, "results": results},
+                baseline_file,
+                indent=2,
+            )
+
+    if arguments.baseline:
+        with open(arguments.baseline) as baseline_file:
+            baseline: dict = json.load(baseline_file)
+        if baseline["size"] != arguments.size:
+            print(f"the baseline was recorded with --size {baseline['size']}")
+            return 2
+
+        failures.extend(
+            compare_with_baseline(results, baseline["results"], arguments.threshold)
+        )
+
+    for failure in failures:
+        print(f"FAILED {failure}")
+
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
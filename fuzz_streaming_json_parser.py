@@ -0,0 +1,405 @@
+import argparse
+import importlib.util
+import json
+import random
+import sys
+import time
+from collections.abc import Callable, Iterator, Sequence
+from unittest import mock
+
+import hedi_sassi_streaming_json_parser
+from hedi_sassi_streaming_json_parser import StreamingJsonParser
+
+# Fuzzing
+# Run with `python3 fuzz_streaming_json_parser.py`
+# Random documents (strings with escapes, surrogate pairs and non-ASCII characters, numbers, literals, nested objects
+# and arrays) are generated from a seed, serialized with random formatting and streamed with every chunking pattern.
+# After every chunk get() must be a prefix of the final document:
+#   - the keys are a prefix of the final keys, in the same order
+#   - a string is a prefix of the final string and an array a prefix of the final array, its last element (the one
+#     being built) being a prefix of the final element
+#   - every other value (a number, a literal or a nested object) is already equal to its final value
+# and the last get() must be equal to json.loads(). Each state is also compared with the previous one, so a value
+# can never go backwards between two chunks.
+# When the accelerator is built every chunking is parsed by the compiled loop and by the Python loop, which must
+# return the same state after every chunk.
+#
+# Throughput
+# The time spent in consume() (the checks excluded) is recorded per chunking pattern and backend, so that an
+# optimization of the scanner can be checked for both correctness and speed in the same run.
+# `--save-baseline fuzz.json` records it and `--baseline fuzz.json` compares a run against it, like the benchmarks.
+
+
+# the pieces of the generated strings, json.dumps() escapes the quotes, backslashes and control characters
+STRING_PIECES = (
+    "",
+    "plain",
+    'say "hi"\\',
+    "tab\tnew\nline",
+    "été €",
+    "\U0001f600!",
+    " \x1f",
+    "{[,:]}",
+)
+# documents longer than this are split at random boundaries instead of every boundary
+MAX_EVERY_BOUNDARY_LENGTH = 1000
+RANDOM_BOUNDARY_COUNT = 200
+
+
+def generate_string(rng: random.Random) -> str:
+    return "".join(rng.choice(STRING_PIECES) for _ in range(rng.randrange(6)))
+
+
+def generate_document(rng: random.Random, max_depth: int = 4) -> dict:
+    """
+    Generate a random document, nested values are generated with a stack instead of recursion
+
+    Args:
+        rng (random.Random): The source of randomness
+        max_depth (int): The maximum number of nested objects and arrays
+
+    Returns:
+        dict: A document which can be serialized by json.dumps()
+    """
+
+    document: dict = {}
+    # (container, depth) of the containers which still need their values
+    pending_containers: list[tuple[dict | list, int]] = [(document, 0)]
+    while pending_containers:
+        container, depth = pending_containers.pop()
+        for _ in range(rng.randrange(6)):
+            kind: int = rng.randrange(7 if depth < max_depth else 5)
+            value: object
+            if kind == 0:
+                value = generate_string(rng)
+            elif kind == 1:
+                value = rng.choice((None, True, False))
+            elif kind == 2:
+                value = rng.randint(-(10**20), 10**20)
+            elif kind == 3:
+                value = rng.uniform(-1e6, 1e6) * 10 ** rng.randint(-30, 30)
+            elif kind == 4:
+                value = rng.choice(STRING_PIECES) * rng.randrange(40)
+            else:
+                value = {} if kind == 5 else []
+                pending_containers.append((value, depth + 1))
+
+            if isinstance(container, dict):
+                container[generate_string(rng)] = value
+            else:
+                container.append(value)
+
+    return document
+
+
+def serialize_document(rng: random.Random, document: dict) -> str:
+    # escaped or raw non-ASCII characters, compact or indented
+    return json.dumps(
+        document,
+        ensure_ascii=rng.random() < 0.5,
+        indent=rng.choice((None, None, 0, 2)),
+        separators=rng.choice((None, (",", ":"))),
+    )
+
+
+def split_at(data: str | bytes, offsets: Sequence[int]) -> list:
+    return [data[start:end] for start, end in zip(offsets, offsets[1:]) if start != end]
+
+
+def split_randomly(rng: random.Random, data: str | bytes, max_chunk_size: int) -> list:
+    offsets: list[int] = [0]
+    while offsets[-1] < len(data):
+        offsets.append(min(len(data), offsets[-1] + rng.randint(1, max_chunk_size)))
+    return split_at(data, offsets)
+
+
+def chunk_every_boundary(rng: random.Random, text: str) -> Iterator[list[str]]:
+    # two chunks split at every boundary (or at random boundaries of a long document)
+    boundaries: Sequence[int] = range(1, len(text))
+    if len(text) > MAX_EVERY_BOUNDARY_LENGTH:
+        boundaries = sorted(rng.sample(boundaries, RANDOM_BOUNDARY_COUNT))
+    for boundary in boundaries:
+        yield split_at(text, (0, boundary, len(text)))
+
+
+# name -> generator of the chunkings of a document, bytes chunks are consumed with consume_bytes()
+CHUNKING_PATTERNS: dict[str, Callable[[random.Random, str], Iterator[list]]] = {
+    "whole": lambda rng, text: iter(([text],)),
+    "every_boundary": chunk_every_boundary,
+    "characters": lambda rng, text: iter((list(text),)),
+    "random_small": lambda rng, text: iter((split_randomly(rng, text, 8),)),
+    "random_large": lambda rng, text: iter((split_randomly(rng, text, 1024),)),
+    # multi-byte characters split between two chunks
+    "utf8_bytes": lambda rng, text: iter(
+        (split_randomly(rng, text.encode("utf-8"), 8),)
+    ),
+}
+
+
+def find_prefix_violation(partial: object, complete: object) -> str | None:
+    """
+    Check that a partial state of the parser can still become the complete value
+
+    Args:
+        partial (object): The value returned by get() before the end of the stream
+        complete (object): The final value (or a later state of the parser)
+
+    Returns:
+        str | None: The path of the first value which is not a prefix of its complete value, None if there is none
+    """
+
+    # (partial, complete, path, is_last) where only the last value of a container can still be built
+    pending_values: list[tuple[object, object, str, bool]] = [
+        (partial, complete, "$", True)
+    ]
+    while pending_values:
+        partial, complete, path, is_last = pending_values.pop()
+        if not is_last or type(partial) is not type(complete):
+            if partial != complete:
+                return path
+
+        elif isinstance(partial, str):
+            if not complete.startswith(partial):
+                return path
+
+        elif isinstance(partial, dict):
+            # an open object is never exposed, except the top-level object
+            if path != "$":
+                if partial != complete:
+                    return path
+                continue
+
+            partial_keys: list[str] = list(partial)
+            if partial_keys != list(complete)[: len(partial_keys)]:
+                return path
+            pending_values.extend(
+                (partial[key], complete[key], f"{path}.{key}", key == partial_keys[-1])
+                for key in partial_keys
+            )
+
+        elif isinstance(partial, list):
+            if len(partial) > len(complete):
+                return path
+            pending_values.extend(
+                (
+                    element,
+                    complete[index],
+                    f"{path}[{index}]",
+                    index == len(partial) - 1,
+                )
+                for index, element in enumerate(partial)
+            )
+
+        elif partial != complete:
+            # numbers and literals are only exposed once they are complete
+            return path
+
+    return None
+
+
+def check_chunking(
+    parser_types: Sequence[type], chunks: list, expected: dict
+) -> tuple[str | None, list[float]]:
+    """
+    Stream the chunks into a parser of every type, checking every state
+
+    Args:
+        parser_types (Sequence[type]): The parsers to compare, e.g. the accelerated and the pure Python parser
+        chunks (list): The chunks of the document, str for consume() or bytes for consume_bytes()
+        expected (dict): The document, json.loads() of the joined chunks
+
+    Returns:
+        tuple[str | None, list[float]]: The first failure (None if there is none) and the time spent in consume()
+        by each parser type
+    """
+
+    parsers: list[StreamingJsonParser] = [parser_type() for parser_type in parser_types]
+    consume_times: list[float] = [0.0] * len(parsers)
+    previous_state: dict = {}
+    for chunk_index, chunk in enumerate(chunks):
+        states: list[dict] = []
+        for parser_index, parser in enumerate(parsers):
+            step: Callable = (
+                parser.consume_bytes if isinstance(chunk, bytes) else parser.consume
+            )
+            start_time: float = time.perf_counter()
+            try:
+                step(chunk)
+            except Exception as error:
+                return (
+                    f"chunk {chunk_index}: {parser_types[parser_index].__module__}"
+                    f" raised {type(error).__name__}: {error}",
+                    consume_times,
+                )
+            consume_times[parser_index] += time.perf_counter() - start_time
+            states.append(parser.get())
+
+        if any(state != states[0] for state in states):
+            return f"chunk {chunk_index}: the backends disagree", consume_times
+
+        violation: str | None = find_prefix_violation(states[0], expected)
+        if violation is not None:
+            return f"chunk {chunk_index}: {violation} is not a prefix", consume_times
+        violation = find_prefix_violation(previous_state, states[0])
+        if violation is not None:
+            return f"chunk {chunk_index}: {violation} went backwards", consume_times
+        previous_state = states[0]
+
+    if previous_state != expected:
+        return "the final state is not json.loads()", consume_times
+    return None, consume_times
+
+
+def load_pure_python_parser() -> type:
+    # a second copy of the module imported while the accelerator is hidden
+    spec = importlib.util.find_spec("hedi_sassi_streaming_json_parser")
+    pure_module = importlib.util.module_from_spec(spec)
+    with mock.patch.dict(sys.modules, {"_hedi_sassi_streaming_json_parser": None}):
+        spec.loader.exec_module(pure_module)
+    return pure_module.StreamingJsonParser
+
+
+def run_fuzzer(
+    seed: int,
+    document_count: int,
+    parser_types: Sequence[type],
+    failures: list[str],
+    pattern_filter: str = "",
+) -> dict[str, dict]:
+    """
+    Stream random documents with every chunking pattern and check every state of the parsers
+
+    Args:
+        seed (int): The seed of the documents and chunkings
+        document_count (int): The number of documents
+        parser_types (Sequence[type]): The parsers to compare
+        failures (list[str]): A description of every failing chunking is added to this list
+        pattern_filter (str): Only run the chunking patterns whose name contains this string
+
+    Returns:
+        dict[str, dict]: The characters consumed and the throughput of every parser type by chunking pattern
+    """
+
+    rng: random.Random = random.Random(seed)
+    characters: dict[str, int] = dict.fromkeys(CHUNKING_PATTERNS, 0)
+    consume_times: dict[str, list[float]] = {
+        pattern: [0.0] * len(parser_types) for pattern in CHUNKING_PATTERNS
+    }
+    for document_index in range(document_count):
+        text: str = serialize_document(rng, generate_document(rng))
+        expected: dict = json.loads(text)
+        for pattern, chunk_document in CHUNKING_PATTERNS.items():
+            if pattern_filter not in pattern:
+                continue
+
+            for chunks in chunk_document(rng, text):
+                failure, times = check_chunking(parser_types, chunks, expected)
+                characters[pattern] += len(text)
+                for parser_index, elapsed_time in enumerate(times):
+                    consume_times[pattern][parser_index] += elapsed_time
+                if failure is not None:
+                    offsets: list[int] = [0]
+                    for chunk in chunks[:-1]:
+                        offsets.append(offsets[-1] + len(chunk))
+                    failures.append(
+                        f"seed={seed} document={document_index} {pattern}: {failure}"
+                        f"\n  document={text!r}\n  chunks start at {offsets}"
+                    )
+                    # one failure per pattern and document is enough to reproduce it
+                    break
+
+    return {
+        pattern: {
+            "characters": characters[pattern],
+            "throughput_mb_s": [
+                characters[pattern] / elapsed_time / 1e6 if elapsed_time else 0.0
+                for elapsed_time in consume_times[pattern]
+            ],
+        }
+        for pattern in CHUNKING_PATTERNS
+        if characters[pattern]
+    }
+
+
+def main(argv: Sequence[str] | None = None) -> int:
+    argument_parser = argparse.ArgumentParser(
+        description="Differential chunking fuzzer of StreamingJsonParser"
+    )
+    argument_parser.add_argument("--seed", type=int, default=0)
+    argument_parser.add_argument(
+        "--documents", type=int, default=200, help="number of random documents"
+    )
+    argument_parser.add_argument(
+        "--filter",
+        default="",
+        help="only run the chunking patterns containing this string",
+    )
+    argument_parser.add_argument("--baseline", help="compare with this baseline file")
+    argument_parser.add_argument(
+        "--save-baseline", help="save the throughputs to this baseline file"
+    )
+    argument_parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.2,
+        help="relative throughput drop above which a pattern is a regression",
+    )
+    arguments = argument_parser.parse_args(argv)
+
+    parser_types: list[type] = [StreamingJsonParser]
+    backends: list[str] = [
+        "accelerated" if hedi_sassi_streaming_json_parser._accelerator else "python"
+    ]
+    if hedi_sassi_streaming_json_parser._accelerator is not None:
+        parser_types.append(load_pure_python_parser())
+        backends.append("python")
+
+    failures: list[str] = []
+    results: dict[str, dict] = run_fuzzer(
+        arguments.seed, arguments.documents, parser_types, failures, arguments.filter
+    )
+    print(
+        f"{'chunking':<16} {'characters':>12}"
+        + "".join(f" {backend + ' MB/s':>17}" for backend in backends)
+    )
+    for pattern, metrics in results.items():
+        print(
+            f"{pattern:<16} {metrics['characters']:>12}"
+            + "".join(
+                f" {throughput:17.2f}" for throughput in metrics["throughput_mb_s"]
+            )
+        )
+
+    if arguments.save_baseline:
+        with open(arguments.save_baseline, "w") as baseline_file:
+            json.dump(
+                {"python": sys.version, "backends": backends, "results": results},
+                baseline_file,
+                indent=2,
+            )
+
+    if arguments.baseline:
+        with open(arguments.baseline) as baseline_file:
+            baseline: dict = json.load(baseline_file)
+        for pattern, metrics in results.items():
+            baseline_metrics: dict | None = baseline["results"].get(pattern)
+            if baseline_metrics is None:
+                continue
+            for backend, throughput, baseline_throughput in zip(
+                backends,
+                metrics["throughput_mb_s"],
+                baseline_metrics["throughput_mb_s"],
+            ):
+                if throughput < baseline_throughput * (1 - arguments.threshold):
+                    failures.append(
+                        f"{pattern}/{backend}: throughput {throughput:.2f} MB/s < {baseline_throughput:.2f} MB/s"
+                    )
+
+    for failure in failures:
+        print(f"FAILED {failure}")
+
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
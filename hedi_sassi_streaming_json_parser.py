@@ -1,4 +1,39 @@
-import copy
+import asyncio
+import bisect
+import codecs
+import dataclasses
+import io
+import itertools
+import math
+import mmap
+import os
+import re
+import struct
+import sys
+import threading
+import time
+import typing
+from array import array
+from collections import deque
+from collections.abc import (
+    AsyncIterable,
+    AsyncIterator,
+    Callable,
+    Hashable,
+    Iterable,
+    Iterator,
+    Mapping,
+    Sequence,
+)
+from concurrent.futures import Future, ProcessPoolExecutor
+from json.decoder import scanstring
+from types import MappingProxyType, NoneType, UnionType
+
+try:
+    import _hedi_sassi_streaming_json_parser as _accelerator
+except ImportError:
+    # the compiled accelerator is optional, see README.md
+    _accelerator = None
 
 
 # Assumption 1:
@@ -7,6 +42,8 @@ import copy
 # "String values **on the other hand** can be partially returned"
 # I am assuming that partial string values can be returned but not partial (nested) objects.
 # So I will be waiting for the nested object to be closed by '}' before exposing its value
+# Arrays are exposed like strings: the elements parsed so far (and a partial string element) are returned.
+# Numbers, true, false and null are only exposed once their token is terminated since a prefix could be wrong.
 #
 # Assumption 2:
 # The problem could be solved with recursion but I am assuming it is possible to have more than 1000
@@ -15,12 +52,144 @@ import copy
 #
 # Assumption 3:
 # I did not include JSON validation and error handling as I am assuming that we consume a valid partial JSON each time
+# The top-level value is expected to be an object.
 
 
 # Complexity
 # The time complexity is linear with the size of the buffer consumed as we usually only process each character once.
-# The only exception is when searching for nested object boundaries where we can process commas and whitespaces twice (this overhead is constant)
+# Characters are never visited one by one in Python: str.find and precompiled regexes jump to the next structural
+# character and whole slices of keys and string values are appended to the buffers at once.
+# In long buffers (a file, a replayed response) the pairs of an object are mostly whole, a single precompiled regex
+# matches a whole "key": value pair (a string without escapes, a number or a literal) per step instead of dispatching
+# on the key and then on the value, the elements of arrays likewise. Short buffers (a token or so) do not try it, the
+# match would rarely succeed.
+# A string value streamed over many chunks is only kept as a list of slices while consuming, it is joined (once per
+# call) when get() exposes it, so consume() only ever pays for the new characters.
+# Escape sequences are decoded slice by slice when they are found, an incomplete escape at the end of a buffer (like
+# "\u00" or the first half of a surrogate pair) is carried over to the next one.
+# Strings of a buffer without any backslash are still ended by a single str.find, the escape-aware scan is only used
+# when the buffer contains a backslash or starts in the middle of an escape.
 # The memory complexity is linar with the number of consecutive nested object as we have to save the parsing context of all parent objects.
+# A parser is small enough to keep one per stream (see StreamingJsonParserPool): the parser and its contexts use
+# __slots__, the key, value and stack buffers share the empty tuple until they hold something across chunks and the
+# stack of parent contexts is a list, an array of pointers to the contexts (which the compiled loop and checkpoints
+# read as they are). The options and the state of the optional features are kept in a separate object which is shared
+# by all the parsers until one of them uses a feature, a parser without options only holds the state of the loop.
+
+# Snapshots
+# A nested object or array can not change anymore once it is closed (duplicate keys are not expected), so it is
+# frozen into a read-only MappingProxyType view or a tuple. snapshot() shares these frozen subtrees instead of copying
+# them. The visible open values (the top-level dict and the open arrays leading to the current context) are still
+# changing: their values are copied into sealed pages shared by the following snapshots, a new snapshot only copies the
+# values added since the previous one into a new page. The pages are merged like the digits of a binary counter so a
+# snapshot has O(log n) pages and polling snapshot() after every chunk stays linear with the size of the object.
+# Open values of a few keys are copied whole into a MappingProxyType or a tuple, reading them is faster.
+
+# Copies
+# get() copies the frozen containers of a snapshot into dicts and lists. The parser only builds a few exact types and
+# never a cycle, so every container is copied shallowly with dict.copy() or list() and only the nested containers are
+# visited, with a stack, instead of copying every value with a memo and a dispatch per type like copy.deepcopy().
+# The records of a schema are rebuilt from copies of their fields, the caller can modify them like the dicts.
+# get(max_staleness=...) returns the read-only snapshot instead of a copy, the previous one again while it is recent
+# enough, to bound the cost of a consumer polling faster than the values change without sharing a mutable value.
+
+# Patches
+# consume_patches() describes what changed in the output of get() as JSON-Patch (RFC 6902) like operations. Only
+# the top-level object and its open arrays are visible in get(): "add" is emitted when a string value starts, a
+# scalar is complete, an array is opened or a nested object is closed (with a copy of the object), and the
+# non-standard "append" op carries only the new suffix of a string value. The patches of a chunk are proportional to
+# its size, a closed nested object being copied exactly once.
+
+# Selection
+# With StreamingJsonParser(select=["a.b", "c"]) only the selected paths (and the objects leading to them) are built.
+# The selectors are stored as a tree of dicts where None selects the whole subtree, each parsing context keeping the
+# node of its object (the elements of an array share the node of the array). The value of a key which is not selected
+# is skipped structurally: strings are scanned for their closing delimiter without being buffered and objects and
+# arrays only by counting brackets, so nothing is allocated for them.
+
+# Schemas
+# StreamingJsonParser(schema=Message) builds the objects straight into the dataclasses (or NamedTuples) of the schema.
+# The type hints are compiled once into a selection tree whose nodes also know the record type of their object, so the
+# keys which are not fields are skipped like unselected keys and a closed object is passed as keyword arguments to
+# its record type instead of being frozen, without building an intermediate dict. The records are shared by
+# snapshots and consume_documents() like frozen objects but get() copies them, see Copies.
+
+# Sinks
+# With StreamingJsonParser(sinks={"files.content": sink}) the string values of a key path are sent to the sink slice by
+# slice as soon as they are scanned instead of being built, so a value of many megabytes goes through in constant
+# memory and is never exposed by get(). The sinks are stored on the nodes of the selection tree (the other keys of a
+# node stay selected unless select excludes them) and a sink value is skipped like an unselected value, the string
+# skipping loop decoding and forwarding every slice it jumps over. A value of another type is built as usual.
+
+# Keys
+# Every key is a new slice of the buffer, so a stream repeating the same few keys keeps a copy of them in every object.
+# StreamingJsonParser(key_cache=KeyCache()) replaces a complete key by the equal string already held by the cache, a
+# bounded table evicting the least recently used keys which can be shared by several parsers. It is looked up once
+# per key, never per character (by the compiled loop too), and the parsed objects then share their key strings.
+
+# Files
+# parse_file() memory-maps the file and consume_mmap() decodes it window by window, releasing the pages of every
+# consumed window. The whole text is never materialized: the memory used is about one window plus the parsed
+# object, which can be kept small with select for files larger than the available memory.
+
+# Documents
+# consume_documents() parses a stream of concatenated or newline-delimited objects: when the top-level object is
+# closed it is returned and the parser starts over with an empty object, so memory only holds the current document.
+# parse_documents_in_parallel() splits an NDJSON file at line ends into batches which are parsed by a process pool,
+# the batches being read by the processes themselves and their documents yielded in the order of the file.
+
+# Lazy values
+# With StreamingJsonParser(lazy=True) a string value received in several chunks keeps its slices instead of being
+# joined when it ends, and get() returns the snapshot() wrapped in a read-only LazyObject instead of a deep copy.
+# The joined string is built and cached the first time the value is read and nested objects and arrays are only
+# wrapped in views when they are accessed, so a consumer reading a few values only pays for them. The slices take
+# more memory than the joined string when the chunks are tiny, a value read once is only kept joined.
+
+# Limits
+# StreamingJsonParser(limits=ParserLimits(...)) bounds the depth, the length of keys and strings, the number of keys of
+# an object and the total number of characters consumed. The lengths are checked once per slice, the depth once per
+# opened container and the total once per consume() call, never per character. The fast paths of whole pairs and the
+# compiled loop check the pairs they build the same way and leave a pair which exceeds a limit (or could, for the
+# compiled loop) to the slow path of the Python loop. An exceeded limit raises a ParserLimitError or, with
+# truncate=True, cuts a string value or skips the value (with the machinery used for unselected values) so the memory
+# stays bounded either way. A key or a number is never cut into another one: the value of a longer key and a longer
+# number are skipped.
+
+# Checkpoints
+# checkpoint() serializes the whole state of the parser (the context stack with the partial keys and values, the
+# parsing flags and the escape and UTF-8 decoding state) so that another parser, possibly in another process, can
+# restore() it and consume the rest of the stream. The values are written as a flat sequence of 64-bit tokens
+# (the tag of the value and its length) followed by the text of all the strings and numbers encoded at once. The trees
+# are walked with a stack like everywhere else, so closed objects nested deeper than the recursion limit can be
+# checkpointed too, and closed values are frozen again when they are restored.
+
+# Instrumentation
+# StreamingJsonParser(stats=ParserStats()) counts the characters consumed by each phase, the contexts pushed and
+# popped, the maximum depth, the size of the containers copied by get() and the duration of every consume() and get()
+# call. The counters are collected by the loop of consume() itself (and by its fast paths of whole pairs, per batch of
+# pairs), a parser without stats only pays for one check per step. The compiled loop can not attribute its steps, a
+# parser with stats always runs the Python loop.
+
+# Concurrent readers
+# With StreamingJsonParser(concurrent=True) other threads can call get() and snapshot() while one thread consumes,
+# like a seqlock: consume() makes a version counter odd while it mutates the contexts and even again when it returns.
+# A reader builds the frozen snapshot without writing anything in the parser and only publishes it as a
+# (version, snapshot) pair if the version was even and did not change meanwhile, otherwise it returns the last
+# published snapshot and asks the writer to publish the next one when its current buffer is consumed. A lock only
+# serializes the publications so that a newer snapshot is never replaced by an older one: readers hold it for a
+# comparison and an assignment and the writer only tries to take it, publishing with the next buffer when it is
+# taken. The writer never waits for the readers and only copies the visible values once per buffer when a reader
+# asked for them, readers never see a torn state. The frozen snapshots share their closed values, so a reader copying
+# one for get() can not be disturbed by the writer.
+
+# Accelerator
+# The C module _hedi_sassi_streaming_json_parser (built from _hedi_sassi_streaming_json_parser.c) implements the
+# parsing context and the loop of consume(), it is imported automatically when it is built. The compiled loop reads and
+# writes the same contexts and escape state as the Python loop, so get(), snapshot() and checkpoint() do not know which
+# loop consumed a buffer. It stops before a token which could exceed a limit and the Python loop consumes the rest of
+# the buffer. Keys are interned through the key cache like in the Python loop. The other options (select, schema,
+# lazy, stats, patches and documents) keep using the Python loop, which is also used as is when the module is not
+# built.
 
 # Formatting
 # I used the Black Formatter with default configurations
@@ -29,84 +198,835 @@ import copy
 class StreamingJsonParser:
 
     __STRING_DELIMITER = '"'
+    __ESCAPE = "\\"
     __OBJECT_START = "{"
     __OBJECT_END = "}"
+    __ARRAY_START = "["
+    __ARRAY_END = "]"
     __COMMA = ","
 
+    # the tokens of all the other values except numbers
+    __LITERALS = {"null": None, "true": True, "false": False}
+
+    # precompiled scanners used to jump to the next structural character at C speed
+    __TARGET_OR_DELIMITER_PATTERNS = {
+        __OBJECT_END: re.compile(r'[}"]'),
+    }
+    # the first character which is not a separator gives the type of the value
+    __OBJECT_VALUE_START_PATTERN = re.compile(r"[^\s:]")
+    __ARRAY_VALUE_START_PATTERN = re.compile(r"[^\s,]")
+    __SCALAR_END_PATTERN = re.compile(r"[\s,}\]]")
+    __SKIPPED_CONTAINER_PATTERN = re.compile(r'[{}\[\]"]')
+    # a whole "key": value pair without escapes, the value being a string, a terminated scalar or the start of an
+    # object or array (which is then built by __build_current_value())
+    __PAIR_PATTERN = re.compile(
+        r'[\s,]*"([^"\\]*)"\s*:\s*(?:"([^"\\]*)"|'
+        r"(-?\d+(?:\.\d+)?(?:[eE][+-]?\d+)?|true|false|null)(?=[\s,}\]])|(?=[{\[]))"
+    )
+    # a whole element of an array without escapes, the string or terminated scalar of __PAIR_PATTERN
+    __ELEMENT_PATTERN = re.compile(
+        r'[\s,]*(?:"([^"\\]*)"|'
+        r"(-?\d+(?:\.\d+)?(?:[eE][+-]?\d+)?|true|false|null)(?=[\s,}\]]))"
+    )
+    __PAIRS_MIN_LENGTH = 64
+    # an escape which can not be decoded yet: "\", "\u" and up to 3 hex digits or a high surrogate waiting for its pair
+    __INCOMPLETE_ESCAPE_PATTERN = re.compile(
+        r"(?:\\u[dD][89abAB][0-9a-fA-F]{2})?(?:\\(?:u[0-9a-fA-F]{0,3})?)?$"
+    )
+
+    __SELECTOR_SEPARATOR = "."
+
+    # bytes are decoded in windows of this size so a large chunk is never copied into a str at once
+    __BYTES_WINDOW_SIZE = 1 << 16
+    # a multiple of the page size so the pages of a consumed window can be released
+    __MMAP_WINDOW_SIZE = 1 << 20
+
+    # a checkpoint starts with a magic and version, then the size and number of the tokens and the length of the text
+    __CHECKPOINT_HEADER = b"SJPC\x01"
+    __CHECKPOINT_LENGTHS = struct.Struct("<BQQ")
+    # a token holds the tag of a value in its low bits and the length of its text or its number of items above
+    __TAG_BITS = 4
+    __TAG_MASK = (1 << __TAG_BITS) - 1
+    __NULL_TAG = 0
+    __TRUE_TAG = 1
+    __FALSE_TAG = 2
+    __STRING_TAG = 3
+    __INT_TAG = 4
+    __FLOAT_TAG = 5
+    __OBJECT_TAG = 6
+    __ARRAY_TAG = 7
+    # a record is followed by the name of its type and the keys and values of its fields
+    __RECORD_TAG = 8
+    __LITERALS_BY_TAG = (None, True, False)
+    # the flags of a parsing context are packed in a single token
+    __ARRAY_FLAG = 1
+    __VISIBLE_FLAG = 2
+    __PARSING_KEY_FLAG = 4
+    __PARSING_VALUE_FLAG = 8
+    __PARSING_SCALAR_FLAG = 16
+
+    # shared by all parsers until a buffer or the stack needs to hold something
+    # most keys and values start and end in the same chunk and never need their own list
+    __EMPTY_BUFFER = ()
+
+    class __SchemaNode(dict):
+        # a selection node built from a schema, the record type builds the closed objects of this node
+        __slots__ = ("record_type",)
+
+        record_type: type | None
+
+        def __init__(self, record_type: type | None) -> None:
+            super().__init__()
+            self.record_type = record_type
+
+    class __SinkNode(dict):
+        # a selection node whose keys can have a sink, the missing keys are selected unless the node comes from select
+        __slots__ = ("sinks", "is_selecting_all")
+
+        sinks: dict[str, Callable[[str, bool], object]]
+        is_selecting_all: bool
+
+        def __init__(self, is_selecting_all: bool) -> None:
+            super().__init__()
+            self.sinks = dict()
+            self.is_selecting_all = is_selecting_all
+
+        def __contains__(self, key: object) -> bool:
+            return self.is_selecting_all or dict.__contains__(self, key)
+
+        def __missing__(self, key: str) -> None:
+            # only reached for the missing keys of a node selecting all, None selects the whole subtree
+            return None
+
     class __ParsingContext:
+        __slots__ = (
+            "current_key",
+            "current_key_buffer",
+            "current_object_value_buffer",
+            "current_array_value_buffer",
+            "current_string_value_buffer",
+            "is_parsing_key",
+            "is_parsing_value",
+            "is_parsing_scalar",
+            "is_visible",
+            "selection",
+        )
+
         current_key: str
-        current_key_buffer: list[str]
-        current_object_value_buffer: dict
-        current_string_value_buffer: list[str]
+        current_key_buffer: list[str] | tuple[()]
+        # exactly one of the object or array buffers is set depending on the type of the context
+        current_object_value_buffer: dict | None
+        current_array_value_buffer: list | None
+        # also holds the token of a number, true, false or null
+        current_string_value_buffer: list[str] | tuple[()]
         is_parsing_key: bool
         is_parsing_value: bool
+        is_parsing_scalar: bool
+        # the top-level object and the open arrays leading to the current context are exposed by get()
+        is_visible: bool
+        selection: dict | None
 
-        def __init__(self) -> None:
+        def __init__(
+            self,
+            selection: dict | None = None,
+            is_array: bool = False,
+            is_visible: bool = True,
+        ) -> None:
+            # the empty tuple is a singleton, this is the parser's __EMPTY_BUFFER
             self.current_key = None
-            self.current_key_buffer = list()
-            self.current_object_value_buffer = dict()
-            self.current_string_value_buffer = list()
+            self.current_key_buffer = ()
+            self.current_object_value_buffer = None if is_array else dict()
+            self.current_array_value_buffer = list() if is_array else None
+            self.current_string_value_buffer = ()
             self.is_parsing_key = False
             self.is_parsing_value = False
+            self.is_parsing_scalar = False
+            self.is_visible = is_visible
+            self.selection = selection
+
+    if _accelerator is not None:
+        # the same fields in a C struct, so the compiled loop reads them without attribute lookups
+        __ParsingContext = _accelerator.ParsingContext
+
+    class __OptionalState:
+        # the options of a parser and the state of the optional features (limits, selection, sinks, bytes, patches,
+        # documents, concurrent readers, snapshots), a parser only allocates one when it uses one of them
+        __slots__ = (
+            "is_lazy",
+            "stats",
+            "limits",
+            "key_cache",
+            "exceeded_limits",
+            "consumed_characters",
+            "string_length",
+            "is_skipping_string",
+            "skipped_container_depth",
+            "sink",
+            "decoder",
+            "patches",
+            "documents",
+            "cached_value",
+            "snapshot_pages",
+            "version",
+            "published_snapshot",
+            "is_snapshot_requested",
+            "publication_lock",
+        )
+
+        is_lazy: bool
+        stats: "ParserStats | None"
+        limits: "ParserLimits | None"
+        key_cache: "KeyCache | None"
+        exceeded_limits: set[str] | frozenset[()]
+        # only counted when there are limits
+        consumed_characters: int
+        string_length: int
+        is_skipping_string: bool
+        skipped_container_depth: int
+        # the sink of the string value being skipped, if any
+        sink: Callable[[str, bool], object] | None
+        decoder: codecs.IncrementalDecoder | None
+        patches: list[dict] | None
+        documents: list[dict] | None
+        # the time of the last get() with max_staleness and the snapshot it returned
+        cached_value: "tuple[float, Mapping] | None"
+        # the pages of the visible contexts sealed by the last snapshot and how many of their values they hold
+        # (the list is replaced, never modified)
+        snapshot_pages: "list[tuple[object, tuple[dict | tuple, ...], int]] | tuple[()]"
+        # only used by concurrent parsers: odd while consume() runs, the published snapshot is None otherwise
+        version: int
+        published_snapshot: tuple[int, Mapping] | None
+        is_snapshot_requested: bool
+        # only held to publish a snapshot, so that a published snapshot is never replaced by an older one
+        publication_lock: "threading.Lock | None"
+
+        def __init__(self) -> None:
+            # the empty frozenset is shared until a limit is exceeded, the empty tuple is the parser's __EMPTY_BUFFER
+            self.is_lazy = False
+            self.stats = None
+            self.limits = None
+            self.key_cache = None
+            self.exceeded_limits = frozenset()
+            self.consumed_characters = 0
+            self.string_length = 0
+            self.is_skipping_string = False
+            self.skipped_container_depth = 0
+            self.sink = None
+            self.decoder = None
+            self.patches = None
+            self.documents = None
+            self.cached_value = None
+            self.snapshot_pages = ()
+            self.version = 0
+            self.published_snapshot = None
+            self.is_snapshot_requested = False
+            self.publication_lock = None
+
+    # shared by all parsers without options until one of them needs to store something, see __get_own_state()
+    __DEFAULT_STATE = __OptionalState()
 
-    __context_stack = list()
+    __slots__ = (
+        "__context_stack",
+        "__current_context",
+        "__snapshot",
+        "__is_accelerated",
+        "__is_skipping_value",
+        "__is_escaping",
+        "__may_be_escaped",
+        "__has_escapes",
+        "__pending_escape",
+        "__state",
+    )
+
+    __context_stack: list[__ParsingContext] | tuple[()]
     __current_context: __ParsingContext
+    __snapshot: Mapping | None
+    # the compiled loop only handles a parser without options, with limits or with a key cache
+    __is_accelerated: bool
+    __is_skipping_value: bool
+    # escape state of the string being scanned, only the current context can be in a string
+    __is_escaping: bool
+    # most buffers contain no backslash at all, their strings end at the next delimiter
+    __may_be_escaped: bool
+    __has_escapes: bool
+    __pending_escape: str
+    # the state of the optional features, see __OptionalState
+    __state: __OptionalState
 
-    def __init__(self) -> None:
-        self.__context_stack = list()
-        self.__current_context = StreamingJsonParser.__ParsingContext()
+    def __init__(
+        self,
+        select: Iterable[str] | None = None,
+        lazy: bool = False,
+        stats: "ParserStats | None" = None,
+        limits: "ParserLimits | None" = None,
+        schema: type | Mapping | None = None,
+        key_cache: "KeyCache | None" = None,
+        concurrent: bool = False,
+        sinks: "Mapping[str, Callable[[str, bool], object] | io.TextIOBase | asyncio.Queue] | None" = None,
+    ) -> None:
+        """
+        Initializes the parser
+
+        Args:
+            select (Iterable[str] | None): Only build these dot-separated key paths (e.g. "tool_call.arguments")
+                and skip everything else, all the keys are built if None
+            lazy (bool): get(), snapshot() and consume_documents() return read-only LazyObject views whose values
+                are only built when they are accessed, instead of copies
+            stats (ParserStats | None): Collect instrumentation counters into this object (it can be shared by
+                several parsers), nothing is collected if None
+            limits (ParserLimits | None): Bound the memory used by the parser, nothing is limited if None
+            schema (type | Mapping | None): Build the objects into instances of this dataclass, NamedTuple or
+                TypedDict (recursively, following the type hints of their fields) and skip the keys which are not
+                fields. A Mapping of keys to types (or nested mappings) only selects keys. Closed objects are built
+                into records which are shared by get() like strings, arrays are tuples and untyped objects read-only
+                mappings. The top-level object is a dict until it is closed, see consume_documents()
+            key_cache (KeyCache | None): Reuse the key strings held by this cache (it can be shared by several
+                parsers), every key is a new string if None
+            concurrent (bool): get() and snapshot() can be called by other threads while one thread consumes, they
+                return the last consistent state without blocking it
+            sinks (Mapping | None): Send the string values of these dot-separated key paths to a sink slice by slice
+                instead of building them, the values are not returned by get(). A sink is either a function called
+                with every decoded slice and whether it is the last one of the value, an io.TextIOBase which is
+                written to or an asyncio.Queue which is given the slices and None after the last one of every value
+
+        Raises:
+            ValueError: If both select and schema are set or both sinks and schema are set
+        """
+
+        if select is not None and schema is not None:
+            raise ValueError("select and schema can not be combined")
+        if sinks is not None and schema is not None:
+            raise ValueError("sinks and schema can not be combined")
+
+        selection: dict | None = None
+        if select is not None:
+            selection = self.__build_selection(select)
+        elif schema is not None:
+            selection = self.__build_schema(schema)
+        if sinks is not None:
+            selection = self.__build_sinks(selection, sinks)
+
+        self.__context_stack = self.__EMPTY_BUFFER
+        self.__current_context = StreamingJsonParser.__ParsingContext(selection)
+        self.__snapshot = None
+        self.__is_accelerated = (
+            _accelerator is not None
+            and selection is None
+            and not lazy
+            and stats is None
+        )
+        self.__is_skipping_value = False
+        self.__is_escaping = False
+        self.__may_be_escaped = False
+        self.__has_escapes = False
+        self.__pending_escape = ""
+        self.__state = self.__DEFAULT_STATE
+        if (
+            selection is not None
+            or lazy
+            or stats is not None
+            or limits is not None
+            or key_cache is not None
+            or concurrent
+        ):
+            state: StreamingJsonParser.__OptionalState = self.__get_own_state()
+            state.is_lazy = lazy
+            state.stats = stats
+            state.limits = limits
+            state.key_cache = key_cache
+            if concurrent:
+                state.published_snapshot = (0, self.__build_snapshot())
+                state.publication_lock = threading.Lock()
         return
 
+    def __get_own_state(self) -> __OptionalState:
+        # the default state is never modified, a parser storing something gets its own one
+        if self.__state is self.__DEFAULT_STATE:
+            self.__state = StreamingJsonParser.__OptionalState()
+        return self.__state
+
+    @classmethod
+    def __build_selection(cls, select: Iterable[str]) -> dict:
+        selection: dict = dict()
+        for selector in select:
+            *parent_keys, last_key = selector.split(cls.__SELECTOR_SEPARATOR)
+            node: dict | None = selection
+            for key in parent_keys:
+                node = node.setdefault(key, dict())
+                if node is None:
+                    # a parent object is already selected as a whole
+                    break
+            else:
+                # None selects the whole subtree
+                node[last_key] = None
+        return selection
+
+    @classmethod
+    def __build_sinks(
+        cls,
+        selection: dict | None,
+        sinks: "Mapping[str, Callable[[str, bool], object] | io.TextIOBase | asyncio.Queue]",
+    ) -> __SinkNode:
+        # the objects leading to a sink are selected like with select, their other keys are left as they were
+        root_node: StreamingJsonParser.__SinkNode = cls.__get_sink_node(selection)
+        for path, sink in sinks.items():
+            *parent_keys, last_key = path.split(cls.__SELECTOR_SEPARATOR)
+            node: StreamingJsonParser.__SinkNode = root_node
+            for key in parent_keys:
+                node[key] = cls.__get_sink_node(
+                    node.get(key, None if node.is_selecting_all else dict())
+                )
+                node = node[key]
+            if not node.is_selecting_all:
+                node.setdefault(last_key, None)
+            node.sinks[last_key] = cls.__get_sink_function(sink)
+        return root_node
+
+    @classmethod
+    def __get_sink_node(cls, node: dict | None) -> __SinkNode:
+        if type(node) is cls.__SinkNode:
+            return node
+
+        # None selects the whole subtree
+        sink_node: StreamingJsonParser.__SinkNode = cls.__SinkNode(node is None)
+        if node is not None:
+            sink_node.update(node)
+        return sink_node
+
+    @staticmethod
+    def __get_sink_function(
+        sink: "Callable[[str, bool], object] | io.TextIOBase | asyncio.Queue",
+    ) -> Callable[[str, bool], object]:
+        if isinstance(sink, io.TextIOBase):
+
+            def write(string_slice: str, is_last_slice: bool) -> None:
+                if string_slice:
+                    sink.write(string_slice)
+                return
+
+            return write
+
+        if isinstance(sink, asyncio.Queue):
+
+            def put(string_slice: str, is_last_slice: bool) -> None:
+                # None ends the value, so that a consumer knows where the values of a path start and end
+                if string_slice:
+                    sink.put_nowait(string_slice)
+                if is_last_slice:
+                    sink.put_nowait(None)
+                return
+
+            return put
+
+        return sink
+
+    @classmethod
+    def __build_schema(cls, schema: type | Mapping) -> __SchemaNode:
+        # the nodes are built breadth first, a record type is compiled once even when it is recursive
+        nodes_by_type: dict[type, StreamingJsonParser.__SchemaNode] = dict()
+        pending_nodes: list[tuple[StreamingJsonParser.__SchemaNode, dict]] = list()
+        root_node: StreamingJsonParser.__SchemaNode | None = cls.__get_schema_node(
+            schema, nodes_by_type, pending_nodes
+        )
+        if root_node is None:
+            raise TypeError(f"{schema!r} is not a schema of objects")
+
+        while pending_nodes:
+            node, fields = pending_nodes.pop()
+            for key, field_type in fields.items():
+                node[key] = cls.__get_schema_node(
+                    field_type, nodes_by_type, pending_nodes
+                )
+        return root_node
+
+    @classmethod
+    def __get_schema_node(
+        cls,
+        schema: object,
+        nodes_by_type: dict[type, __SchemaNode],
+        pending_nodes: list[tuple[__SchemaNode, dict]],
+    ) -> __SchemaNode | None:
+        # the elements of an array share the node of the array, the node of an optional value is the node of its type
+        while True:
+            origin: object = typing.get_origin(schema)
+            type_arguments: tuple = typing.get_args(schema)
+            if origin is typing.Union or origin is UnionType:
+                type_arguments = tuple(
+                    argument for argument in type_arguments if argument is not NoneType
+                )
+                if len(type_arguments) != 1:
+                    # the node of a value which can be of several types is ambiguous, it is built as is
+                    return None
+                schema = type_arguments[0]
+            elif origin is typing.Annotated:
+                schema = type_arguments[0]
+            elif origin in (list, set, frozenset, Sequence, Iterable):
+                schema = type_arguments[0]
+            elif origin is tuple:
+                if len(type_arguments) != 2 or type_arguments[1] is not Ellipsis:
+                    return None
+                schema = type_arguments[0]
+            elif isinstance(schema, list) and len(schema) == 1:
+                schema = schema[0]
+            else:
+                break
+
+        if isinstance(schema, Mapping):
+            node: StreamingJsonParser.__SchemaNode = cls.__SchemaNode(None)
+            pending_nodes.append((node, dict(schema)))
+            return node
+
+        if not isinstance(schema, type):
+            return None
+        if schema in nodes_by_type:
+            return nodes_by_type[schema]
+
+        fields: dict
+        record_type: type | None = schema
+        if dataclasses.is_dataclass(schema):
+            type_hints: dict = typing.get_type_hints(schema)
+            fields = {
+                field.name: type_hints[field.name]
+                for field in dataclasses.fields(schema)
+                if field.init
+            }
+        elif issubclass(schema, tuple) and hasattr(schema, "_fields"):
+            fields = typing.get_type_hints(schema)
+        elif typing.is_typeddict(schema):
+            fields = typing.get_type_hints(schema)
+            # a TypedDict is a dict at runtime, the object is built like any other
+            record_type = None
+        else:
+            return None
+
+        if record_type is not None:
+            # get() copies the records like the other containers
+            _register_record_type(record_type)
+        node = cls.__SchemaNode(record_type)
+        nodes_by_type[schema] = node
+        pending_nodes.append((node, fields))
+        return node
+
     def consume(self, buffer: str) -> None:
         """
         Add the content of the buffer (a partial JSON string) to a dict
 
         Args:
-            buffer (str): A partial (chunked) representation of a valid JSON object containing only string and object values
+            buffer (str): A partial (chunked) representation of a valid JSON object
+
+        Raises:
+            ParserLimitError: If a limit is exceeded and the limits do not truncate
+            TypeError: If a closed object can not be built into its record type (e.g. a field is missing)
         """
 
-        # this offset can be moved by helper methods consuming the buffer
-        character_offset: int = 0
-        buffer_length: int = len(buffer)
+        if self.__state.published_snapshot is not None:
+            # readers do not publish a snapshot while the version is odd, see __read_published_snapshot()
+            self.__state.version += 1
+
+        try:
+            if self.__state.limits is not None:
+                buffer = self.__limit_total_characters(buffer)
+
+            # this offset can be moved by helper methods consuming the buffer
+            character_offset: int = 0
+            buffer_length: int = len(buffer)
+
+            if (
+                self.__is_accelerated
+                and not self.__is_skipping_value
+                and self.__state.patches is None
+                and self.__state.documents is None
+            ):
+                (
+                    self.__context_stack,
+                    self.__current_context,
+                    self.__is_escaping,
+                    self.__has_escapes,
+                    self.__pending_escape,
+                    is_visible_changed,
+                    character_offset,
+                    string_length,
+                ) = _accelerator.consume(
+                    self.__context_stack,
+                    self.__current_context,
+                    buffer,
+                    self.__is_escaping,
+                    self.__has_escapes,
+                    self.__pending_escape,
+                    self.__state.key_cache,
+                    self.__state.limits,
+                    self.__state.string_length,
+                )
+                if is_visible_changed:
+                    self.__snapshot = None
+                if self.__state.limits is not None:
+                    self.__state.string_length = string_length
+                if character_offset == buffer_length:
+                    return
+                # the compiled loop stopped before a token which could exceed a limit, the Python loop raises,
+                # truncates or skips it and consumes the rest of the buffer
+
+            # a parser with stats attributes the characters consumed by every step to its phase, the other ones only
+            # pay for one check per step
+            stats: ParserStats | None = self.__state.stats
+            start_time: int = 0 if stats is None else time.perf_counter_ns()
+            self.__may_be_escaped = self.__is_escaping or self.__ESCAPE in buffer
 
-        while character_offset < buffer_length:
-            # the current key is not fully built yet
-            if self.__current_context.current_key is None:
+            while character_offset < buffer_length:
+                context: StreamingJsonParser.__ParsingContext = self.__current_context
+                step_offset: int = character_offset
+                phase: str
 
-                # the key is null at the start or just after building a new value
-                # in the latter case we check if we reached the end of a nested object
-                if not self.__current_context.is_parsing_key:
-                    object_end_index = self.__find_index_for_next_object_end(
+                if self.__is_skipping_value:
+                    # the key is not selected (or the value is too deep), do not build its value
+                    phase = "skip_value"
+                    character_offset = self.__skip_value(buffer, character_offset)
+
+                elif context.current_key is not None:
+                    # build the value
+                    phase = "build_current_value"
+                    character_offset = self.__build_current_value(
                         buffer, character_offset
                     )
-                    if self.__context_stack and object_end_index != -1:
-                        self.__pop_context()
-                        character_offset = object_end_index + 1
-                        continue
 
-                # build the key
-                character_offset = self.__build_current_key(buffer, character_offset)
-            else:
+                elif context.current_array_value_buffer is not None:
+                    # arrays have no keys, only values
+                    # like the pairs of objects, whole elements are matched at once in long buffers
+                    phase = "build_current_value"
+                    if (
+                        buffer_length - character_offset > self.__PAIRS_MIN_LENGTH
+                        and not context.is_parsing_value
+                        and not context.is_parsing_scalar
+                        and context.selection is None
+                        and self.__state.patches is None
+                    ):
+                        element_match: re.Match | None = self.__ELEMENT_PATTERN.match(
+                            buffer, character_offset
+                        )
+                        if element_match is not None:
+                            # the characters of the whole elements are counted by __build_elements()
+                            character_offset = step_offset = self.__build_elements(
+                                buffer, element_match
+                            )
+                            if character_offset == buffer_length:
+                                continue
 
-                if not self.__current_context.is_parsing_value:
-                    # we just finished parsing the key but haven't received anything to determine the type of the value yet
-                    object_start_index = self.__find_index_for_next_object_start(
+                    character_offset = self.__build_current_value(
                         buffer, character_offset
                     )
-                    if object_start_index != -1:
-                        self.__push_context()
-                        character_offset = object_start_index + 1
-                        continue
 
-                # build the value
-                character_offset = self.__build_current_value(buffer, character_offset)
+                # the current key is not fully built yet
+                else:
+                    phase = "build_current_key"
+                    object_end_index: int = -1
+
+                    # the key is null at the start or just after building a new value
+                    # in the latter case we check if we reached the end of a nested object
+                    if not context.is_parsing_key:
+                        # in long buffers most pairs are complete, they are matched at once
+                        # (in short ones a failed match would cost more than it saves)
+                        if (
+                            buffer_length - character_offset > self.__PAIRS_MIN_LENGTH
+                            and context.selection is None
+                            and self.__state.patches is None
+                        ):
+                            pair_match: re.Match | None = self.__PAIR_PATTERN.match(
+                                buffer, character_offset
+                            )
+                            if pair_match is not None:
+                                # the characters of the whole pairs are counted by __build_pairs()
+                                character_offset = step_offset = self.__build_pairs(
+                                    buffer, pair_match
+                                )
+                                if (
+                                    context.current_key is not None
+                                    or character_offset == buffer_length
+                                ):
+                                    continue
+
+                        object_end_index = self.__find_index_for_next_object_end(
+                            buffer, character_offset
+                        )
+
+                    if object_end_index != -1 and self.__context_stack:
+                        phase = "find_index_for_char"
+                        self.__pop_context()
+                        character_offset = object_end_index + 1
+
+                    elif object_end_index != -1 and self.__state.documents is not None:
+                        # the top-level object is closed, the next one is a new document
+                        phase = "find_index_for_char"
+                        self.__end_document()
+                        character_offset = object_end_index + 1
 
+                    else:
+                        # build the key
+                        character_offset = self.__build_current_key(
+                            buffer, character_offset
+                        )
+
+                if stats is not None:
+                    stats.characters_by_phase[phase] += character_offset - step_offset
+
+            if stats is not None:
+                stats.record_call("consume", time.perf_counter_ns() - start_time)
+        finally:
+            if self.__state.published_snapshot is not None:
+                self.__state.version += 1
+                if self.__state.is_snapshot_requested:
+                    self.__publish_requested_snapshot()
         return
 
-    def __find_index_for_next_object_start(
-        self, buffer: str, character_offset: int
-    ) -> int:
-        return self.__find_index_for_char(buffer, character_offset, self.__OBJECT_START)
+    def consume_bytes(self, buffer: bytes | bytearray | memoryview) -> None:
+        """
+        Add the content of the buffer (a partial UTF-8 encoded JSON string) to a dict.
+        A multi-byte character split between two buffers is carried over to the next call.
+
+        Args:
+            buffer (bytes | bytearray | memoryview): A partial (chunked) UTF-8 representation of a valid JSON object
+
+        Raises:
+            UnicodeDecodeError: If the buffer is not valid UTF-8
+        """
+
+        if self.__state.decoder is None:
+            self.__get_own_state().decoder = codecs.getincrementaldecoder("utf-8")()
+
+        if len(buffer) <= self.__BYTES_WINDOW_SIZE:
+            self.consume(self.__state.decoder.decode(buffer))
+            return
+
+        # the view is sliced without copying, only one window at a time is decoded
+        view: memoryview = memoryview(buffer).cast("B")
+        for window_start in range(0, view.nbytes, self.__BYTES_WINDOW_SIZE):
+            self.consume(
+                self.__state.decoder.decode(
+                    view[window_start : window_start + self.__BYTES_WINDOW_SIZE]
+                )
+            )
+        return
+
+    def consume_mmap(self, mapped_file: mmap.mmap) -> None:
+        """
+        Add the content of a memory-mapped UTF-8 encoded JSON file to a dict.
+        The file is decoded window by window and the pages of every consumed window are released, so only about one
+        window of the file is resident in memory at a time.
+
+        Args:
+            mapped_file (mmap.mmap): A readable mapping of the whole file, the mapping is not closed
+
+        Raises:
+            UnicodeDecodeError: If the file is not valid UTF-8
+        """
+
+        # madvise is not available on every platform, the kernel then evicts the pages on its own
+        can_release_pages: bool = hasattr(mapped_file, "madvise") and hasattr(
+            mmap, "MADV_DONTNEED"
+        )
+        if can_release_pages and hasattr(mmap, "MADV_SEQUENTIAL"):
+            mapped_file.madvise(mmap.MADV_SEQUENTIAL)
+
+        with memoryview(mapped_file) as view:
+            for window_start in range(0, len(view), self.__MMAP_WINDOW_SIZE):
+                window_length: int = min(
+                    self.__MMAP_WINDOW_SIZE, len(view) - window_start
+                )
+                self.consume_bytes(view[window_start : window_start + window_length])
+                if can_release_pages:
+                    mapped_file.madvise(mmap.MADV_DONTNEED, window_start, window_length)
+        return
+
+    def consume_patches(self, buffer: str) -> list[dict]:
+        """
+        Consume the buffer like consume() and return how the output of get() changed.
+        Applying the patches of every consumed buffer in order to an empty dict gives the output of get().
+
+        Args:
+            buffer (str): A partial (chunked) representation of a valid JSON object
+
+        Returns:
+            list[dict]: The JSON-Patch like operations, e.g. {"op": "append", "path": "/foo", "value": "bar"}
+        """
+
+        state: StreamingJsonParser.__OptionalState = self.__get_own_state()
+        state.patches = list()
+        try:
+            self.consume(buffer)
+            return state.patches
+        finally:
+            state.patches = None
+
+    def consume_documents(self, buffer: str) -> list[dict]:
+        """
+        Consume the buffer like consume() but for a stream of concatenated (or newline-delimited) JSON objects.
+        get() returns the document being parsed, the documents closed in the buffer are returned.
+
+        Args:
+            buffer (str): A partial (chunked) representation of a stream of valid JSON objects
+
+        Returns:
+            list[dict]: The documents completed in this buffer, in order (records if the schema has a record type)
+        """
+
+        state: StreamingJsonParser.__OptionalState = self.__get_own_state()
+        state.documents = list()
+        try:
+            self.consume(buffer)
+            return state.documents
+        finally:
+            state.documents = None
+
+    def __end_document(self) -> None:
+        root_context: StreamingJsonParser.__ParsingContext = self.__current_context
+        record_type: type | None = getattr(root_context.selection, "record_type", None)
+        if record_type is not None:
+            self.__state.documents.append(
+                record_type(**root_context.current_object_value_buffer)
+            )
+        else:
+            self.__state.documents.append(
+                LazyObject(MappingProxyType(root_context.current_object_value_buffer))
+                if self.__state.is_lazy
+                else self.__copy_value(root_context.current_object_value_buffer)
+            )
+
+        # start the next document with the same selection
+        self.__current_context = StreamingJsonParser.__ParsingContext(
+            root_context.selection
+        )
+        self.__snapshot = None
+        return
+
+    def __add_patch(self, op: str, value: object) -> None:
+        self.__state.patches.append(
+            {"op": op, "path": self.__get_current_value_path(), "value": value}
+        )
+        return
+
+    def __get_current_value_path(self) -> str:
+        # JSON pointer of the value being built in the current context
+        contexts: list[StreamingJsonParser.__ParsingContext] = [
+            *self.__context_stack,
+            self.__current_context,
+        ]
+        path: list[str] = [""]
+        for context in contexts:
+            if context.current_array_value_buffer is not None:
+                path.append(str(len(context.current_array_value_buffer)))
+            else:
+                path.append(context.current_key.replace("~", "~0").replace("/", "~1"))
+        return "/".join(path)
+
+    def __patch_string_value(self, value_slice: str, is_first_slice: bool) -> None:
+        # only the values of visible contexts are exposed
+        if not self.__current_context.is_visible:
+            return
+
+        if is_first_slice:
+            self.__add_patch("add", value_slice)
+        elif value_slice:
+            self.__add_patch("append", value_slice)
+        return
 
     def __find_index_for_next_object_end(
         self, buffer: str, character_offset: int
@@ -116,142 +1036,2086 @@ class StreamingJsonParser:
     def __find_index_for_char(
         self, buffer: str, character_offset: int, target_char: str
     ) -> int:
-        for i in range(character_offset, len(buffer)):
-            current_char: str = buffer[i]
+        # jump straight to the first target or string delimiter instead of looping in Python
+        match = self.__TARGET_OR_DELIMITER_PATTERNS[target_char].search(
+            buffer, character_offset
+        )
+
+        if match is None or match.group() == self.__STRING_DELIMITER:
+            return -1
 
-            if current_char == target_char:
-                return i
+        return match.start()
+
+    def __find_index_for_string_end(self, buffer: str, character_offset: int) -> int:
+        if self.__is_escaping:
+            # the previous buffer ended with a backslash, the first character is escaped
+            self.__is_escaping = False
+            character_offset += 1
+
+        while True:
+            string_end_index: int = buffer.find(
+                self.__STRING_DELIMITER, character_offset
+            )
+            escape_index: int = buffer.find(
+                self.__ESCAPE,
+                character_offset,
+                len(buffer) if string_end_index == -1 else string_end_index,
+            )
+            if escape_index == -1:
+                return string_end_index
 
-            if current_char == self.__STRING_DELIMITER:
+            # the character after the backslash can not end the string
+            self.__has_escapes = True
+            character_offset = escape_index + 2
+            if character_offset > len(buffer):
+                self.__is_escaping = True
                 return -1
 
-        return -1
+    def __unescape(self, string_slice: str, is_last_slice: bool) -> str:
+        if self.__pending_escape:
+            string_slice = self.__pending_escape + string_slice
+            self.__pending_escape = ""
+
+        if self.__ESCAPE not in string_slice:
+            return string_slice
+
+        if not is_last_slice:
+            # keep an escape split between two buffers for the next slice
+            incomplete_escape_index: int = self.__find_index_for_incomplete_escape(
+                string_slice
+            )
+            self.__pending_escape = string_slice[incomplete_escape_index:]
+            string_slice = string_slice[:incomplete_escape_index]
+
+        # the C accelerated JSON string scanner decodes the escapes and surrogate pairs
+        return scanstring(string_slice + self.__STRING_DELIMITER, 0, False)[0]
+
+    def __find_index_for_incomplete_escape(self, string_slice: str) -> int:
+        # an incomplete escape is at most 11 characters long ("\ud83d\ude0")
+        search_start: int = max(0, len(string_slice) - 11)
+        while True:
+            escape_index: int = self.__INCOMPLETE_ESCAPE_PATTERN.search(
+                string_slice, search_start
+            ).start()
+            if escape_index == len(string_slice):
+                return escape_index
+
+            # the backslash only starts an escape if it is not escaped itself
+            backslash_count: int = 0
+            while (
+                escape_index - backslash_count > 0
+                and string_slice[escape_index - backslash_count - 1] == self.__ESCAPE
+            ):
+                backslash_count += 1
+            if backslash_count % 2 == 0:
+                return escape_index
+
+            search_start = escape_index + 1
 
-    def __push_context(self) -> None:
-        self.__context_stack.append(self.__current_context)
-        self.__current_context = StreamingJsonParser.__ParsingContext()
+    def __exceed_limit(self, limit: str) -> None:
+        if not self.__state.limits.truncate:
+            raise ParserLimitError(limit, getattr(self.__state.limits, limit))
+
+        if not self.__state.exceeded_limits:
+            self.__state.exceeded_limits = set()
+        self.__state.exceeded_limits.add(limit)
+        return
+
+    def __limit_total_characters(self, buffer: str) -> str:
+        max_total_characters: int | None = self.__state.limits.max_total_characters
+        if max_total_characters is None:
+            return buffer
+
+        remaining_characters: int = (
+            max_total_characters - self.__state.consumed_characters
+        )
+        if len(buffer) > remaining_characters:
+            self.__exceed_limit("max_total_characters")
+            # the rest of the stream is ignored
+            buffer = buffer[: max(remaining_characters, 0)]
+
+        self.__state.consumed_characters += len(buffer)
+        return buffer
+
+    def __limit_string_slice(
+        self, string_slice: str, is_first_slice: bool, limit: str
+    ) -> str:
+        # the length of the key, string value or token being built is only tracked when it is limited
+        max_length: int | None = getattr(self.__state.limits, limit)
+        if max_length is None:
+            return string_slice
+
+        if is_first_slice:
+            self.__state.string_length = 0
+        remaining_length: int = max_length - self.__state.string_length
+        # the characters which are cut are counted too, see __is_too_long()
+        self.__state.string_length += len(string_slice)
+        if len(string_slice) > remaining_length:
+            self.__exceed_limit(limit)
+            string_slice = string_slice[: max(remaining_length, 0)]
+
+        return string_slice
+
+    def __is_too_long(self, limit: str) -> bool:
+        # whether the key or token being built was cut, a cut key could collide with another key and a cut number
+        # would be another number so their values are skipped instead of being stored
+        max_length: int | None = getattr(self.__state.limits, limit)
+        return max_length is not None and self.__state.string_length > max_length
+
+    def __push_context(self, is_array: bool) -> None:
+        parent_context: StreamingJsonParser.__ParsingContext = self.__current_context
+
+        # the elements of an array share the selection of the array
+        selection: dict | None = parent_context.selection
+        if selection is not None and parent_context.current_array_value_buffer is None:
+            selection = selection[parent_context.current_key]
+
+        # an open array is exposed like a partial string but an open object is not
+        is_visible: bool = parent_context.is_visible and is_array
+        if is_visible:
+            self.__snapshot = None
+            if self.__state.patches is not None:
+                self.__add_patch("add", list())
+
+        if self.__context_stack:
+            self.__context_stack.append(parent_context)
+        else:
+            self.__context_stack = [parent_context]
+        self.__current_context = StreamingJsonParser.__ParsingContext(
+            selection, is_array, is_visible
+        )
+        if self.__state.stats is not None:
+            self.__state.stats.context_pushes += 1
+            self.__state.stats.max_depth = max(
+                self.__state.stats.max_depth, len(self.__context_stack)
+            )
         return
 
     def __pop_context(self) -> None:
-        complete_object = self.__current_context.current_object_value_buffer
+        # the value is complete and will not change anymore, freeze it so it can be shared by snapshots
+        complete_context: StreamingJsonParser.__ParsingContext = self.__current_context
+        complete_value: Mapping | tuple
+        if complete_context.current_array_value_buffer is not None:
+            complete_value = tuple(complete_context.current_array_value_buffer)
+        elif (
+            type(complete_context.selection) is self.__SchemaNode
+            and complete_context.selection.record_type is not None
+        ):
+            # the keys of the object are the fields of its record, nothing else was built
+            complete_value = complete_context.selection.record_type(
+                **complete_context.current_object_value_buffer
+            )
+        else:
+            complete_value = MappingProxyType(
+                complete_context.current_object_value_buffer
+            )
+
         self.__current_context = self.__context_stack.pop()
-        self.__current_context.current_object_value_buffer[
-            self.__current_context.current_key
-        ] = complete_object
-        self.__current_context.current_key = None
+        if not self.__context_stack:
+            self.__context_stack = self.__EMPTY_BUFFER
+        if self.__state.stats is not None:
+            self.__state.stats.context_pops += 1
+
+        # the elements of a visible array were already patched one by one
+        if (
+            self.__state.patches is not None
+            and self.__current_context.is_visible
+            and not complete_context.is_visible
+        ):
+            self.__add_patch("add", self.__copy_value(complete_value))
+        self.__store_value_and_reset_context(complete_value)
         return
 
-    def __build_current_key(self, buffer: str, character_offset: int) -> int:
-        for i in range(character_offset, len(buffer)):
-            current_char: str = buffer[i]
+    def __build_pairs(self, buffer: str, match: re.Match) -> int:
+        # a fast path of __build_current_key() and __build_current_value() for the pairs of the current object
+        # which are whole in the buffer, starting with the given match of __PAIR_PATTERN
+        # the others (and the end of the object) are left to them
+        context: StreamingJsonParser.__ParsingContext = self.__current_context
+        object_value_buffer: dict = context.current_object_value_buffer
+        limits: ParserLimits | None = self.__state.limits
+        start_offset: int = match.start()
+        character_offset: int = start_offset
+        while match is not None:
+            key, string_value, scalar_token = match.groups()
+            if limits is not None and self.__exceeds_limits(
+                limits,
+                string_value if scalar_token is None else scalar_token,
+                key,
+                object_value_buffer,
+            ):
+                # the slow path raises, truncates or skips the pair
+                break
 
-            if (
-                not self.__current_context.is_parsing_key
-                and current_char != self.__STRING_DELIMITER
+            if self.__state.key_cache is not None:
+                key = self.__state.key_cache.intern(key)
+            if string_value is None and scalar_token is None:
+                # an object or array starts, the key is complete
+                context.current_key = key
+                character_offset = match.end()
+                break
+
+            object_value_buffer[key] = (
+                string_value
+                if scalar_token is None
+                else self.__parse_scalar(scalar_token)
+            )
+            character_offset = match.end()
+            match = self.__PAIR_PATTERN.match(buffer, character_offset)
+
+        if context.is_visible:
+            self.__snapshot = None
+        if self.__state.stats is not None:
+            self.__state.stats.characters_by_phase["build_pairs"] += (
+                character_offset - start_offset
+            )
+        return character_offset
+
+    def __build_elements(self, buffer: str, match: re.Match) -> int:
+        # the fast path of __build_pairs() for the elements of the current array
+        context: StreamingJsonParser.__ParsingContext = self.__current_context
+        array_value_buffer: list = context.current_array_value_buffer
+        limits: ParserLimits | None = self.__state.limits
+        start_offset: int = match.start()
+        character_offset: int = start_offset
+        while match is not None:
+            string_value, scalar_token = match.groups()
+            if limits is not None and self.__exceeds_limits(
+                limits, string_value if scalar_token is None else scalar_token
             ):
-                # ignore characters before the key starts
-                continue
+                break
 
-            if current_char == self.__STRING_DELIMITER:
-                if not self.__current_context.is_parsing_key:
-                    # we are building a new key
-                    # skip the delimiter and set the flag as we enter the key
-                    self.__current_context.is_parsing_key = True
-                    continue
+            array_value_buffer.append(
+                string_value
+                if scalar_token is None
+                else self.__parse_scalar(scalar_token)
+            )
+            character_offset = match.end()
+            match = self.__ELEMENT_PATTERN.match(buffer, character_offset)
 
-                else:
-                    # we finished parsing the current key
-                    self.__current_context.current_key = "".join(
-                        self.__current_context.current_key_buffer
-                    )
-                    self.__current_context.current_key_buffer = list()
-                    self.__current_context.is_parsing_key = False
-                    # return index of next character to parse
-                    return i + 1
+        if context.is_visible:
+            self.__snapshot = None
+        if self.__state.stats is not None:
+            self.__state.stats.characters_by_phase["build_pairs"] += (
+                character_offset - start_offset
+            )
+        return character_offset
+
+    @staticmethod
+    def __exceeds_limits(
+        limits: "ParserLimits",
+        value: str | None,
+        key: str | None = None,
+        object_value_buffer: dict | None = None,
+    ) -> bool:
+        # whether a whole pair (or element) matched by a fast path exceeds a limit, the depth is checked when the
+        # object or array of a pair starts
+        return (
+            (
+                value is not None
+                and limits.max_string_length is not None
+                and len(value) > limits.max_string_length
+            )
+            or (
+                key is not None
+                and limits.max_key_length is not None
+                and len(key) > limits.max_key_length
+            )
+            or (
+                key is not None
+                and limits.max_keys_per_object is not None
+                and len(object_value_buffer) >= limits.max_keys_per_object
+                and key not in object_value_buffer
+            )
+        )
+
+    def __build_current_key(self, buffer: str, character_offset: int) -> int:
+        context: StreamingJsonParser.__ParsingContext = self.__current_context
+
+        if not context.is_parsing_key:
+            # ignore characters before the key starts
+            key_start_index: int = buffer.find(
+                self.__STRING_DELIMITER, character_offset
+            )
+            if key_start_index == -1:
+                return len(buffer)
+
+            # we are building a new key
+            # skip the delimiter and set the flag as we enter the key
+            context.is_parsing_key = True
+            character_offset = key_start_index + 1
+
+        key_end_index: int
+        if self.__may_be_escaped:
+            # the delimiter may be escaped
+            key_end_index = self.__find_index_for_string_end(buffer, character_offset)
+        else:
+            key_end_index = buffer.find(self.__STRING_DELIMITER, character_offset)
+        if key_end_index == -1:
+            # the key continues in the next buffer, keep the whole slice
+            key_slice: str = buffer[character_offset:]
+            if self.__has_escapes:
+                key_slice = self.__unescape(key_slice, False)
+            if self.__state.limits is not None:
+                key_slice = self.__limit_string_slice(
+                    key_slice, not context.current_key_buffer, "max_key_length"
+                )
+                if not key_slice and context.current_key_buffer:
+                    # the key is truncated, ignore the rest of it
+                    return len(buffer)
+            if context.current_key_buffer:
+                context.current_key_buffer.append(key_slice)
+            else:
+                context.current_key_buffer = [key_slice]
+            return len(buffer)
 
-            # simply add the value in the key buffer
-            self.__current_context.current_key_buffer.append(current_char)
+        # we finished parsing the current key
+        key_slice: str = buffer[character_offset:key_end_index]
+        if self.__has_escapes:
+            key_slice = self.__unescape(key_slice, True)
+            self.__has_escapes = False
+        if self.__state.limits is not None:
+            key_slice = self.__limit_string_slice(
+                key_slice, not context.current_key_buffer, "max_key_length"
+            )
+        if context.current_key_buffer:
+            context.current_key_buffer.append(key_slice)
+            context.current_key = "".join(context.current_key_buffer)
+            context.current_key_buffer = self.__EMPTY_BUFFER
+        else:
+            # the whole key was in this buffer
+            context.current_key = key_slice
+        context.is_parsing_key = False
+        if self.__state.key_cache is not None:
+            context.current_key = self.__state.key_cache.intern(context.current_key)
+
+        if self.__state.limits is not None and self.__is_too_long("max_key_length"):
+            self.__is_skipping_value = True
+
+        elif (
+            context.selection is not None
+            and context.current_key not in context.selection
+        ):
+            self.__is_skipping_value = True
+
+        elif (
+            type(context.selection) is self.__SinkNode
+            and context.current_key in context.selection.sinks
+        ):
+            # the string value is sent to the sink instead of being built, see __skip_value()
+            self.__state.sink = context.selection.sinks[context.current_key]
+            self.__is_skipping_value = True
 
-        # we processed the whole buffer, return its length
-        return len(buffer)
+        elif (
+            self.__state.limits is not None
+            and self.__state.limits.max_keys_per_object is not None
+            and len(context.current_object_value_buffer)
+            >= self.__state.limits.max_keys_per_object
+            and context.current_key not in context.current_object_value_buffer
+        ):
+            self.__exceed_limit("max_keys_per_object")
+            self.__is_skipping_value = True
+
+        # return index of next character to parse
+        return key_end_index + 1
 
     def __build_current_value(self, buffer: str, character_offset: int) -> int:
-        for i in range(character_offset, len(buffer)):
-            current_char: str = buffer[i]
+        context: StreamingJsonParser.__ParsingContext = self.__current_context
+
+        if not context.is_parsing_value:
+            if context.is_parsing_scalar:
+                return self.__build_current_scalar_value(buffer, character_offset)
+
+            # ignore ':' (or ',' in arrays) and whitespace until the type of the value is known
+            match = (
+                self.__OBJECT_VALUE_START_PATTERN
+                if context.current_array_value_buffer is None
+                else self.__ARRAY_VALUE_START_PATTERN
+            ).search(buffer, character_offset)
+            if match is None:
+                return len(buffer)
+
+            if match.group() != self.__STRING_DELIMITER:
+                return self.__build_current_non_string_value(buffer, match)
+
+            # we are building a new string value
+            # skip the delimiter
+            context.is_parsing_value = True
+            character_offset = match.end()
+
+        value_buffer: list[str] | tuple[()] = context.current_string_value_buffer
+        value_end_index: int
+        if self.__may_be_escaped:
+            # the delimiter may be escaped
+            value_end_index = self.__find_index_for_string_end(buffer, character_offset)
+        else:
+            value_end_index = buffer.find(self.__STRING_DELIMITER, character_offset)
+        if value_end_index == -1:
+            # we did not find a string value end delimiter, only keep the new slice
+            # the partial string value is joined lazily when it is exposed by get()
+            value_slice: str = buffer[character_offset:]
+            if self.__has_escapes:
+                value_slice = self.__unescape(value_slice, False)
+            if self.__state.limits is not None:
+                value_slice = self.__limit_string_slice(
+                    value_slice, not value_buffer, "max_string_length"
+                )
+                if not value_slice and value_buffer:
+                    # the value is truncated, ignore the rest of it
+                    return len(buffer)
+            if value_buffer:
+                value_buffer.append(value_slice)
+            else:
+                context.current_string_value_buffer = [value_slice]
+            if context.is_visible:
+                self.__snapshot = None
+                if self.__state.patches is not None:
+                    self.__patch_string_value(value_slice, not value_buffer)
+            return len(buffer)
+
+        # we finished parsing the current string value
+        value_slice: str = buffer[character_offset:value_end_index]
+        if self.__has_escapes:
+            value_slice = self.__unescape(value_slice, True)
+            self.__has_escapes = False
+        if self.__state.limits is not None:
+            value_slice = self.__limit_string_slice(
+                value_slice, not value_buffer, "max_string_length"
+            )
+        if self.__state.patches is not None:
+            self.__patch_string_value(value_slice, not value_buffer)
+
+        complete_value: str | _LazyString = value_slice
+        if value_buffer:
+            value_buffer.append(value_slice)
+            complete_value = (
+                _LazyString(value_buffer)
+                if self.__state.is_lazy
+                else "".join(value_buffer)
+            )
+
+        # flush key value pair in the dict and reset
+        context.is_parsing_value = False
+        self.__store_value_and_reset_context(complete_value)
+        # return index of next character to parse
+        return value_end_index + 1
+
+    def __build_current_non_string_value(self, buffer: str, match: re.Match) -> int:
+        value_start: str = match.group()
+        if value_start == self.__OBJECT_START or value_start == self.__ARRAY_START:
             if (
-                not self.__current_context.is_parsing_value
-                and current_char != self.__STRING_DELIMITER
+                self.__state.limits is not None
+                and self.__state.limits.max_depth is not None
+                and len(self.__context_stack) >= self.__state.limits.max_depth
             ):
-                # ignore':' and whitespace when starting to parse string value
-                # but if we see a '}' or ',' it means there was a null value
-                if current_char == self.__OBJECT_END or current_char == self.__COMMA:
-                    # there was a null, set value to None in dict and proceed
-                    self.__store_value_and_reset_context(None)
+                # too deep, skip the whole value
+                self.__exceed_limit("max_depth")
+                self.__is_skipping_value = True
+                self.__state.skipped_container_depth = 1
+                return match.end()
 
-                    # do not skip parsing the potential '}'
-                    return i
+            self.__push_context(value_start == self.__ARRAY_START)
+            return match.end()
 
-                continue
+        if self.__current_context.current_array_value_buffer is not None:
+            if value_start == self.__ARRAY_END:
+                self.__pop_context()
+                return match.end()
 
-            if current_char == self.__STRING_DELIMITER:
-                if not self.__current_context.is_parsing_value:
-                    # we are building a new string value
-                    # skip the delimiter
-                    self.__current_context.is_parsing_value = True
-                    continue
+            if value_start == self.__OBJECT_END:
+                # invalid in an array, ignore it
+                return match.end()
 
-                else:
-                    # we finished parsing the current string value
-                    complete_value: str = "".join(
-                        self.__current_context.current_string_value_buffer
-                    )
+        elif value_start in (self.__OBJECT_END, self.__ARRAY_END, self.__COMMA):
+            # there was no value, set value to None in dict and proceed
+            self.__store_scalar_value_and_reset_context(None)
+
+            # do not skip parsing the potential '}'
+            return match.start()
 
-                    # flush key value pair in the dict and reset
-                    self.__store_value_and_reset_context(complete_value)
-                    # return index of next character to parse
-                    return i + 1
+        # a number, true, false or null
+        self.__current_context.is_parsing_scalar = True
+        return self.__build_current_scalar_value(buffer, match.start())
 
-            # simply add the value in the value buffer
-            self.__current_context.current_string_value_buffer.append(current_char)
+    def __build_current_scalar_value(self, buffer: str, character_offset: int) -> int:
+        context: StreamingJsonParser.__ParsingContext = self.__current_context
+
+        match = self.__SCALAR_END_PATTERN.search(buffer, character_offset)
+        if match is None:
+            # the token continues in the next buffer
+            token_slice: str = buffer[character_offset:]
+            if self.__state.limits is not None:
+                token_slice = self.__limit_string_slice(
+                    token_slice,
+                    not context.current_string_value_buffer,
+                    "max_string_length",
+                )
+                if self.__is_too_long("max_string_length"):
+                    return self.__skip_scalar_value(len(buffer))
+            if context.current_string_value_buffer:
+                context.current_string_value_buffer.append(token_slice)
+            else:
+                context.current_string_value_buffer = [token_slice]
+            return len(buffer)
 
-        if self.__current_context.is_parsing_value:
-            # we did not find a string value end delimiter, we should still expose the partial string value in the output dict
-            partial_string_value: str = "".join(
-                self.__current_context.current_string_value_buffer
+        token: str = buffer[character_offset : match.start()]
+        if self.__state.limits is not None:
+            token = self.__limit_string_slice(
+                token, not context.current_string_value_buffer, "max_string_length"
             )
-            self.__current_context.current_object_value_buffer[
-                self.__current_context.current_key
-            ] = partial_string_value
-        return len(buffer)
-
-    def __store_value_and_reset_context(self, value: str | None | dict) -> None:
-        self.__current_context.current_object_value_buffer[
-            self.__current_context.current_key
-        ] = value
-        self.__current_context.current_key = None
-        self.__current_context.current_string_value_buffer = list()
-        self.__current_context.is_parsing_value = False
+            if self.__is_too_long("max_string_length"):
+                return self.__skip_scalar_value(match.start())
+        if context.current_string_value_buffer:
+            context.current_string_value_buffer.append(token)
+            token = "".join(context.current_string_value_buffer)
+
+        context.is_parsing_scalar = False
+        self.__store_scalar_value_and_reset_context(self.__parse_scalar(token))
+
+        # do not skip parsing the potential '}' or ']'
+        return match.start()
+
+    def __skip_scalar_value(self, character_offset: int) -> int:
+        # the rest of the token (if any) is skipped like an unselected scalar, see __skip_value()
+        context: StreamingJsonParser.__ParsingContext = self.__current_context
+        context.is_parsing_scalar = False
+        context.current_string_value_buffer = self.__EMPTY_BUFFER
+        self.__is_skipping_value = True
+        return character_offset
+
+    @classmethod
+    def __parse_scalar(cls, token: str) -> int | float | bool | None:
+        if token in cls.__LITERALS:
+            return cls.__LITERALS[token]
+
+        try:
+            return int(token)
+        except ValueError:
+            return float(token)
+
+    def __store_scalar_value_and_reset_context(
+        self, value: int | float | bool | None
+    ) -> None:
+        if self.__state.patches is not None and self.__current_context.is_visible:
+            self.__add_patch("add", value)
+        self.__store_value_and_reset_context(value)
         return
 
-    def get(self) -> dict:
-        """
-        Returns the current state of the parsed object.
-        String values can be returned even when partially built.
-        Object values are returned once the object is fully built.
+    def __skip_value(self, buffer: str, character_offset: int) -> int:
+        if (
+            not self.__state.is_skipping_string
+            and self.__state.skipped_container_depth == 0
+        ):
+            # we do not know the type of the skipped value yet
+            match = self.__OBJECT_VALUE_START_PATTERN.search(buffer, character_offset)
+            if match is None:
+                return len(buffer)
 
+            value_start: str = match.group()
+            if value_start == self.__STRING_DELIMITER:
+                self.__state.is_skipping_string = True
+            elif self.__state.sink is not None:
+                # only strings are sent to a sink, any other value is built
+                self.__state.sink = None
+                self.__is_skipping_value = False
+                return match.start()
+            elif (
+                value_start == self.__OBJECT_START or value_start == self.__ARRAY_START
+            ):
+                self.__state.skipped_container_depth = 1
+            elif value_start in (self.__OBJECT_END, self.__ARRAY_END, self.__COMMA):
+                # there was no value, do not skip parsing the potential '}'
+                self.__end_skipped_value()
+                return match.start()
+            else:
+                # a scalar ends before the next separator, it is not buffered either
+                scalar_end_match = self.__SCALAR_END_PATTERN.search(buffer, match.end())
+                if scalar_end_match is None:
+                    return len(buffer)
 
-        Returns:
-            int: The index in the buffer of the next character to parse.
-            To be used to move the offset in other method calls.
-        """
+                self.__end_skipped_value()
+                return scalar_end_match.start()
 
-        # the dict at the bottom of the stack (so head of the list) is the top-level dict
-        # or it is the current context if empty
-        top_level_parsing_context: StreamingJsonParser.__ParsingContext = (
-            self.__current_context
-        )
-        if self.__context_stack:
-            top_level_parsing_context = self.__context_stack[0]
+            character_offset = match.end()
 
-        # returning a copy of the output to prevent accidental modification
-        return copy.deepcopy(top_level_parsing_context.current_object_value_buffer)
+        while character_offset < len(buffer):
+            if self.__state.is_skipping_string:
+                # jump over the string without buffering it
+                string_end_index: int = self.__find_index_for_string_end(
+                    buffer, character_offset
+                )
+                if self.__state.sink is not None:
+                    self.__send_string_slice(buffer, character_offset, string_end_index)
+                if string_end_index == -1:
+                    return len(buffer)
+
+                self.__state.is_skipping_string = False
+                self.__has_escapes = False
+                character_offset = string_end_index + 1
+                if self.__state.skipped_container_depth == 0:
+                    self.__end_skipped_value()
+                    return character_offset
+                continue
+
+            # only count the brackets of the skipped value, strings can contain brackets
+            match = self.__SKIPPED_CONTAINER_PATTERN.search(buffer, character_offset)
+            if match is None:
+                return len(buffer)
+
+            character_offset = match.end()
+            container_char: str = match.group()
+            if container_char == self.__STRING_DELIMITER:
+                self.__state.is_skipping_string = True
+            elif (
+                container_char == self.__OBJECT_START
+                or container_char == self.__ARRAY_START
+            ):
+                self.__state.skipped_container_depth += 1
+            else:
+                self.__state.skipped_container_depth -= 1
+                if self.__state.skipped_container_depth == 0:
+                    self.__end_skipped_value()
+                    return character_offset
+
+        return character_offset
+
+    def __send_string_slice(
+        self, buffer: str, character_offset: int, string_end_index: int
+    ) -> None:
+        # the slice is decoded and forwarded without being kept, the last call ends the value even if it is empty
+        is_last_slice: bool = string_end_index != -1
+        string_slice: str = buffer[
+            character_offset : string_end_index if is_last_slice else len(buffer)
+        ]
+        if self.__has_escapes:
+            string_slice = self.__unescape(string_slice, is_last_slice)
+        if string_slice or is_last_slice:
+            self.__state.sink(string_slice, is_last_slice)
+        return
+
+    def __end_skipped_value(self) -> None:
+        self.__current_context.current_key = None
+        self.__is_skipping_value = False
+        self.__state.sink = None
+        return
+
+    def __store_value_and_reset_context(self, value: object) -> None:
+        context: StreamingJsonParser.__ParsingContext = self.__current_context
+        if context.is_visible:
+            self.__snapshot = None
+
+        if context.current_array_value_buffer is not None:
+            context.current_array_value_buffer.append(value)
+        else:
+            context.current_object_value_buffer[context.current_key] = value
+            context.current_key = None
+        context.current_string_value_buffer = self.__EMPTY_BUFFER
+        return
+
+    def __join_partial_string_value(self, context: __ParsingContext) -> str:
+        partial_string_value: str = "".join(context.current_string_value_buffer)
+        # cache the materialized prefix so the slices are not joined again on the next call
+        # unless a concurrent reader is joining it, the writer could be appending a slice meanwhile
+        if self.__state.published_snapshot is None:
+            context.current_string_value_buffer = [partial_string_value]
+        return partial_string_value
+
+    def __build_visible_value(self, is_frozen: bool) -> dict | Mapping:
+        # the top-level object and the open arrays leading to the current context are visible
+        visible_contexts: list[StreamingJsonParser.__ParsingContext] = list()
+        for context in itertools.chain(self.__context_stack, (self.__current_context,)):
+            if visible_contexts and not context.is_visible:
+                break
+            visible_contexts.append(context)
+
+        if is_frozen:
+            return self.__build_paged_value(visible_contexts)
+
+        # build the open values from the deepest one, which is added to its parent
+        open_value: object = None
+        for context in reversed(visible_contexts):
+            # the deeper open array is the value of the current key (or the next element)
+            # only the current context can be in the middle of a string value
+            child_value: object = open_value
+            if context.is_parsing_value:
+                child_value = self.__join_partial_string_value(context)
+
+            if context.current_array_value_buffer is not None:
+                open_array: list = self.__copy_value(context.current_array_value_buffer)
+                if child_value is not None:
+                    open_array.append(child_value)
+                open_value = open_array
+            else:
+                open_object: dict = self.__copy_value(
+                    context.current_object_value_buffer
+                )
+                if child_value is not None:
+                    open_object[context.current_key] = child_value
+                open_value = open_object
+
+        return open_value
+
+    def __build_paged_value(self, visible_contexts: list[__ParsingContext]) -> Mapping:
+        # the values of the visible contexts sealed by the previous snapshot are shared, only the values added since
+        # are copied into a new page (the buffers only grow, a closed value is never replaced)
+        version: int = self.__state.version
+        previous_pages: tuple = self.__state.snapshot_pages
+        snapshot_pages: list[tuple] = list()
+        for depth, context in enumerate(visible_contexts):
+            pages: tuple[dict | tuple, ...] = ()
+            sealed_length: int = 0
+            if depth < len(previous_pages) and previous_pages[depth][0] is context:
+                _, pages, sealed_length = previous_pages[depth]
+
+            length: int
+            if context.current_array_value_buffer is not None:
+                array_value_buffer: list = context.current_array_value_buffer
+                length = len(array_value_buffer)
+                if length >= _MIN_PAGED_LENGTH and length > sealed_length:
+                    pages = _append_page(
+                        pages, tuple(array_value_buffer[sealed_length:length])
+                    )
+                    sealed_length = length
+            else:
+                object_value_buffer: dict = context.current_object_value_buffer
+                length = len(object_value_buffer)
+                if length >= _MIN_PAGED_LENGTH and length > sealed_length:
+                    # the keys added since are the last ones of the dict
+                    added_items: list[tuple[str, object]] = list(
+                        itertools.islice(
+                            reversed(object_value_buffer.items()),
+                            length - sealed_length,
+                        )
+                    )
+                    added_items.reverse()
+                    pages = _append_page(pages, dict(added_items))
+                    sealed_length = length
+            snapshot_pages.append((context, pages, sealed_length))
+
+        # build the open values from the deepest one, which is added to its parent
+        open_value: object = None
+        for context, pages, sealed_length in reversed(snapshot_pages):
+            child_value: object = open_value
+            if context.is_parsing_value:
+                child_value = self.__join_partial_string_value(context)
+
+            if context.current_array_value_buffer is not None:
+                if not pages:
+                    open_array: list = list(context.current_array_value_buffer)
+                    if child_value is not None:
+                        open_array.append(child_value)
+                    open_value = tuple(open_array)
+                else:
+                    if child_value is not None:
+                        pages = (*pages, (child_value,))
+                    open_value = _PagedArray(pages)
+            elif not pages:
+                open_object: dict = dict(context.current_object_value_buffer)
+                if child_value is not None:
+                    open_object[context.current_key] = child_value
+                open_value = MappingProxyType(open_object)
+            else:
+                if child_value is not None:
+                    pages = (*pages, {context.current_key: child_value})
+                open_value = _PagedObject(pages)
+
+        # a concurrent reader only keeps the pages if the writer did not change the buffers meanwhile
+        if self.__state.version == version:
+            self.__get_own_state().snapshot_pages = tuple(snapshot_pages)
+        return open_value
+
+    @staticmethod
+    def __copy_value(value: object) -> object:
+        # strings and scalars are immutable and can be shared, only the (frozen) containers and the records are copied
+        # the parser only builds a few exact types and no cycles, so there is no memo and no dispatch per type
+        value_type: type = type(value)
+        if value_type not in _COPIED_TYPES:
+            return value
+        if value_type is _LazyString:
+            return str(value)
+
+        # every container is first copied shallowly at C speed, then its nested containers are replaced by their
+        # copies with a stack instead of recursion, closed objects can be nested deeper than the recursion limit
+        # the root is copied like a nested value of this list
+        copied_value: list = [value]
+        pending_containers: list[dict | list] = [copied_value]
+        # a record is built once its fields are copied, the records found last are the innermost ones
+        pending_records: list[tuple[dict | list, object, type, dict | list]] = []
+        while pending_containers:
+            container: dict | list = pending_containers.pop()
+            # replacing the value of a key does not change the keys being iterated
+            for key, nested in (
+                container.items() if type(container) is dict else enumerate(container)
+            ):
+                nested_type: type = type(nested)
+                if nested_type not in _COPIED_TYPES:
+                    continue
+
+                if nested_type is _LazyString:
+                    container[key] = str(nested)
+                    continue
+
+                nested_copy: dict | list
+                if (
+                    nested_type is tuple
+                    or nested_type is list
+                    or nested_type is _PagedArray
+                ):
+                    nested_copy = list(nested)
+                elif (
+                    nested_type is dict
+                    or nested_type is MappingProxyType
+                    or nested_type is _PagedObject
+                ):
+                    nested_copy = nested.copy()
+                else:
+                    # the fields of a record are copied like the values of an object
+                    nested_copy = (
+                        {
+                            name: getattr(nested, name)
+                            for name in _DATACLASS_FIELD_NAMES[nested_type]
+                        }
+                        if nested_type in _DATACLASS_FIELD_NAMES
+                        else list(nested)
+                    )
+                    pending_records.append((container, key, nested_type, nested_copy))
+                container[key] = nested_copy
+                pending_containers.append(nested_copy)
+
+        for container, key, record_type, fields in reversed(pending_records):
+            container[key] = _build_record_copy(record_type, fields)
+        return copied_value[0]
+
+    def get(self, max_staleness: float | None = None) -> "dict | Mapping":
+        """
+        Returns the current state of the parsed object.
+        String values and arrays can be returned even when partially built.
+        Object values are returned once the object is fully built.
+
+        Args:
+            max_staleness (float | None): Return the read-only snapshot() instead of a copy, the same one as the
+                previous call with max_staleness when it was taken at most this many seconds ago. The snapshot is
+                shared between these calls and cannot be modified. A new copy is returned on every call if None
+
+        Returns:
+            dict | Mapping: A copy of the parsed object which can be freely modified by the caller, or the same
+            view as snapshot() for a lazy parser or with max_staleness.
+        """
+
+        if max_staleness is not None:
+            return self.__get_cached(max_staleness)
+
+        if self.__state.published_snapshot is not None:
+            snapshot: Mapping = self.__read_published_snapshot()
+            return snapshot if self.__state.is_lazy else self.__copy_value(snapshot)
+
+        if self.__state.stats is not None:
+            return self.__get_instrumented()
+
+        if self.__state.is_lazy:
+            return self.snapshot()
+
+        # returning a copy of the output to prevent accidental modification
+        return self.__build_visible_value(False)
+
+    def __get_cached(self, max_staleness: float) -> Mapping:
+        # the frozen snapshot is shared instead of a copy, a caller cannot modify what the next caller is given
+        now: float = time.monotonic()
+        if self.__state.cached_value is not None:
+            cached_time, cached_snapshot = self.__state.cached_value
+            if now - cached_time <= max_staleness:
+                return cached_snapshot
+
+        snapshot: Mapping = self.snapshot()
+        self.__get_own_state().cached_value = (now, snapshot)
+        return snapshot
+
+    def __get_instrumented(self) -> "dict | LazyObject":
+        start_time: int = time.perf_counter_ns()
+        if self.__state.is_lazy:
+            # a view, nothing is copied
+            value: dict | LazyObject = self.snapshot()
+        else:
+            value = self.__build_visible_value(False)
+            # only the containers are copied, strings and scalars are shared with the parser
+            containers: list[dict | list] = [value]
+            while containers:
+                container: dict | list = containers.pop()
+                self.__state.stats.get_bytes_copied += sys.getsizeof(container)
+                containers.extend(
+                    nested
+                    for nested in (
+                        container.values() if isinstance(container, dict) else container
+                    )
+                    if isinstance(nested, (dict, list))
+                )
+
+        self.__state.stats.record_call("get", time.perf_counter_ns() - start_time)
+        return value
+
+    def get_exceeded_limits(self) -> set[str]:
+        """
+        Returns:
+            set[str]: The names of the limits which truncated the parsed object, see ParserLimits
+        """
+
+        return set(self.__state.exceeded_limits)
+
+    def snapshot(self) -> Mapping:
+        """
+        Returns a read-only view of the current state of the parsed object.
+        Unlike get() nothing is deep copied: closed nested objects are shared between snapshots and the same
+        snapshot is returned again if nothing changed since the previous call.
+
+        Returns:
+            Mapping: A read-only view of the parsed object (arrays are tuples), it is not affected by later calls to
+            consume().
+        """
+
+        if self.__state.published_snapshot is not None:
+            return self.__read_published_snapshot()
+
+        if self.__snapshot is None:
+            self.__snapshot = self.__build_snapshot()
+
+        return self.__snapshot
+
+    def __build_snapshot(self) -> Mapping:
+        # only the visible open values can still change, take a shallow copy of them
+        snapshot: Mapping = self.__build_visible_value(True)
+        return LazyObject(snapshot) if self.__state.is_lazy else snapshot
+
+    def __read_published_snapshot(self) -> Mapping:
+        # the version is read before and after building the snapshot, like a seqlock
+        published_version, published_snapshot = self.__state.published_snapshot
+        version: int = self.__state.version
+        if version == published_version:
+            return published_snapshot
+
+        if version % 2 == 0:
+            snapshot: Mapping | None = None
+            try:
+                snapshot = self.__build_snapshot()
+            except RuntimeError:
+                # a container changed size while it was copied, the version changed too
+                pass
+
+            if snapshot is not None and self.__state.version == version:
+                with self.__state.publication_lock:
+                    # another reader or the writer can have published a newer snapshot meanwhile
+                    if self.__state.published_snapshot[0] < version:
+                        self.__state.published_snapshot = (version, snapshot)
+                    return self.__state.published_snapshot[1]
+
+        # the writer is consuming a buffer, the last published snapshot is the latest consistent state
+        self.__state.is_snapshot_requested = True
+        return published_snapshot
+
+    def __publish_requested_snapshot(self) -> None:
+        # called by the writer between two buffers, it never waits for a reader holding the lock
+        snapshot: Mapping = self.__build_snapshot()
+        if self.__state.publication_lock.acquire(blocking=False):
+            try:
+                self.__state.is_snapshot_requested = False
+                self.__state.published_snapshot = (self.__state.version, snapshot)
+            finally:
+                self.__state.publication_lock.release()
+        return
+
+    def checkpoint(self) -> bytes:
+        """
+        Serialize the state of the parser, see restore().
+        The stream can be resumed from the first character which was not consumed before the checkpoint.
+
+        Returns:
+            bytes: A compact binary representation of the state, portable between processes and machines
+        """
+
+        contexts: list[object] = list()
+        for context in itertools.chain(self.__context_stack, (self.__current_context,)):
+            is_array: bool = context.current_array_value_buffer is not None
+            contexts.append(
+                is_array * self.__ARRAY_FLAG
+                | context.is_visible * self.__VISIBLE_FLAG
+                | context.is_parsing_key * self.__PARSING_KEY_FLAG
+                | context.is_parsing_value * self.__PARSING_VALUE_FLAG
+                | context.is_parsing_scalar * self.__PARSING_SCALAR_FLAG
+            )
+            contexts.append(context.current_key)
+            # an empty partial string is not the same as no partial string
+            contexts.append(self.__join_checkpoint_buffer(context.current_key_buffer))
+            contexts.append(
+                self.__join_checkpoint_buffer(context.current_string_value_buffer)
+            )
+            contexts.append(
+                context.current_array_value_buffer
+                if is_array
+                else context.current_object_value_buffer
+            )
+
+        # bytes of a character split between two consume_bytes() calls
+        decoder_state: tuple[bytes, int] = (
+            (b"", 0)
+            if self.__state.decoder is None
+            else self.__state.decoder.getstate()
+        )
+        state: list = [
+            self.__is_skipping_value,
+            self.__state.is_skipping_string,
+            self.__state.skipped_container_depth,
+            self.__is_escaping,
+            self.__has_escapes,
+            self.__pending_escape,
+            self.__state.consumed_characters,
+            self.__state.string_length,
+            sorted(self.__state.exceeded_limits),
+            (
+                None
+                if self.__state.decoder is None
+                else decoder_state[0].decode("latin-1")
+            ),
+            decoder_state[1],
+            contexts,
+        ]
+
+        tokens: array = array("Q")
+        texts: list[str] = list()
+        self.__encode_value(
+            state,
+            tokens,
+            texts,
+            self.__get_record_types(self.__get_root_context().selection),
+        )
+        # the tokens only take 8 bytes when a string has more than 2^28 characters
+        if not tokens or max(tokens) < 1 << 32:
+            tokens = array("I", tokens)
+        if sys.byteorder == "big":
+            tokens.byteswap()
+        # lone surrogates can be decoded from escapes, they are kept as they are
+        text: bytes = "".join(texts).encode("utf-8", "surrogatepass")
+        return b"".join(
+            (
+                self.__CHECKPOINT_HEADER,
+                self.__CHECKPOINT_LENGTHS.pack(tokens.itemsize, len(tokens), len(text)),
+                tokens.tobytes(),
+                text,
+            )
+        )
+
+    @classmethod
+    def restore(
+        cls,
+        checkpoint: bytes,
+        select: Iterable[str] | None = None,
+        lazy: bool = False,
+        stats: "ParserStats | None" = None,
+        limits: "ParserLimits | None" = None,
+        schema: type | Mapping | None = None,
+        key_cache: "KeyCache | None" = None,
+        concurrent: bool = False,
+        sinks: "Mapping[str, Callable[[str, bool], object] | io.TextIOBase | asyncio.Queue] | None" = None,
+    ) -> "StreamingJsonParser":
+        """
+        Create a parser in the state serialized by checkpoint().
+        The configuration is not part of the checkpoint, the arguments should be the ones of the checkpointed parser.
+
+        Args:
+            checkpoint (bytes): The result of checkpoint()
+            select (Iterable[str] | None): See StreamingJsonParser()
+            lazy (bool): See StreamingJsonParser()
+            stats (ParserStats | None): See StreamingJsonParser()
+            limits (ParserLimits | None): See StreamingJsonParser()
+            schema (type | Mapping | None): See StreamingJsonParser()
+            key_cache (KeyCache | None): See StreamingJsonParser()
+            concurrent (bool): See StreamingJsonParser()
+            sinks (Mapping | None): See StreamingJsonParser()
+
+        Returns:
+            StreamingJsonParser: A parser which continues where the checkpointed parser stopped
+
+        Raises:
+            ValueError: If the checkpoint was not created by checkpoint() with the same schema
+        """
+
+        header_length: int = len(cls.__CHECKPOINT_HEADER)
+        tokens_start: int = header_length + cls.__CHECKPOINT_LENGTHS.size
+        if (
+            checkpoint[:header_length] != cls.__CHECKPOINT_HEADER
+            or len(checkpoint) < tokens_start
+        ):
+            raise ValueError("Invalid parser checkpoint")
+
+        token_size, token_count, text_length = cls.__CHECKPOINT_LENGTHS.unpack_from(
+            checkpoint, header_length
+        )
+        text_start: int = tokens_start + token_size * token_count
+        if token_size not in (4, 8) or len(checkpoint) != text_start + text_length:
+            raise ValueError("Invalid parser checkpoint")
+
+        tokens: array = array("I" if token_size == 4 else "Q")
+        tokens.frombytes(checkpoint[tokens_start:text_start])
+        if sys.byteorder == "big":
+            tokens.byteswap()
+        text: str = checkpoint[text_start:].decode("utf-8", "surrogatepass")
+        parser: StreamingJsonParser = cls(
+            select, lazy, stats, limits, schema, key_cache, concurrent, sinks
+        )
+        record_types: dict[str, type] = {
+            name: record_type
+            for record_type, (name, _, _) in cls.__get_record_types(
+                parser.__current_context.selection
+            ).items()
+        }
+        (
+            is_skipping_value,
+            is_skipping_string,
+            skipped_container_depth,
+            is_escaping,
+            has_escapes,
+            pending_escape,
+            consumed_characters,
+            string_length,
+            exceeded_limits,
+            decoder_buffer,
+            decoder_flag,
+            contexts,
+        ) = cls.__decode_value(tokens, text, record_types)
+
+        parser.__is_skipping_value = is_skipping_value
+        parser.__is_escaping = is_escaping
+        parser.__has_escapes = has_escapes
+        parser.__pending_escape = pending_escape
+        # the default state of a parser without options is kept unless something was stored in it
+        if (
+            is_skipping_string
+            or skipped_container_depth
+            or consumed_characters
+            or string_length
+            or exceeded_limits
+            or decoder_buffer is not None
+        ):
+            state: StreamingJsonParser.__OptionalState = parser.__get_own_state()
+            state.is_skipping_string = is_skipping_string
+            state.skipped_container_depth = skipped_container_depth
+            state.consumed_characters = consumed_characters
+            state.string_length = string_length
+            if exceeded_limits:
+                state.exceeded_limits = set(exceeded_limits)
+            if decoder_buffer is not None:
+                state.decoder = codecs.getincrementaldecoder("utf-8")()
+                state.decoder.setstate((decoder_buffer.encode("latin-1"), decoder_flag))
+
+        restored_contexts: list[StreamingJsonParser.__ParsingContext] = list()
+        selection: dict | None = parser.__current_context.selection
+        for context_start in range(0, len(contexts), 5):
+            (
+                flags,
+                current_key,
+                current_key_buffer,
+                current_string_value_buffer,
+                value_buffer,
+            ) = contexts[context_start : context_start + 5]
+            # the selection of every context is derived from its parent like in __push_context()
+            if (
+                restored_contexts
+                and selection is not None
+                and restored_contexts[-1].current_array_value_buffer is None
+            ):
+                selection = selection[restored_contexts[-1].current_key]
+
+            is_array: bool = bool(flags & cls.__ARRAY_FLAG)
+            context = StreamingJsonParser.__ParsingContext(
+                selection, is_array, bool(flags & cls.__VISIBLE_FLAG)
+            )
+            context.is_parsing_key = bool(flags & cls.__PARSING_KEY_FLAG)
+            context.is_parsing_value = bool(flags & cls.__PARSING_VALUE_FLAG)
+            context.is_parsing_scalar = bool(flags & cls.__PARSING_SCALAR_FLAG)
+            context.current_key = current_key
+            if current_key_buffer is not None:
+                context.current_key_buffer = [current_key_buffer]
+            if current_string_value_buffer is not None:
+                context.current_string_value_buffer = [current_string_value_buffer]
+            # the open values are the only ones which are not frozen
+            if is_array:
+                context.current_array_value_buffer = list(value_buffer)
+            else:
+                context.current_object_value_buffer = dict(value_buffer)
+            restored_contexts.append(context)
+
+        parser.__current_context = restored_contexts.pop()
+        if restored_contexts:
+            parser.__context_stack = restored_contexts
+        if (
+            is_skipping_value
+            and skipped_container_depth == 0
+            and type(parser.__current_context.selection) is cls.__SinkNode
+            and (limits is None or not parser.__is_too_long("max_key_length"))
+        ):
+            # the sink of the value is found again from its key like in __build_current_key()
+            parser.__state.sink = parser.__current_context.selection.sinks.get(
+                parser.__current_context.current_key
+            )
+        if concurrent:
+            parser.__state.published_snapshot = (0, parser.__build_snapshot())
+        return parser
+
+    @staticmethod
+    def __join_checkpoint_buffer(buffer: list[str] | tuple[()]) -> str | None:
+        return "".join(buffer) if isinstance(buffer, list) else None
+
+    def __get_root_context(self) -> __ParsingContext:
+        return (
+            self.__context_stack[0] if self.__context_stack else self.__current_context
+        )
+
+    @classmethod
+    def __get_record_types(
+        cls, selection: dict | None
+    ) -> dict[type, tuple[str, __SchemaNode, dict]]:
+        # the record types of a schema with their name in checkpoints, their node and the defaults of their fields
+        record_types: dict[type, tuple[str, StreamingJsonParser.__SchemaNode, dict]] = (
+            dict()
+        )
+        pending_nodes: list[dict | None] = [selection]
+        while pending_nodes:
+            node: dict | None = pending_nodes.pop()
+            if type(node) is not cls.__SchemaNode or node.record_type in record_types:
+                continue
+            if node.record_type is not None:
+                record_types[node.record_type] = (
+                    f"{node.record_type.__module__}.{node.record_type.__qualname__}",
+                    node,
+                    cls.__get_field_defaults(node.record_type),
+                )
+            pending_nodes.extend(node.values())
+        return record_types
+
+    @staticmethod
+    def __get_field_defaults(record_type: type) -> dict:
+        if not dataclasses.is_dataclass(record_type):
+            return dict(record_type._field_defaults)
+
+        defaults: dict = dict()
+        for field in dataclasses.fields(record_type):
+            if field.default is not dataclasses.MISSING:
+                defaults[field.name] = field.default
+            elif field.default_factory is not dataclasses.MISSING:
+                defaults[field.name] = field.default_factory()
+        return defaults
+
+    @classmethod
+    def __encode_value(
+        cls,
+        value: object,
+        tokens: array,
+        texts: list[str],
+        record_types: dict[type, tuple[str, __SchemaNode, dict]],
+    ) -> None:
+        # the values are written depth first, a container is followed by its items (or its keys and values)
+        tag_bits: int = cls.__TAG_BITS
+        pending_values: list[object] = [value]
+        while pending_values:
+            value = pending_values.pop()
+            if isinstance(value, str):
+                texts.append(value)
+                tokens.append(len(value) << tag_bits | cls.__STRING_TAG)
+            elif value is None:
+                tokens.append(cls.__NULL_TAG)
+            elif value is True:
+                tokens.append(cls.__TRUE_TAG)
+            elif value is False:
+                tokens.append(cls.__FALSE_TAG)
+            elif isinstance(value, int):
+                text: str = repr(value)
+                texts.append(text)
+                tokens.append(len(text) << tag_bits | cls.__INT_TAG)
+            elif isinstance(value, float):
+                text = repr(value)
+                texts.append(text)
+                tokens.append(len(text) << tag_bits | cls.__FLOAT_TAG)
+            elif isinstance(value, Mapping):
+                tokens.append(len(value) << tag_bits | cls.__OBJECT_TAG)
+                for key, nested in reversed(value.items()):
+                    pending_values.append(nested)
+                    pending_values.append(key)
+            elif isinstance(value, _LazyString):
+                text = str(value)
+                texts.append(text)
+                tokens.append(len(text) << tag_bits | cls.__STRING_TAG)
+            elif type(value) in record_types:
+                name, node, defaults = record_types[type(value)]
+                # a default (which may be mutable) is not written, it is created again by the record type
+                fields: list[tuple[str, object]] = list()
+                for key in node:
+                    field_value: object = getattr(value, key)
+                    if key not in defaults or field_value != defaults[key]:
+                        fields.append((key, field_value))
+                tokens.append(len(fields) << tag_bits | cls.__RECORD_TAG)
+                for key, field_value in reversed(fields):
+                    pending_values.append(field_value)
+                    pending_values.append(key)
+                pending_values.append(name)
+            else:
+                tokens.append(len(value) << tag_bits | cls.__ARRAY_TAG)
+                pending_values.extend(reversed(value))
+        return
+
+    @classmethod
+    def __decode_value(
+        cls, tokens: array, text: str, record_types: dict[str, type]
+    ) -> object:
+        tag_bits: int = cls.__TAG_BITS
+        tag_mask: int = cls.__TAG_MASK
+        string_tag: int = cls.__STRING_TAG
+        int_tag: int = cls.__INT_TAG
+        float_tag: int = cls.__FLOAT_TAG
+        object_tag: int = cls.__OBJECT_TAG
+        array_tag: int = cls.__ARRAY_TAG
+        literals_by_tag: tuple = cls.__LITERALS_BY_TAG
+
+        # the tag and items of the containers being decoded and how many items are still expected
+        # a container is frozen when it is complete, restore() thaws the open ones
+        decoded_values: list[object] = list()
+        open_containers: list[list] = [[decoded_values, -1, array_tag]]
+        text_offset: int = 0
+        for token in tokens:
+            tag: int = token & tag_mask
+            length: int = token >> tag_bits
+            value: object
+            if tag == string_tag:
+                value = text[text_offset : text_offset + length]
+                text_offset += length
+            elif tag < string_tag:
+                value = literals_by_tag[tag]
+            elif tag > float_tag:
+                if tag == object_tag:
+                    length *= 2
+                elif tag != array_tag:
+                    # the name of the record type comes first
+                    length = length * 2 + 1
+                if length:
+                    open_containers.append([list(), length, tag])
+                    continue
+                value = MappingProxyType(dict()) if tag == object_tag else ()
+            else:
+                value = text[text_offset : text_offset + length]
+                text_offset += length
+                value = int(value) if tag == int_tag else float(value)
+
+            # add the value to its container and close the containers which are complete
+            while True:
+                container: list = open_containers[-1]
+                container[0].append(value)
+                container[1] -= 1
+                if container[1]:
+                    break
+                open_containers.pop()
+                items: list = container[0]
+                if container[2] == array_tag:
+                    value = tuple(items)
+                elif container[2] == object_tag:
+                    value = MappingProxyType(dict(zip(items[::2], items[1::2])))
+                elif items[0] in record_types:
+                    value = record_types[items[0]](
+                        **dict(zip(items[1::2], items[2::2]))
+                    )
+                else:
+                    raise ValueError(
+                        f"The record type {items[0]} is not part of the schema"
+                    )
+
+        return decoded_values[0]
+
+
+class ParserLimits:
+    """
+    Limits bounding the memory used by a StreamingJsonParser(limits=...), a limit is disabled when it is None.
+    Lengths are counted in characters (after decoding the escapes) and the depth in open nested objects and arrays.
+
+    Attributes:
+        max_depth (int | None): The maximum number of nested objects and arrays open at once
+        max_key_length (int | None): The maximum length of a key
+        max_string_length (int | None): The maximum length of a string value (or of a number)
+        max_total_characters (int | None): The maximum number of characters consumed by the parser
+        max_keys_per_object (int | None): The maximum number of keys of an object
+        truncate (bool): Raise a ParserLimitError when a limit is exceeded if False. Otherwise truncate: string values
+            are cut at their maximum length, the values of longer keys, longer numbers, values deeper than the maximum
+            depth and the keys after the maximum number of keys are skipped and the characters after the maximum
+            total are ignored
+    """
+
+    __slots__ = (
+        "max_depth",
+        "max_key_length",
+        "max_string_length",
+        "max_total_characters",
+        "max_keys_per_object",
+        "truncate",
+    )
+
+    max_depth: int | None
+    max_key_length: int | None
+    max_string_length: int | None
+    max_total_characters: int | None
+    max_keys_per_object: int | None
+    truncate: bool
+
+    def __init__(
+        self,
+        max_depth: int | None = None,
+        max_key_length: int | None = None,
+        max_string_length: int | None = None,
+        max_total_characters: int | None = None,
+        max_keys_per_object: int | None = None,
+        truncate: bool = False,
+    ) -> None:
+        self.max_depth = max_depth
+        self.max_key_length = max_key_length
+        self.max_string_length = max_string_length
+        self.max_total_characters = max_total_characters
+        self.max_keys_per_object = max_keys_per_object
+        self.truncate = truncate
+        return
+
+
+class ParserLimitError(ValueError):
+    """
+    Raised by a StreamingJsonParser when one of its ParserLimits is exceeded, the parser should then be discarded
+
+    Attributes:
+        limit (str): The name of the exceeded limit, e.g. "max_depth"
+        max_value (int): The value of the limit
+    """
+
+    limit: str
+    max_value: int
+
+    def __init__(self, limit: str, max_value: int) -> None:
+        super().__init__(f"{limit} of {max_value} exceeded")
+        self.limit = limit
+        self.max_value = max_value
+        return
+
+
+class ParserStats:
+    """
+    Instrumentation counters of the parsers created with StreamingJsonParser(stats=...).
+    A ParserStats can be shared by several parsers to aggregate them.
+
+    Attributes:
+        characters_by_phase (dict[str, int]): The characters consumed by each phase of consume(): building keys
+            ("build_current_key"), building values ("build_current_value"), building whole pairs and array elements
+            at once in long buffers ("build_pairs"), closing objects ("find_index_for_char") and skipping unselected
+            values ("skip_value")
+        context_pushes (int): The number of nested objects and arrays opened
+        context_pops (int): The number of nested objects and arrays closed
+        max_depth (int): The maximum number of open nested objects and arrays
+        get_bytes_copied (int): The size of the containers copied by get()
+        call_time_histograms (dict[str, dict[int, int]]): The number of "consume" and "get" calls by duration,
+            a call taking d nanoseconds is counted in the power of two bucket 2^(k-1) <= d < 2^k with key 2^k
+        callback (Callable[[str, int, ParserStats], None] | None): Called after every consume() or get() with the
+            name of the call, its duration in nanoseconds and the stats
+    """
+
+    __slots__ = (
+        "characters_by_phase",
+        "context_pushes",
+        "context_pops",
+        "max_depth",
+        "get_bytes_copied",
+        "call_time_histograms",
+        "callback",
+    )
+
+    characters_by_phase: dict[str, int]
+    context_pushes: int
+    context_pops: int
+    max_depth: int
+    get_bytes_copied: int
+    call_time_histograms: dict[str, dict[int, int]]
+    callback: "Callable[[str, int, ParserStats], None] | None"
+
+    def __init__(
+        self, callback: "Callable[[str, int, ParserStats], None] | None" = None
+    ) -> None:
+        self.characters_by_phase = {
+            "build_current_key": 0,
+            "build_current_value": 0,
+            "build_pairs": 0,
+            "find_index_for_char": 0,
+            "skip_value": 0,
+        }
+        self.context_pushes = 0
+        self.context_pops = 0
+        self.max_depth = 0
+        self.get_bytes_copied = 0
+        self.call_time_histograms = {"consume": dict(), "get": dict()}
+        self.callback = callback
+        return
+
+    def record_call(self, call: str, duration_ns: int) -> None:
+        """
+        Count a call in its timing histogram and notify the callback
+
+        Args:
+            call (str): "consume" or "get"
+            duration_ns (int): The duration of the call in nanoseconds
+        """
+
+        histogram: dict[int, int] = self.call_time_histograms[call]
+        bucket: int = 1 << duration_ns.bit_length()
+        histogram[bucket] = histogram.get(bucket, 0) + 1
+        if self.callback is not None:
+            self.callback(call, duration_ns, self)
+        return
+
+    def as_dict(self) -> dict:
+        """
+        Returns:
+            dict: A copy of the counters, e.g. to be exported as JSON
+        """
+
+        return {
+            "characters_by_phase": dict(self.characters_by_phase),
+            "context_pushes": self.context_pushes,
+            "context_pops": self.context_pops,
+            "max_depth": self.max_depth,
+            "get_bytes_copied": self.get_bytes_copied,
+            "call_time_histograms": {
+                call: dict(histogram)
+                for call, histogram in self.call_time_histograms.items()
+            },
+        }
+
+
+class KeyCache:
+    """
+    A bounded table of the keys parsed by the StreamingJsonParser(key_cache=...), a KeyCache can be shared by several
+    parsers. The least recently used keys are evicted in batches: the keys are held in two generations of up to half
+    the maximum size, a key found in the older generation moves to the recent one and the older generation is dropped
+    when the recent one is full. A hit is a single dict lookup.
+
+    Attributes:
+        max_size (int): The maximum number of keys held by the cache
+    """
+
+    __slots__ = ("max_size", "__recent_keys", "__older_keys")
+
+    max_size: int
+    __recent_keys: dict[str, str]
+    __older_keys: dict[str, str]
+
+    def __init__(self, max_size: int = 1024) -> None:
+        self.max_size = max_size
+        self.__recent_keys = dict()
+        self.__older_keys = dict()
+        return
+
+    def intern(self, key: str) -> str:
+        """
+        Args:
+            key (str): A parsed key
+
+        Returns:
+            str: The string equal to the key held by the cache, the key itself if it was not in the cache
+        """
+
+        cached_key: str | None = self.__recent_keys.get(key)
+        if cached_key is not None:
+            return cached_key
+
+        cached_key = self.__older_keys.pop(key, key)
+        if len(self.__recent_keys) >= max(self.max_size // 2, 1):
+            self.__older_keys = self.__recent_keys
+            self.__recent_keys = dict()
+        self.__recent_keys[cached_key] = cached_key
+        return cached_key
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.__recent_keys or key in self.__older_keys
+
+    def __len__(self) -> int:
+        return len(self.__recent_keys) + len(self.__older_keys)
+
+
+class _LazyString:
+    # a string value received in several slices, they are joined the first time the value is read
+    __slots__ = ("__slices", "__value")
+
+    __slices: list[str] | None
+    __value: str | None
+
+    def __init__(self, slices: list[str]) -> None:
+        self.__slices = slices
+        self.__value = None
+        return
+
+    def __str__(self) -> str:
+        # readers can share a snapshot across threads: the value is assigned before the slices are cleared, a reader
+        # finding no slices finds the value and two readers joining at once build equal strings
+        value: str | None = self.__value
+        if value is None:
+            slices: list[str] | None = self.__slices
+            if slices is None:
+                return self.__value
+            value = "".join(slices)
+            self.__value = value
+            self.__slices = None
+        return value
+
+
+# an open value of a snapshot is only split into pages from this many values, see StreamingJsonParser.snapshot()
+_MIN_PAGED_LENGTH: int = 64
+
+
+def _append_page(
+    pages: tuple[dict | tuple, ...], page: dict | tuple
+) -> tuple[dict | tuple, ...]:
+    # like the digits of a binary counter every page is larger than the next one, the new page is merged with the
+    # smaller ones: a snapshot has O(log n) pages and a value is copied O(log n) times over all the snapshots
+    # the pages are never modified, the merged page is a new one
+    while pages and len(pages[-1]) <= len(page):
+        page = pages[-1] | page if type(page) is dict else pages[-1] + page
+        pages = pages[:-1]
+    return (*pages, page)
+
+
+class _PagedObject(Mapping):
+    # a read-only open object of a snapshot made of the sealed pages shared with the other snapshots
+    __slots__ = ("__pages", "__length")
+
+    __pages: tuple[dict, ...]
+    __length: int
+
+    def __init__(self, pages: tuple[dict, ...]) -> None:
+        self.__pages = pages
+        self.__length = sum(map(len, pages))
+        return
+
+    def __getitem__(self, key: str) -> object:
+        for page in self.__pages:
+            if key in page:
+                return page[key]
+        raise KeyError(key)
+
+    def __iter__(self) -> Iterator[str]:
+        return itertools.chain.from_iterable(self.__pages)
+
+    def __len__(self) -> int:
+        return self.__length
+
+    def copy(self) -> dict:
+        copied_object: dict = dict()
+        for page in self.__pages:
+            copied_object.update(page)
+        return copied_object
+
+    def __repr__(self) -> str:
+        return f"_PagedObject({self.copy()!r})"
+
+
+class _PagedArray(Sequence):
+    # a read-only open array of a snapshot made of the sealed pages shared with the other snapshots
+    __slots__ = ("__pages", "__starts", "__length")
+
+    __pages: tuple[tuple, ...]
+    # the index of the first element of every page
+    __starts: list[int]
+    __length: int
+
+    def __init__(self, pages: tuple[tuple, ...]) -> None:
+        self.__pages = pages
+        self.__starts = list(itertools.accumulate(map(len, pages), initial=0))
+        self.__length = self.__starts.pop()
+        return
+
+    def __getitem__(self, index: int | slice) -> object:
+        if isinstance(index, slice):
+            return tuple(self)[index]
+
+        if index < 0:
+            index += self.__length
+        if not 0 <= index < self.__length:
+            raise IndexError("array index out of range")
+        page_index: int = bisect.bisect_right(self.__starts, index) - 1
+        return self.__pages[page_index][index - self.__starts[page_index]]
+
+    def __iter__(self) -> Iterator[object]:
+        return itertools.chain.from_iterable(self.__pages)
+
+    def __len__(self) -> int:
+        return self.__length
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, (list, tuple, _PagedArray, LazyArray)):
+            return NotImplemented
+
+        return len(self) == len(other) and all(
+            value == other_value for value, other_value in zip(self, other)
+        )
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return f"_PagedArray({list(self)!r})"
+
+
+# the values copied by get(), anything else is immutable and is shared
+# the record types of a schema are added when the schema is compiled, see _register_record_type()
+_COPIED_TYPES: set[type] = {
+    dict,
+    MappingProxyType,
+    _PagedObject,
+    list,
+    tuple,
+    _PagedArray,
+    _LazyString,
+}
+# the fields of the dataclass records, a NamedTuple record is copied like a tuple
+_DATACLASS_FIELD_NAMES: dict[type, tuple[str, ...]] = dict()
+
+
+def _register_record_type(record_type: type) -> None:
+    if dataclasses.is_dataclass(record_type):
+        _DATACLASS_FIELD_NAMES[record_type] = tuple(
+            field.name for field in dataclasses.fields(record_type)
+        )
+    _COPIED_TYPES.add(record_type)
+    return
+
+
+def _build_record_copy(record_type: type, fields: dict | list) -> object:
+    if type(fields) is list:
+        return record_type._make(fields)
+
+    # the fields are already validated and copied, __init__ and __post_init__ are not run again
+    record: object = object.__new__(record_type)
+    for name, value in fields.items():
+        object.__setattr__(record, name, value)
+    return record
+
+
+def _materialize(value: object) -> object:
+    if isinstance(value, _LazyString):
+        return str(value)
+
+    if isinstance(value, Mapping):
+        return LazyObject(value)
+
+    if type(value) is tuple or type(value) is _PagedArray:
+        return LazyArray(value)
+
+    return value
+
+
+class LazyObject(Mapping):
+    """
+    A read-only view of a parsed object returned by a lazy StreamingJsonParser.
+    Its values are only built when they are accessed: a string received in several chunks is joined on first access
+    (and cached) and nested objects and arrays are wrapped in views instead of being copied.
+    """
+
+    __slots__ = ("__mapping",)
+
+    __mapping: Mapping
+
+    def __init__(self, mapping: Mapping) -> None:
+        self.__mapping = mapping
+        return
+
+    def __getitem__(self, key: str) -> object:
+        return _materialize(self.__mapping[key])
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.__mapping)
+
+    def __len__(self) -> int:
+        return len(self.__mapping)
+
+    def __repr__(self) -> str:
+        return f"LazyObject({dict(self)!r})"
+
+
+class LazyArray(Sequence):
+    """
+    A read-only view of a parsed array returned by a LazyObject, see LazyObject
+    """
+
+    __slots__ = ("__array",)
+
+    __array: Sequence
+
+    def __init__(self, array: Sequence) -> None:
+        self.__array = array
+        return
+
+    def __getitem__(self, index: int | slice) -> object:
+        if isinstance(index, slice):
+            return LazyArray(self.__array[index])
+
+        return _materialize(self.__array[index])
+
+    def __len__(self) -> int:
+        return len(self.__array)
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, (list, tuple, LazyArray)):
+            return NotImplemented
+
+        return len(self) == len(other) and all(
+            value == other_value for value, other_value in zip(self, other)
+        )
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return f"LazyArray({list(self)!r})"
+
+
+class StreamingJsonParserPool:
+    """
+    Multiplexes the parsing of many concurrent JSON streams, each one identified by a stream id.
+    The state of a stream is a single slotted StreamingJsonParser created on its first chunk and released on close().
+    """
+
+    __slots__ = ("__parsers",)
+
+    __parsers: dict[Hashable, StreamingJsonParser]
+
+    def __init__(self) -> None:
+        self.__parsers = dict()
+        return
+
+    def consume(self, stream_id: Hashable, buffer: str) -> None:
+        """
+        Add the content of the buffer to the object of the stream, the stream is opened if it is unknown
+
+        Args:
+            stream_id (Hashable): The id of the stream the buffer belongs to
+            buffer (str): A partial (chunked) representation of a valid JSON object
+        """
+
+        parser: StreamingJsonParser | None = self.__parsers.get(stream_id)
+        if parser is None:
+            parser = self.__parsers[stream_id] = StreamingJsonParser()
+
+        parser.consume(buffer)
+        return
+
+    def get(self, stream_id: Hashable) -> dict:
+        """
+        Returns the current state of the parsed object of the stream, see StreamingJsonParser.get()
+
+        Raises:
+            KeyError: If the stream is not open
+        """
+
+        return self.__parsers[stream_id].get()
+
+    def close(self, stream_id: Hashable) -> dict:
+        """
+        Releases the state of the stream
+
+        Returns:
+            dict: The final state of the parsed object of the stream
+
+        Raises:
+            KeyError: If the stream is not open
+        """
+
+        return self.__parsers.pop(stream_id).get()
+
+    def __contains__(self, stream_id: Hashable) -> bool:
+        return stream_id in self.__parsers
+
+    def __len__(self) -> int:
+        return len(self.__parsers)
+
+
+async def parse_async(
+    chunks: AsyncIterable[str | bytes],
+    every: float = 0.0,
+    time_budget: float = 0.005,
+) -> AsyncIterator[Mapping]:
+    """
+    Parse the chunks of an asynchronous stream and yield read-only snapshots (see StreamingJsonParser.snapshot()).
+    The next chunk is only requested while the previous snapshot is being consumed (at most one chunk in flight)
+    and changes arriving less than `every` seconds after the last snapshot are coalesced into a single snapshot,
+    which is emitted at the latest `every` seconds later even if the stream stalls. The last snapshot is always
+    the final state of the stream.
+
+    Args:
+        chunks (AsyncIterable[str | bytes]): The stream, bytes are decoded incrementally as UTF-8
+        every (float): The minimum number of seconds between two snapshots
+        time_budget (float): The maximum number of seconds to parse without yielding to the event loop
+
+    Yields:
+        Mapping: A read-only view of the parsed object
+    """
+
+    parser: StreamingJsonParser = StreamingJsonParser()
+    decoder: codecs.IncrementalDecoder = codecs.getincrementaldecoder("utf-8")()
+    loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
+    iterator: AsyncIterator[str | bytes] = aiter(chunks)
+    next_chunk: asyncio.Future | None = None
+    last_snapshot_time: float = -math.inf
+    has_pending_changes: bool = False
+
+    try:
+        while True:
+            if next_chunk is None:
+                next_chunk = asyncio.ensure_future(anext(iterator))
+
+            timeout: float | None = None
+            if has_pending_changes:
+                timeout = max(0.0, last_snapshot_time + every - loop.time())
+
+            # the pending chunk is not cancelled on timeout so the stream is never interrupted
+            done, _ = await asyncio.wait((next_chunk,), timeout=timeout)
+            if not done:
+                # nothing arrived before the end of the throttling window, flush the coalesced changes
+                has_pending_changes = False
+                last_snapshot_time = loop.time()
+                yield parser.snapshot()
+                continue
+
+            try:
+                chunk: str | bytes = next_chunk.result()
+            except StopAsyncIteration:
+                break
+            finally:
+                next_chunk = None
+
+            if not isinstance(chunk, str):
+                chunk = decoder.decode(chunk)
+
+            await _consume_within_time_budget(parser, chunk, time_budget)
+            has_pending_changes = True
+
+            if loop.time() - last_snapshot_time >= every:
+                has_pending_changes = False
+                last_snapshot_time = loop.time()
+                yield parser.snapshot()
+
+        # a truncated UTF-8 sequence at the end of the stream is replaced, like bytes.decode would
+        await _consume_within_time_budget(
+            parser, decoder.decode(b"", final=True), time_budget
+        )
+        if has_pending_changes:
+            yield parser.snapshot()
+    finally:
+        # the consumer stopped iterating or was cancelled, do not leave the stream being read in the background
+        if next_chunk is not None:
+            next_chunk.cancel()
+
+
+# small enough to be parsed well under a millisecond, large enough to keep the overhead of yielding negligible
+_TIME_BUDGET_SLICE_SIZE = 8192
+
+
+async def _consume_within_time_budget(
+    parser: StreamingJsonParser, buffer: str, time_budget: float
+) -> None:
+    # the parser supports any split of its input, so a large buffer can be consumed in slices
+    # and the event loop gets control back whenever the time budget is spent
+    start_time: float = time.perf_counter()
+    for slice_start in range(0, len(buffer), _TIME_BUDGET_SLICE_SIZE):
+        parser.consume(buffer[slice_start : slice_start + _TIME_BUDGET_SLICE_SIZE])
+
+        if time.perf_counter() - start_time >= time_budget:
+            await asyncio.sleep(0)
+            start_time = time.perf_counter()
+    return
+
+
+def parse_file(path: str | os.PathLike, select: Iterable[str] | None = None) -> dict:
+    """
+    Parse a UTF-8 encoded JSON file without reading it into memory at once, see StreamingJsonParser.consume_mmap()
+
+    Args:
+        path (str | os.PathLike): The file to parse
+        select (Iterable[str] | None): Only build these key paths, see StreamingJsonParser.__init__()
+
+    Returns:
+        dict: The parsed object
+    """
+
+    parser: StreamingJsonParser = StreamingJsonParser(select)
+    with open(path, "rb") as file:
+        # an empty file can not be mapped
+        if os.fstat(file.fileno()).st_size:
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped_file:
+                parser.consume_mmap(mapped_file)
+
+    return parser.get()
+
+
+def parse_documents_in_parallel(
+    path: str | os.PathLike,
+    select: Iterable[str] | None = None,
+    processes: int | None = None,
+    batch_size: int = 1 << 22,
+) -> Iterator[dict]:
+    """
+    Parse a newline-delimited JSON (NDJSON) file on a pool of processes and yield its documents in order.
+    The file is split in batches of about batch_size bytes at line ends, so a document must not span several lines
+    (several documents can share a line). Each process reads its own batch from the file, the file is never read
+    at once and only a few batches per process are parsed ahead of the consumer.
+
+    Args:
+        path (str | os.PathLike): The file to parse
+        select (Iterable[str] | None): Only build these key paths, see StreamingJsonParser.__init__()
+        processes (int | None): The number of processes, os.cpu_count() if None
+        batch_size (int): The approximate number of bytes parsed by a process at once
+
+    Yields:
+        dict: The documents of the file in order
+    """
+
+    processes = processes or os.cpu_count() or 1
+    selectors: tuple[str, ...] | None = None if select is None else tuple(select)
+    executor: ProcessPoolExecutor = ProcessPoolExecutor(processes)
+    pending_batches: deque[Future] = deque()
+    try:
+        for batch_start, batch_end in _iter_batch_ranges(path, batch_size):
+            pending_batches.append(
+                executor.submit(
+                    _parse_documents_batch, path, batch_start, batch_end, selectors
+                )
+            )
+            if len(pending_batches) > 2 * processes:
+                yield from pending_batches.popleft().result()
+
+        while pending_batches:
+            yield from pending_batches.popleft().result()
+    finally:
+        # the consumer may stop iterating early, do not parse the rest of the file
+        executor.shutdown(cancel_futures=True)
+
+
+def _iter_batch_ranges(
+    path: str | os.PathLike, batch_size: int
+) -> Iterator[tuple[int, int]]:
+    with open(path, "rb") as file:
+        file_size: int = os.fstat(file.fileno()).st_size
+        batch_start: int = 0
+        while batch_start < file_size:
+            # move the end of the batch to the end of its line, a document boundary
+            file.seek(min(batch_start + batch_size, file_size))
+            file.readline()
+            batch_end: int = file.tell()
+            yield batch_start, batch_end
+            batch_start = batch_end
+
+
+def _parse_documents_batch(
+    path: str | os.PathLike,
+    batch_start: int,
+    batch_end: int,
+    selectors: tuple[str, ...] | None,
+) -> list[dict]:
+    with open(path, "rb") as file:
+        file.seek(batch_start)
+        buffer: bytes = file.read(batch_end - batch_start)
+
+    # the batch ends at a line end so it never splits a UTF-8 sequence
+    return StreamingJsonParser(selectors).consume_documents(buffer.decode())
@@ -1,5 +1,69 @@
+import asyncio
+import dataclasses
+import importlib.util
+import io
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import tracemalloc
+import typing
 import unittest
-from hedi_sassi_streaming_json_parser import StreamingJsonParser
+import unittest.mock
+import hedi_sassi_streaming_json_parser
+from hedi_sassi_streaming_json_parser import (
+    KeyCache,
+    ParserLimitError,
+    ParserLimits,
+    ParserStats,
+    StreamingJsonParser,
+    StreamingJsonParserPool,
+    parse_async,
+    parse_documents_in_parallel,
+    parse_file,
+)
+from fuzz_streaming_json_parser import (
+    find_prefix_violation,
+    generate_document,
+    run_fuzzer,
+    serialize_document,
+)
+
+
+@dataclasses.dataclass(slots=True, frozen=True)
+class ToolCall:
+    name: str
+    arguments: dict
+
+
+@dataclasses.dataclass(slots=True)
+class Message:
+    role: str
+    content: str | None = None
+    calls: list[ToolCall] = dataclasses.field(default_factory=list)
+    reply: "Message | None" = None
+
+
+class Point(typing.NamedTuple):
+    x: int
+    y: int
+
+
+class Polygon(typing.TypedDict):
+    label: str
+    points: list[Point]
+
+
+def load_pure_python_module():
+    # a second copy of the module imported while the accelerator is hidden, it always uses the Python loop
+    accelerator_name = "_hedi_sassi_streaming_json_parser"
+    spec = importlib.util.find_spec("hedi_sassi_streaming_json_parser")
+    module = importlib.util.module_from_spec(spec)
+    with unittest.mock.patch.dict(sys.modules, {accelerator_name: None}):
+        spec.loader.exec_module(module)
+    return module
 
 
 class TestStreamingJsonParser(unittest.TestCase):
@@ -158,6 +222,785 @@ class TestStreamingJsonParser(unittest.TestCase):
         parser.consume("}")
         self.assertEqual(parser.get(), {"foo": {}})
 
+    def test_single_character_chunks_streaming_json_parser(self):
+        json_string = '{"a": "b", "c": {"d": null, "e": {"f": "g,}{"}}, "h": ""}'
+        parser = StreamingJsonParser()
+        for character in json_string:
+            parser.consume(character)
+        self.assertEqual(
+            parser.get(), {"a": "b", "c": {"d": None, "e": {"f": "g,}{"}}, "h": ""}
+        )
+
+    def test_large_chunk_streaming_json_parser(self):
+        expected = {f"key{i}": "value " * i for i in range(1000)}
+        expected["nested"] = {"inner": {"x": None}}
+        parser = StreamingJsonParser()
+        parser.consume(json.dumps(expected))
+        self.assertEqual(parser.get(), expected)
+
+    def test_partial_string_value_many_small_chunks(self):
+        parser = StreamingJsonParser()
+        parser.consume('{"foo": "bar", "answer": "')
+        for _ in range(5000):
+            parser.consume("ab")
+        self.assertEqual(parser.get(), {"foo": "bar", "answer": "ab" * 5000})
+        parser.consume("c")
+        self.assertEqual(parser.get(), {"foo": "bar", "answer": "ab" * 5000 + "c"})
+        parser.consume('d", "other": "e"}')
+        self.assertEqual(
+            parser.get(), {"foo": "bar", "answer": "ab" * 5000 + "cd", "other": "e"}
+        )
+
+    def test_snapshot_streaming_json_parser(self):
+        parser = StreamingJsonParser()
+        parser.consume('{"foo": {"bar": "foobar"}, "country": "Switz')
+        snapshot = parser.snapshot()
+        self.assertEqual(snapshot, {"foo": {"bar": "foobar"}, "country": "Switz"})
+        self.assertIs(parser.snapshot(), snapshot)
+
+        parser.consume('erland", "a": {"b": "c"')
+        self.assertEqual(
+            parser.snapshot(), {"foo": {"bar": "foobar"}, "country": "Switzerland"}
+        )
+        self.assertEqual(snapshot, {"foo": {"bar": "foobar"}, "country": "Switz"})
+
+        parser.consume("}}")
+        self.assertEqual(parser.snapshot(), parser.get())
+        self.assertIs(parser.snapshot()["foo"], snapshot["foo"])
+
+    def test_immutable_snapshot_streaming_json_parser(self):
+        parser = StreamingJsonParser()
+        parser.consume('{"foo": {"bar": "foobar"}, "country": "Switz')
+        snapshot = parser.snapshot()
+
+        with self.assertRaises(TypeError):
+            snapshot["country"] = "adios"
+        with self.assertRaises(TypeError):
+            snapshot["foo"]["bar"] = "adios"
+
+        value = parser.get()
+        value["foo"]["bar"] = "adios"
+        self.assertEqual(parser.get(), {"foo": {"bar": "foobar"}, "country": "Switz"})
+
+    def test_snapshot_pages_streaming_json_parser(self):
+        # large open values are split into pages shared by the following snapshots
+        def thaw(value):
+            # the arrays of a snapshot are tuples
+            if isinstance(value, typing.Mapping):
+                return {key: thaw(nested) for key, nested in value.items()}
+            if isinstance(value, typing.Sequence) and not isinstance(value, str):
+                return [thaw(nested) for nested in value]
+            return value
+
+        document = {f"key{i}": f"value{i}" for i in range(300)}
+        document["items"] = [[i, f"item{i}"] for i in range(200)]
+        json_string = json.dumps(document)
+        parser = StreamingJsonParser()
+        lazy_parser = StreamingJsonParser(lazy=True)
+        snapshots = []
+        for i in range(0, len(json_string), 61):
+            parser.consume(json_string[i : i + 61])
+            lazy_parser.consume(json_string[i : i + 61])
+            snapshot = parser.snapshot()
+            self.assertEqual(thaw(snapshot), parser.get())
+            self.assertEqual(lazy_parser.get(), parser.get())
+            snapshots.append((snapshot, parser.get()))
+
+        for snapshot, value in snapshots:
+            self.assertEqual(thaw(snapshot), value)
+            self.assertEqual(list(snapshot), list(value))
+
+        snapshot, value = snapshots[-2]
+        self.assertEqual(snapshot["key299"], "value299")
+        self.assertEqual(snapshot["items"][150], (150, "item150"))
+        self.assertEqual(snapshot["items"][-1], tuple(value["items"][-1]))
+        self.assertEqual(snapshot["items"][10:12], ((10, "item10"), (11, "item11")))
+        self.assertNotIn("missing", snapshot)
+        with self.assertRaises(TypeError):
+            snapshot["key0"] = "adios"
+        with self.assertRaises(IndexError):
+            snapshot["items"][len(value["items"])]
+
+    def test_patches_streaming_json_parser(self):
+        parser = StreamingJsonParser()
+        self.assertEqual(
+            parser.consume_patches('{"foo": null, "bar": "hel'),
+            [
+                {"op": "add", "path": "/foo", "value": None},
+                {"op": "add", "path": "/bar", "value": "hel"},
+            ],
+        )
+        self.assertEqual(
+            parser.consume_patches('lo", "a/b": {"c": "d"'),
+            [{"op": "append", "path": "/bar", "value": "lo"}],
+        )
+        self.assertEqual(
+            parser.consume_patches("}}"),
+            [{"op": "add", "path": "/a~1b", "value": {"c": "d"}}],
+        )
+
+    def test_patches_replay_to_get_streaming_json_parser(self):
+        json_string = (
+            '{"a": "b", "c": {"d": null, "e": {"f": "g"}}, "h": "", "i": null}'
+        )
+        for chunk_size in range(1, len(json_string) + 1):
+            parser = StreamingJsonParser()
+            replayed = {}
+            for i in range(0, len(json_string), chunk_size):
+                for patch in parser.consume_patches(json_string[i : i + chunk_size]):
+                    key = patch["path"][1:].replace("~1", "/").replace("~0", "~")
+                    if patch["op"] == "append":
+                        replayed[key] += patch["value"]
+                    else:
+                        replayed[key] = patch["value"]
+                self.assertEqual(replayed, parser.get())
+
+    def test_bytes_split_inside_character_streaming_json_parser(self):
+        encoded = '{"ключ": "значение"}'.encode()
+        parser = StreamingJsonParser()
+        for i in range(len(encoded)):
+            parser.consume_bytes(encoded[i : i + 1])
+        self.assertEqual(parser.get(), {"ключ": "значение"})
+
+    def test_bytes_like_buffers_streaming_json_parser(self):
+        parser = StreamingJsonParser()
+        parser.consume_bytes(bytearray('{"foo": "bar", "country": "Sw'.encode()))
+        self.assertEqual(parser.get(), {"foo": "bar", "country": "Sw"})
+        parser.consume_bytes(memoryview(b'__itzerland"}')[2:])
+        self.assertEqual(parser.get(), {"foo": "bar", "country": "Switzerland"})
+
+    def test_bytes_larger_than_window_streaming_json_parser(self):
+        expected = {f"key{i}": "значение " * i for i in range(300)}
+        parser = StreamingJsonParser()
+        parser.consume_bytes(json.dumps(expected, ensure_ascii=False).encode())
+        self.assertEqual(parser.get(), expected)
+
+    def test_invalid_bytes_streaming_json_parser(self):
+        parser = StreamingJsonParser()
+        with self.assertRaises(UnicodeDecodeError):
+            parser.consume_bytes(b'{"foo": "\xff"}')
+
+    def test_select_streaming_json_parser(self):
+        json_string = (
+            '{"x": "skip {me}", "a": {"z": {"q": "}{"}, "b": "v", "y": null}, '
+            '"c": {"d": {"e": "f"}}, "y": null, "w": {}, "a2": "g"}'
+        )
+        expected = {"a": {"b": "v"}, "c": {"d": {"e": "f"}}}
+        parser = StreamingJsonParser(select=["a.b", "c"])
+        parser.consume(json_string)
+        self.assertEqual(parser.get(), expected)
+
+        parser = StreamingJsonParser(select=["a.b", "c"])
+        for character in json_string:
+            parser.consume(character)
+        self.assertEqual(parser.get(), expected)
+
+    def test_select_partial_string_streaming_json_parser(self):
+        parser = StreamingJsonParser(select=["answer"])
+        parser.consume('{"reasoning": "lorem ipsum')
+        self.assertEqual(parser.get(), {})
+        parser.consume(' dolor", "answer": "4')
+        self.assertEqual(parser.get(), {"answer": "4"})
+        parser.consume('2"}')
+        self.assertEqual(parser.get(), {"answer": "42"})
+
+    def test_select_whole_subtree_streaming_json_parser(self):
+        parser = StreamingJsonParser(select=["a.b", "a"])
+        parser.consume('{"a": {"b": "c", "d": "e"}, "f": "g"}')
+        self.assertEqual(parser.get(), {"a": {"b": "c", "d": "e"}})
+
+    def test_arrays_streaming_json_parser(self):
+        parser = StreamingJsonParser()
+        parser.consume('{"a": ["x", "y')
+        self.assertEqual(parser.get(), {"a": ["x", "y"]})
+        parser.consume('z", [1, {"b": "c')
+        self.assertEqual(parser.get(), {"a": ["x", "yz", [1]]})
+        parser.consume('"}], []]}')
+        self.assertEqual(parser.get(), {"a": ["x", "yz", [1, {"b": "c"}], []]})
+
+    def test_numbers_and_booleans_streaming_json_parser(self):
+        json_string = '{"a": 42, "b": -1.5e3, "c": true, "d": false, "e": [0, null]}'
+        parser = StreamingJsonParser()
+        parser.consume(json_string)
+        self.assertEqual(parser.get(), json.loads(json_string))
+
+        parser = StreamingJsonParser()
+        parser.consume('{"a": 4')
+        self.assertEqual(parser.get(), {})
+        parser.consume("2")
+        self.assertEqual(parser.get(), {})
+        parser.consume("}")
+        self.assertEqual(parser.get(), {"a": 42})
+
+    def test_pairs_in_long_buffers_streaming_json_parser(self):
+        # long buffers take the fast path of whole pairs, single characters never do
+        json_string = (
+            '{"a": "bc", "d": 1.5e300, "e": -7, "f": true, "g": null, "h": {"i": 0},'
+            ' "j": ["k", 1, true, "u\\"v", -2.5, [null]], "l\\"m": "n\\"o", "p": {},'
+            ' "q": false, "r": "' + "s" * 70 + '", "t": 12345678901234567890}'
+        )
+        for split in range(len(json_string) + 1):
+            parser = StreamingJsonParser()
+            parser.consume(json_string[:split])
+            characters_parser = StreamingJsonParser()
+            for character in json_string[:split]:
+                characters_parser.consume(character)
+            self.assertEqual(parser.get(), characters_parser.get(), split)
+            parser.consume(json_string[split:])
+            self.assertEqual(parser.get(), json.loads(json_string))
+
+    def test_escapes_split_at_every_boundary_streaming_json_parser(self):
+        json_string = r'{"k\"ey": "a\\b\"c\u00e9\ud83d\ude00\n", "x": ["\\"]}'
+        expected = json.loads(json_string)
+        for split_index in range(len(json_string)):
+            parser = StreamingJsonParser()
+            parser.consume(json_string[:split_index])
+            parser.consume(json_string[split_index:])
+            self.assertEqual(parser.get(), expected)
+
+        parser = StreamingJsonParser()
+        for character in json_string:
+            parser.consume(character)
+        self.assertEqual(parser.get(), expected)
+
+    def test_select_through_arrays_streaming_json_parser(self):
+        parser = StreamingJsonParser(select=["a.b"])
+        parser.consume('{"x": [1, "]", {"y": "}"}], "a": {"b": [true, {"c": "d"}]}}')
+        self.assertEqual(parser.get(), {"a": {"b": [True, {"c": "d"}]}})
+
+    def test_array_patches_streaming_json_parser(self):
+        parser = StreamingJsonParser()
+        self.assertEqual(
+            parser.consume_patches('{"a": ["x'),
+            [
+                {"op": "add", "path": "/a", "value": []},
+                {"op": "add", "path": "/a/0", "value": "x"},
+            ],
+        )
+        self.assertEqual(
+            parser.consume_patches('y", 1]}'),
+            [
+                {"op": "append", "path": "/a/0", "value": "y"},
+                {"op": "add", "path": "/a/1", "value": 1},
+            ],
+        )
+
+    def test_documents_streaming_json_parser(self):
+        json_string = '{"a": 1}{"b": {"c": ["}"]}}\n{}\n{"d": "e"}\n'
+        expected = [{"a": 1}, {"b": {"c": ["}"]}}, {}, {"d": "e"}]
+        for chunk_size in (1, 2, 5, len(json_string)):
+            parser = StreamingJsonParser()
+            documents = []
+            for i in range(0, len(json_string), chunk_size):
+                documents.extend(
+                    parser.consume_documents(json_string[i : i + chunk_size])
+                )
+            self.assertEqual(documents, expected)
+
+    def test_partial_document_streaming_json_parser(self):
+        parser = StreamingJsonParser(select=["a"])
+        self.assertEqual(
+            parser.consume_documents('{"a": "b", "c": "d"}\n{"a": "f'), [{"a": "b"}]
+        )
+        self.assertEqual(parser.get(), {"a": "f"})
+        self.assertEqual(parser.consume_documents('g"}'), [{"a": "fg"}])
+        self.assertEqual(parser.get(), {})
+
+    def test_lazy_streaming_json_parser(self):
+        json_string = '{"a": "hello world", "b": {"c": ["x y", 1, {"d": null}]}, "e": [[2, "3 4"]]}'
+        parser = StreamingJsonParser(lazy=True)
+        for i in range(0, len(json_string), 3):
+            parser.consume(json_string[i : i + 3])
+        value = parser.get()
+        self.assertEqual(value, json.loads(json_string))
+        self.assertIs(value["a"], value["a"])
+        self.assertEqual(value["e"][0][1:], ["3 4"])
+        with self.assertRaises(TypeError):
+            value["a"] = "b"
+
+    def test_lazy_partial_value_streaming_json_parser(self):
+        parser = StreamingJsonParser(lazy=True)
+        parser.consume('{"a": ["b", "c')
+        value = parser.get()
+        parser.consume('d"], "e": {"f": "g"}}')
+        self.assertEqual(value, {"a": ["b", "c"]})
+        self.assertEqual(parser.get(), {"a": ["b", "cd"], "e": {"f": "g"}})
+
+    def test_lazy_documents_streaming_json_parser(self):
+        parser = StreamingJsonParser(lazy=True)
+        self.assertEqual(
+            parser.consume_documents('{"a": "b"}\n{"c": ["d"]}\n'),
+            [{"a": "b"}, {"c": ["d"]}],
+        )
+
+    def test_stats_streaming_json_parser(self):
+        calls = []
+        stats = ParserStats(callback=lambda call, duration_ns, _: calls.append(call))
+        parser = StreamingJsonParser(select=["a", "b"], stats=stats)
+        json_string = '{"a": {"b": [1, {}]}, "b": "cd", "e": {"f": "g"}}'
+        for character in json_string:
+            parser.consume(character)
+        self.assertEqual(parser.get(), {"a": {"b": [1, {}]}, "b": "cd"})
+
+        self.assertEqual(sum(stats.characters_by_phase.values()), len(json_string))
+        self.assertGreater(stats.characters_by_phase["skip_value"], 0)
+        self.assertEqual(stats.context_pushes, 3)
+        self.assertEqual(stats.context_pops, 3)
+        self.assertEqual(stats.max_depth, 3)
+        self.assertGreater(stats.get_bytes_copied, 0)
+        self.assertEqual(calls, ["consume"] * len(json_string) + ["get"])
+        self.assertEqual(
+            sum(stats.call_time_histograms["consume"].values()), len(json_string)
+        )
+        self.assertEqual(json.loads(json.dumps(stats.as_dict()))["max_depth"], 3)
+
+    def test_stats_in_long_buffers_streaming_json_parser(self):
+        # the stats are collected by the loop of consume() with its fast paths, like without stats
+        json_string = (
+            '{"a": "b", "c": [1, 2, {"d": [3, "e"]}], "f": {"g": {"h": null}},'
+            + ", ".join(f'"k{i}": {i}' for i in range(20))
+            + "}"
+        )
+        characters_stats = ParserStats()
+        characters_parser = StreamingJsonParser(stats=characters_stats)
+        for character in json_string:
+            characters_parser.consume(character)
+        stats = ParserStats()
+        parser = StreamingJsonParser(stats=stats)
+        parser.consume(json_string)
+        self.assertEqual(parser.get(), json.loads(json_string))
+
+        self.assertEqual(sum(stats.characters_by_phase.values()), len(json_string))
+        self.assertGreater(stats.characters_by_phase["build_pairs"], 100)
+        self.assertEqual(characters_stats.characters_by_phase["build_pairs"], 0)
+        for counter in ("context_pushes", "context_pops", "max_depth"):
+            self.assertEqual(
+                getattr(stats, counter), getattr(characters_stats, counter)
+            )
+        self.assertEqual(stats.max_depth, 3)
+        self.assertEqual(sum(stats.call_time_histograms["consume"].values()), 1)
+
+    def test_limits_raise_streaming_json_parser(self):
+        cases = (
+            ("max_depth", ParserLimits(max_depth=2), '{"a": [{"b": [1]}]}'),
+            ("max_key_length", ParserLimits(max_key_length=3), '{"abcd": 1}'),
+            ("max_string_length", ParserLimits(max_string_length=3), '{"a": "bcde"}'),
+            ("max_string_length", ParserLimits(max_string_length=3), '{"a": 12345}'),
+            (
+                "max_total_characters",
+                ParserLimits(max_total_characters=10),
+                '{"a": "bcdefgh"}',
+            ),
+            (
+                "max_keys_per_object",
+                ParserLimits(max_keys_per_object=1),
+                '{"a": 1, "b": 2}',
+            ),
+        )
+        for limit, limits, json_string in cases:
+            parser = StreamingJsonParser(limits=limits)
+            with self.assertRaises(ParserLimitError) as context:
+                for character in json_string:
+                    parser.consume(character)
+            self.assertEqual(context.exception.limit, limit)
+            self.assertIsInstance(context.exception, ValueError)
+
+    def test_limits_truncate_streaming_json_parser(self):
+        limits = ParserLimits(
+            max_depth=2,
+            max_key_length=3,
+            max_string_length=4,
+            max_keys_per_object=3,
+            truncate=True,
+        )
+        json_string = (
+            '{"ab": "\\u00e9\\u00e9\\u00e9\\u00e9\\u00e9", "abcdef": "g", '
+            '"n": [[[1], "x"], 123456, 7, {"y": {}}], "c": "d", "e": "f"}'
+        )
+        expected = {"ab": "\u00e9" * 4, "n": [["x"], 7, {}], "c": "d"}
+        for chunk_size in (1, len(json_string)):
+            parser = StreamingJsonParser(limits=limits)
+            for i in range(0, len(json_string), chunk_size):
+                parser.consume(json_string[i : i + chunk_size])
+            self.assertEqual(parser.get(), expected)
+            self.assertEqual(
+                parser.get_exceeded_limits(),
+                {
+                    "max_depth",
+                    "max_key_length",
+                    "max_string_length",
+                    "max_keys_per_object",
+                },
+            )
+
+        parser = StreamingJsonParser(
+            limits=ParserLimits(max_total_characters=12, truncate=True)
+        )
+        parser.consume('{"a": "bcdefgh", "i": "j"}')
+        self.assertEqual(parser.get(), {"a": "bcdef"})
+        self.assertEqual(parser.get_exceeded_limits(), {"max_total_characters"})
+
+    def test_limits_truncate_keys_and_numbers_streaming_json_parser(self):
+        # a cut key or number would be another key or number, their values are skipped
+        cases = (
+            (
+                "max_string_length",
+                '{"a": 1.5e300, "b": -12345, "c": 123, "d": [true, false, 1], "e": "fghi"}',
+                {"c": 123, "d": [1], "e": "fgh"},
+            ),
+            (
+                "max_key_length",
+                '{"abcX": 1, "abcY": {"z": [2]}, "abc": 3, "abcdef": "g"}',
+                {"abc": 3},
+            ),
+        )
+        for limit, json_string, expected in cases:
+            for chunk_size in (1, 2, 5, len(json_string)):
+                parser = StreamingJsonParser(
+                    limits=ParserLimits(**{limit: 3}, truncate=True)
+                )
+                for i in range(0, len(json_string), chunk_size):
+                    parser.consume(json_string[i : i + chunk_size])
+                self.assertEqual(parser.get(), expected)
+                self.assertEqual(parser.get_exceeded_limits(), {limit})
+
+    def test_limits_in_long_buffers_streaming_json_parser(self):
+        # long buffers take the fast paths with limits too, single characters never do
+        json_string = (
+            '{"a": "bcd", "ab": 12, "abcd": "e", "b": "fghij", "c": [1, "kl", "mnopq",'
+            ' 123456, [2]], "d": {"e": {"f": {"g": 1}}}, "e": 7, "f": "x", "g": "y",'
+            ' "h": "z", "i": "' + "j" * 70 + '"}'
+        )
+        limits = dict(
+            max_depth=2, max_key_length=3, max_string_length=4, max_keys_per_object=8
+        )
+        characters_parser = StreamingJsonParser(
+            limits=ParserLimits(**limits, truncate=True)
+        )
+        for split in range(len(json_string) + 1):
+            parser = StreamingJsonParser(limits=ParserLimits(**limits, truncate=True))
+            parser.consume(json_string[:split])
+            self.assertEqual(parser.get(), characters_parser.get(), split)
+            parser.consume(json_string[split:])
+            self.assertEqual(
+                parser.get(),
+                {"a": "bcd", "ab": 12, "b": "fghi", "c": [1, "kl", "mnop", [2]]}
+                | {"d": {"e": {}}, "e": 7, "f": "x", "g": "y"},
+            )
+            self.assertEqual(parser.get_exceeded_limits(), set(limits))
+            characters_parser.consume(json_string[split : split + 1])
+
+        for limit, max_value in limits.items():
+            parser = StreamingJsonParser(limits=ParserLimits(**{limit: max_value}))
+            with self.assertRaises(ParserLimitError) as context:
+                parser.consume(json_string)
+            self.assertEqual(context.exception.limit, limit)
+
+    def test_checkpoint_restore_at_every_split_streaming_json_parser(self):
+        json_string = (
+            '{"a": "x\\u00e9\\ud83d\\ude00\\"y", "b": [1, 2.5, true, null, {"c": [[], {}]}], '
+            '"d": {"e": {"f": "é"}}, "g": "end"}'
+        )
+        expected = json.loads(json_string)
+        for i in range(len(json_string) + 1):
+            parser = StreamingJsonParser()
+            parser.consume(json_string[:i])
+            restored = StreamingJsonParser.restore(parser.checkpoint())
+            self.assertEqual(restored.get(), parser.get())
+            restored.consume(json_string[i:])
+            self.assertEqual(restored.get(), expected)
+
+        json_bytes = json_string.encode()
+        for i in range(len(json_bytes) + 1):
+            parser = StreamingJsonParser(select=["b", "d.e"])
+            parser.consume_bytes(json_bytes[:i])
+            restored = StreamingJsonParser.restore(
+                parser.checkpoint(), select=["b", "d.e"]
+            )
+            restored.consume_bytes(json_bytes[i:])
+            self.assertEqual(restored.get(), {"b": expected["b"], "d": expected["d"]})
+
+    def test_checkpoint_deeply_nested_streaming_json_parser(self):
+        parser = StreamingJsonParser()
+        parser.consume('{"a": ' + '{"b": ' * 5000 + "{}" + "}" * 5000 + ', "c": "de')
+        restored = StreamingJsonParser.restore(parser.checkpoint())
+        restored.consume('f"}')
+        self.assertEqual(restored.get()["c"], "def")
+
+        with self.assertRaises(ValueError):
+            StreamingJsonParser.restore(b"not a checkpoint")
+
+    def test_get_deeply_nested_streaming_json_parser(self):
+        depth = 20000
+        parser = StreamingJsonParser()
+        parser.consume(
+            '{"a": ' + '{"b": [' * depth + '"c"' + "]}" * depth + ', "d": "e'
+        )
+        value = parser.get()
+        self.assertEqual(value["d"], "e")
+        nested = value["a"]
+        for _ in range(depth):
+            self.assertIs(type(nested), dict)
+            nested = nested["b"]
+            self.assertIs(type(nested), list)
+            nested = nested[0]
+        self.assertEqual(nested, "c")
+
+        # the copy is independent from the parser
+        value["a"]["b"][0] = None
+        self.assertIs(type(parser.get()["a"]["b"][0]), dict)
+
+    def test_get_max_staleness_streaming_json_parser(self):
+        parser = StreamingJsonParser()
+        parser.consume('{"a": {"b": "c"}, "d": "e')
+        value = parser.get(max_staleness=0)
+        self.assertEqual(value, {"a": {"b": "c"}, "d": "e"})
+        self.assertIs(parser.get(max_staleness=0), value)
+
+        parser.consume("f")
+        self.assertIs(parser.get(max_staleness=3600), value)
+        self.assertEqual(parser.get(max_staleness=0), {"a": {"b": "c"}, "d": "ef"})
+        self.assertIsNot(parser.get(), parser.get())
+
+        # the shared value is read-only, a caller cannot change what the next caller is given
+        value = parser.get(max_staleness=3600)
+        with self.assertRaises(TypeError):
+            value["d"] = None
+        with self.assertRaises(TypeError):
+            value["a"]["b"] = None
+        self.assertEqual(parser.get(max_staleness=3600), {"a": {"b": "c"}, "d": "ef"})
+
+    def test_schema_streaming_json_parser(self):
+        json_string = (
+            '{"role": "assistant", "extra": {"x": [1, {"y": 2}]}, "calls": [{"name": "f", '
+            '"arguments": {"q": [1]}, "id": 1}], "reply": {"role": "user", "reply": null}}'
+        )
+        expected = Message(
+            "assistant",
+            calls=(ToolCall("f", {"q": (1,)}),),
+            reply=Message("user"),
+        )
+        for chunk_size in (1, len(json_string)):
+            parser = StreamingJsonParser(schema=Message)
+            for i in range(0, len(json_string), chunk_size):
+                parser.consume(json_string[i : i + chunk_size])
+            self.assertEqual(
+                parser.get(),
+                {
+                    "role": "assistant",
+                    "calls": [ToolCall("f", {"q": [1]})],
+                    "reply": Message("user"),
+                },
+            )
+
+        parser = StreamingJsonParser(schema=Message)
+        self.assertEqual(
+            parser.consume_documents(json_string + "\n" + json_string),
+            [expected, expected],
+        )
+
+        for i in range(len(json_string)):
+            parser = StreamingJsonParser(schema=Message)
+            parser.consume_documents(json_string[:i])
+            restored = StreamingJsonParser.restore(parser.checkpoint(), schema=Message)
+            self.assertEqual(restored.consume_documents(json_string[i:]), [expected])
+
+        with self.assertRaises(TypeError):
+            StreamingJsonParser(schema=Message).consume('{"reply": {"content": "x"}}')
+
+    def test_schema_immutable_output_streaming_json_parser(self):
+        parser = StreamingJsonParser(schema={"inner": Message, "points": [Point]})
+        parser.consume(
+            '{"inner": {"role": "a", "calls": [{"name": "f", "arguments": {"q": 1}}], '
+            '"reply": {"role": "b"}}, "points": [{"x": 1, "y": 2}]}'
+        )
+        expected = parser.get()
+        value = parser.get()
+        value["inner"].role = "MUTATED"
+        value["inner"].calls.append(None)
+        value["inner"].calls[0].arguments["q"] = 2
+        value["inner"].reply.role = "MUTATED"
+        self.assertEqual(value["points"], [Point(1, 2)])
+        self.assertEqual(parser.get(), expected)
+        self.assertEqual(expected["inner"].calls, [ToolCall("f", {"q": 1})])
+
+    def test_schema_specs_streaming_json_parser(self):
+        parser = StreamingJsonParser(schema=Polygon)
+        parser.consume('{"label": "l", "points": [{"x": 1, "y": 2, "z": 3}], "n": 1}')
+        self.assertEqual(parser.get(), {"label": "l", "points": [Point(1, 2)]})
+
+        parser = StreamingJsonParser(schema={"a": {"b": int}, "c": [Point]})
+        parser.consume('{"a": {"b": 1, "x": 2}, "c": [{"x": 1, "y": 2}], "d": 1}')
+        self.assertEqual(parser.get(), {"a": {"b": 1}, "c": [Point(1, 2)]})
+
+        with self.assertRaises(ValueError):
+            StreamingJsonParser(select=["a"], schema=Point)
+
+    def test_key_cache_streaming_json_parser(self):
+        key_cache = KeyCache(max_size=2)
+        parser = StreamingJsonParser(key_cache=key_cache)
+        documents = parser.consume_documents(
+            '{"role": "a", "content": "b"}\n{"ro'
+        ) + parser.consume_documents('le": "c", "content": "d"}')
+        self.assertEqual(
+            documents, [{"role": "a", "content": "b"}, {"role": "c", "content": "d"}]
+        )
+        first_keys, second_keys = (list(document) for document in documents)
+        self.assertIs(first_keys[0], second_keys[0])
+        self.assertIs(first_keys[1], second_keys[1])
+        self.assertEqual(len(key_cache), 2)
+
+        # consume() shares the keys of the objects too, whole or split between buffers
+        parser = StreamingJsonParser(key_cache=key_cache)
+        parser.consume('{"items": [{"role": "e"}, {"ro')
+        parser.consume('le": "f"}, ' + ", ".join(['{"role": "g"}'] * 10) + "]}")
+        first_item, second_item, *other_items = parser.get()["items"]
+        self.assertIs(list(first_item)[0], list(second_item)[0])
+        self.assertIs(list(first_item)[0], list(other_items[-1])[0])
+
+        # the keys which were not used during the last generation are evicted
+        StreamingJsonParser(key_cache=key_cache).consume('{"name": 1, "role": 2}')
+        self.assertEqual(len(key_cache), 2)
+        self.assertIn("role", key_cache)
+        self.assertNotIn("content", key_cache)
+
+    def test_random_chunkings_streaming_json_parser(self):
+        failures = []
+        results = run_fuzzer(20, 10, [StreamingJsonParser], failures)
+        self.assertEqual(failures, [])
+        self.assertIn("every_boundary", results)
+
+    def test_prefix_violations_streaming_json_parser(self):
+        complete = {"a": "bcd", "e": [1, "fg", {"h": None}], "i": {"j": 2}}
+        self.assertIsNone(find_prefix_violation({"a": "bc"}, complete))
+        self.assertIsNone(find_prefix_violation({"a": "bcd", "e": [1, "f"]}, complete))
+        self.assertEqual(find_prefix_violation({"a": "bd"}, complete), "$.a")
+        self.assertEqual(find_prefix_violation({"e": []}, complete), "$")
+        self.assertEqual(find_prefix_violation({"a": "bc", "e": []}, complete), "$.a")
+        self.assertEqual(
+            find_prefix_violation({"a": "bcd", "e": [1, "f", {"h": None}]}, complete),
+            "$.e[1]",
+        )
+        self.assertEqual(
+            find_prefix_violation(
+                {"a": "bcd", "e": [1, "fg", {"h": None}], "i": {}}, complete
+            ),
+            "$.i",
+        )
+
+    def test_concurrent_readers_streaming_json_parser(self):
+        rng = random.Random(21)
+        document = {f"document {i}": generate_document(rng) for i in range(20)}
+        document["long"] = "streamed value " * 200
+        text = json.dumps(document)
+        parser = StreamingJsonParser(concurrent=True)
+        failures = []
+        is_consumed = threading.Event()
+
+        def read():
+            previous_state = {}
+            while not is_consumed.is_set():
+                state = parser.get()
+                violation = find_prefix_violation(state, document)
+                if violation is None:
+                    violation = find_prefix_violation(previous_state, state)
+                if violation is not None:
+                    failures.append(violation)
+                previous_state = state
+
+        # switch threads as often as possible to interleave the readers with the writer
+        switch_interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        readers = [threading.Thread(target=read) for _ in range(2)]
+        try:
+            for reader in readers:
+                reader.start()
+            for i in range(0, len(text), 5):
+                parser.consume(text[i : i + 5])
+        finally:
+            is_consumed.set()
+            for reader in readers:
+                reader.join()
+            sys.setswitchinterval(switch_interval)
+
+        self.assertEqual(failures, [])
+        self.assertEqual(parser.get(), document)
+
+    def test_concurrent_lazy_readers_streaming_json_parser(self):
+        # readers of the same lazy snapshot join its strings at the same time
+        document = {f"key {i}": f"value {i} " * 20 for i in range(200)}
+        text = json.dumps(document)
+        switch_interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        try:
+            for _ in range(5):
+                parser = StreamingJsonParser(lazy=True, concurrent=True)
+                for i in range(0, len(text), 3):
+                    parser.consume(text[i : i + 3])
+                snapshot = parser.get()
+                results = []
+                readers = [
+                    threading.Thread(target=lambda: results.append(dict(snapshot)))
+                    for _ in range(4)
+                ]
+                for reader in readers:
+                    reader.start()
+                for reader in readers:
+                    reader.join()
+                self.assertEqual(results, [document] * len(readers))
+        finally:
+            sys.setswitchinterval(switch_interval)
+
+    def test_sinks_streaming_json_parser(self):
+        json_string = (
+            '{"id": 1, "files": [{"name": "a", '
+            '"content": "x \\u00e9\\ud83d\\ude00 \\"y\\""}, '
+            '{"name": "b", "content": {"c": "d"}}], "code": "print()"}'
+        )
+        for select, expected in (
+            (
+                None,
+                {
+                    "id": 1,
+                    "files": [{"name": "a"}, {"name": "b", "content": {"c": "d"}}],
+                },
+            ),
+            (["id"], {"id": 1, "files": [{}, {"content": {"c": "d"}}]}),
+        ):
+            slices = []
+            code = io.StringIO()
+            parser = StreamingJsonParser(
+                select=select,
+                sinks={
+                    "files.content": lambda *string_slice: slices.append(string_slice),
+                    "code": code,
+                },
+            )
+            for character in json_string:
+                parser.consume(character)
+                # the values are sent as soon as they are scanned and never exposed
+                self.assertNotIn("code", parser.get())
+            self.assertEqual(parser.get(), expected)
+            self.assertEqual("".join(slice for slice, _ in slices), 'x é😀 "y"')
+            self.assertEqual([is_last for _, is_last in slices].count(True), 1)
+            self.assertTrue(slices[-1][1])
+            self.assertEqual(code.getvalue(), "print()")
+
+        with self.assertRaises(ValueError):
+            StreamingJsonParser(sinks={"x": print}, schema=Point)
+
+    def test_sinks_checkpoint_streaming_json_parser(self):
+        queue = asyncio.Queue()
+        parser = StreamingJsonParser(sinks={"a": queue})
+        parser.consume('{"a": "hello \\u00')
+        parser = StreamingJsonParser.restore(parser.checkpoint(), sinks={"a": queue})
+        parser.consume('e9", "b": "c", "a": "d"}')
+        self.assertEqual(parser.get(), {"b": "c"})
+        values = []
+        while not queue.empty():
+            values.append(queue.get_nowait())
+        self.assertEqual(values, ["hello ", "é", None, "d", None])
+
     # AI-generated tests
 
     def test_empty_json(self):
@@ -323,5 +1166,266 @@ class TestStreamingJsonParser(unittest.TestCase):
         self.assertEqual(parser.get(), {"a": "b", "c": None}) # Should ignore "c"
 
 
+@unittest.skipIf(
+    hedi_sassi_streaming_json_parser._accelerator is None,
+    "the accelerator is not built, the tests above already use the Python loop",
+)
+class TestPurePythonStreamingJsonParser(TestStreamingJsonParser):
+    # the same tests against the Python loop while the module uses the accelerator
+
+    @classmethod
+    def setUpClass(cls):
+        cls.pure_module = load_pure_python_module()
+
+    def setUp(self):
+        patcher = unittest.mock.patch.multiple(
+            __name__,
+            **{
+                name: getattr(self.pure_module, name)
+                for name in (
+                    "KeyCache",
+                    "ParserLimitError",
+                    "ParserLimits",
+                    "ParserStats",
+                    "StreamingJsonParser",
+                )
+            },
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_backends_agree_on_random_chunkings(self):
+        rng = random.Random(19)
+        for _ in range(300):
+            text = serialize_document(rng, generate_document(rng))
+            accelerated_parser = hedi_sassi_streaming_json_parser.StreamingJsonParser()
+            pure_parser = self.pure_module.StreamingJsonParser()
+            offset = 0
+            while offset < len(text):
+                chunk = text[offset : offset + rng.randint(1, 12)]
+                offset += len(chunk)
+                if rng.random() < 0.2:
+                    # the Python loop continues from the contexts left by the compiled loop
+                    accelerated_parser.consume_patches(chunk)
+                else:
+                    accelerated_parser.consume(chunk)
+                pure_parser.consume(chunk)
+                self.assertEqual(accelerated_parser.get(), pure_parser.get())
+            self.assertEqual(accelerated_parser.get(), json.loads(text))
+
+    def test_backends_agree_with_limits(self):
+        # the compiled loop stops before a limit is exceeded and leaves the rest of the buffer to the Python loop
+        rng = random.Random(23)
+        for _ in range(300):
+            text = serialize_document(rng, generate_document(rng))
+            limits = dict(
+                max_depth=rng.randint(0, 4),
+                max_key_length=rng.randint(0, 8),
+                max_string_length=rng.randint(0, 12),
+                max_keys_per_object=rng.randint(0, 6),
+                truncate=rng.random() < 0.8,
+            )
+            parsers = [
+                module.StreamingJsonParser(limits=module.ParserLimits(**limits))
+                for module in (hedi_sassi_streaming_json_parser, self.pure_module)
+            ]
+            offset = 0
+            while offset < len(text):
+                chunk = text[offset : offset + rng.randint(1, 100)]
+                offset += len(chunk)
+                errors = []
+                for parser in parsers:
+                    try:
+                        parser.consume(chunk)
+                    except ValueError as error:
+                        errors.append(error.limit)
+                self.assertIn(len(errors), (0, 2))
+                if errors:
+                    self.assertEqual(errors[0], errors[1])
+                    break
+
+                self.assertEqual(parsers[0].get(), parsers[1].get())
+                self.assertEqual(
+                    parsers[0].get_exceeded_limits(), parsers[1].get_exceeded_limits()
+                )
+
+
+class TestStreamingJsonParserPool(unittest.TestCase):
+
+    def test_interleaved_streams(self):
+        pool = StreamingJsonParserPool()
+        pool.consume("a", '{"foo": "ba')
+        pool.consume("b", '{"foo": {"bar": ')
+        pool.consume("a", 'r", "x": null}')
+        self.assertEqual(pool.get("a"), {"foo": "bar", "x": None})
+        self.assertEqual(pool.get("b"), {})
+        pool.consume("b", '"foobar"}}')
+        self.assertEqual(pool.get("b"), {"foo": {"bar": "foobar"}})
+        self.assertEqual(len(pool), 2)
+
+    def test_close_stream(self):
+        pool = StreamingJsonParserPool()
+        pool.consume(1, '{"foo": "bar"}')
+        self.assertIn(1, pool)
+        self.assertEqual(pool.close(1), {"foo": "bar"})
+        self.assertNotIn(1, pool)
+        with self.assertRaises(KeyError):
+            pool.get(1)
+        with self.assertRaises(KeyError):
+            pool.close(1)
+
+    def test_memory_per_stream(self):
+        # measured like this the first parser used 514, 754 and 949 bytes per stream
+        for chunk, max_bytes in (
+            ("", 400),
+            ('{"foo": "ba', 600),
+            ('{"foo": {"bar": ', 800),
+        ):
+            pool = StreamingJsonParserPool()
+            tracemalloc.start()
+            try:
+                for stream_id in range(1000):
+                    pool.consume(stream_id, chunk)
+                bytes_per_stream = tracemalloc.get_traced_memory()[0] / 1000
+            finally:
+                tracemalloc.stop()
+            self.assertLess(bytes_per_stream, max_bytes, chunk)
+
+
+class TestParseAsync(unittest.IsolatedAsyncioTestCase):
+
+    @staticmethod
+    async def stream(chunks, delay=0.0):
+        for chunk in chunks:
+            await asyncio.sleep(delay)
+            yield chunk
+
+    async def test_snapshot_per_chunk(self):
+        chunks = ['{"foo": "ba', 'r", "a": {"b": ', '"c"}}']
+        snapshots = [
+            dict(snapshot) async for snapshot in parse_async(self.stream(chunks))
+        ]
+        self.assertEqual(
+            snapshots, [{"foo": "ba"}, {"foo": "bar"}, {"foo": "bar", "a": {"b": "c"}}]
+        )
+
+    async def test_bytes_split_inside_character(self):
+        encoded = '{"key": "привет"}'.encode()
+        chunks = [encoded[i : i + 1] for i in range(len(encoded))]
+        snapshots = [snapshot async for snapshot in parse_async(self.stream(chunks))]
+        self.assertEqual(snapshots[-1], {"key": "привет"})
+        self.assertTrue(all("\ufffd" not in s.get("key", "") for s in snapshots))
+
+    async def test_coalesced_snapshots(self):
+        chunks = ['{"foo": "', *("a" * 50), '"}']
+        snapshots = [
+            snapshot async for snapshot in parse_async(self.stream(chunks), every=60)
+        ]
+        # the first chunk is emitted right away, everything else is coalesced in the final snapshot
+        self.assertEqual(snapshots, [{"foo": ""}, {"foo": "a" * 50}])
+
+    async def test_coalesced_snapshot_emitted_when_stream_stalls(self):
+        async def stalling_stream():
+            yield '{"foo": "a'
+            yield "b"
+            await asyncio.sleep(0.2)
+            yield '"}'
+
+        snapshots = [
+            snapshot async for snapshot in parse_async(stalling_stream(), every=0.05)
+        ]
+        self.assertEqual(snapshots, [{"foo": "a"}, {"foo": "ab"}, {"foo": "ab"}])
+
+    async def test_large_chunk_yields_to_event_loop(self):
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0)
+
+        ticker_task = asyncio.create_task(ticker())
+        await asyncio.sleep(0)
+        ticks = 0
+        json_string = json.dumps({f"key{i}": "value " * 50 for i in range(2000)})
+        async for snapshot in parse_async(self.stream([json_string]), time_budget=0):
+            self.assertEqual(len(snapshot), 2000)
+        ticker_task.cancel()
+        self.assertGreater(ticks, 10)
+
+    async def test_cancel_stops_reading_stream(self):
+        received = []
+
+        async def endless_stream():
+            yield '{"foo": "'
+            while True:
+                await asyncio.sleep(0.01)
+                received.append("a")
+                yield "a"
+
+        async def consume():
+            async for _ in parse_async(endless_stream()):
+                pass
+
+        task = asyncio.create_task(consume())
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await task
+        count = len(received)
+        await asyncio.sleep(0.05)
+        self.assertEqual(len(received), count)
+
+
+class TestParseDocumentsInParallel(unittest.TestCase):
+
+    def setUp(self):
+        self.documents = [
+            {"id": i, "text": "lorem ipsum " * (i % 7), "nested": {"ok": i % 2 == 0}}
+            for i in range(200)
+        ]
+        file_descriptor, self.path = tempfile.mkstemp(suffix=".ndjson")
+        with os.fdopen(file_descriptor, "w") as file:
+            for document in self.documents:
+                file.write(json.dumps(document) + "\n")
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def test_documents_in_order(self):
+        documents = list(
+            parse_documents_in_parallel(self.path, processes=2, batch_size=100)
+        )
+        self.assertEqual(documents, self.documents)
+
+    def test_select(self):
+        documents = list(
+            parse_documents_in_parallel(self.path, select=["id"], processes=2)
+        )
+        self.assertEqual(documents, [{"id": i} for i in range(200)])
+
+
+class TestParseFile(unittest.TestCase):
+
+    def setUp(self):
+        file_descriptor, self.path = tempfile.mkstemp(suffix=".json")
+        os.close(file_descriptor)
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def test_characters_split_between_windows(self):
+        # larger than a window, the multi-byte characters end up split between windows
+        document = {"a": "é€😀" * 300000, "b": {"c": [1, None]}}
+        with open(self.path, "w", encoding="utf-8") as file:
+            json.dump(document, file, ensure_ascii=False)
+        self.assertEqual(parse_file(self.path), document)
+        self.assertEqual(parse_file(self.path, select=["b.c"]), {"b": {"c": [1, None]}})
+
+    def test_empty_file(self):
+        self.assertEqual(parse_file(self.path), {})
+
+
 if __name__ == "__main_":
     unittest.main()